@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+scripts/benchmark_embeddings.py
+
+Compara el backend de embeddings de PyTorch con ONNX Runtime (fp32 e int8):
+    - rendimiento en indexación masiva (textos/segundo);
+    - latencia de una consulta individual (p50 / p95);
+    - similitud coseno de cada vector con el de PyTorch.
+
+Termina con código 1 si algún vector queda por debajo de ``--tolerance``,
+así que sirve también como comprobación antes de activar
+``EMBEDDING_BACKEND=onnx``.
+
+Con ``--bucketing`` mide en cambio la indexación masiva del backend
+configurado: lotes de ``BATCH_SIZE`` en el orden del corpus frente a
+ventanas de ``EMBEDDING_SORT_WINDOW`` chunks ordenados por longitud (y con
+el pool multiproceso si ``EMBEDDING_PROCESSES`` > 1), en chunks/segundo.
+
+Uso:
+    python scripts/benchmark_embeddings.py
+    python scripts/benchmark_embeddings.py --texts 2000 --queries 200 --tolerance 0.98
+    python scripts/benchmark_embeddings.py --bucketing --texts 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from langchain_huggingface import HuggingFaceEmbeddings   # noqa: E402
+
+from src.config import settings                            # noqa: E402
+from src.vectorstore.bucketing import LengthBucketedEmbeddings  # noqa: E402
+from src.vectorstore.embedder import build_embeddings, chunk_documents, load_documents_from_folder  # noqa: E402
+from src.vectorstore.onnx_embeddings import OnnxEmbeddings  # noqa: E402
+
+_SAMPLE = [
+    "El arrendatario deberá abonar la renta dentro de los cinco primeros días de cada mes.",
+    "La empresa concederá al trabajador un permiso retribuido de quince días por matrimonio.",
+    "Cualquiera de las partes podrá resolver el contrato con un preaviso de treinta días.",
+    "Las vacaciones anuales serán de treinta días naturales y no podrán sustituirse por dinero.",
+    "El presente acuerdo se regirá por la legislación española y los tribunales de Madrid.",
+]
+
+
+def load_texts(n: int) -> list[str]:
+    """Chunks reales de ``DATA_CHUNKS_PATH`` si los hay; si no, frases de ejemplo."""
+    folder = Path(settings.DATA_CHUNKS_PATH)
+    texts = []
+    if folder.exists():
+        docs = load_documents_from_folder(folder)
+        texts = [c["text"] for c in chunk_documents(docs, size=settings.CHUNK_SIZE, overlap=settings.CHUNK_OVERLAP)]
+    if not texts:
+        texts = _SAMPLE
+    return [texts[i % len(texts)] for i in range(n)]
+
+
+def bench(name: str, embedder, texts: list[str], queries: list[str]) -> np.ndarray:
+    embedder.embed_documents(texts[:8])  # calentamiento
+
+    start = time.perf_counter()
+    vectors = np.asarray(embedder.embed_documents(texts), dtype=np.float32)
+    bulk = time.perf_counter() - start
+
+    latencies = []
+    for q in queries:
+        t0 = time.perf_counter()
+        embedder.embed_query(q)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    print(f"{name:<10} {len(texts) / bulk:10.1f} textos/s   "
+          f"consulta p50 {statistics.median(latencies):6.1f} ms   p95 {p95:6.1f} ms")
+    return vectors
+
+
+def cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def bench_windows(name: str, embedder, texts: list[str], window: int) -> tuple[np.ndarray, float]:
+    """Vectoriza ``texts`` en llamadas de ``window`` textos, como el pipeline."""
+    embedder.embed_documents(texts[:8])  # calentamiento (y arranque del pool)
+
+    start = time.perf_counter()
+    vectors = np.concatenate([
+        np.asarray(embedder.embed_documents(texts[i:i + window]), dtype=np.float32)
+        for i in range(0, len(texts), window)
+    ])
+    rate = len(texts) / (time.perf_counter() - start)
+    print(f"{name:<22} {rate:10.1f} chunks/s")
+    return vectors, rate
+
+
+def bucketing(texts: list[str], tolerance: float) -> int:
+    """Orden del corpus frente a agrupación por longitud (y pool multiproceso)."""
+    print(f"🧪  {settings.EMBEDDING_MODEL_NAME} ({settings.EMBEDDING_BACKEND}): "
+          f"{len(texts)} chunks, lote {settings.BATCH_SIZE}, ventana {settings.EMBEDDING_SORT_WINDOW}\n")
+    base = build_embeddings()
+    reference, base_rate = bench_windows("orden del corpus", base, texts, settings.BATCH_SIZE)
+
+    variants = [("por longitud", LengthBucketedEmbeddings(base, settings.BATCH_SIZE))]
+    if settings.EMBEDDING_PROCESSES > 1:
+        variants.append((f"por longitud ×{settings.EMBEDDING_PROCESSES} proc",
+                         LengthBucketedEmbeddings(base, settings.BATCH_SIZE, settings.EMBEDDING_PROCESSES)))
+
+    ok = True
+    for name, embedder in variants:
+        vectors, rate = bench_windows(name, embedder, texts, settings.EMBEDDING_SORT_WINDOW)
+        sims = cosine(reference, vectors)
+        passed = sims.min() >= tolerance
+        ok &= passed
+        print(f"{'':<22} ×{rate / base_rate:.2f}   coseno min {sims.min():.4f}  {'✅' if passed else '❌'}")
+        if hasattr(embedder, "close"):
+            embedder.close()
+    return 0 if ok else 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de backends de embeddings")
+    parser.add_argument("--texts", type=int, default=1000, help="Textos para la prueba masiva")
+    parser.add_argument("--queries", type=int, default=100, help="Consultas individuales")
+    parser.add_argument("--tolerance", type=float, default=0.98,
+                        help="Similitud coseno mínima respecto a PyTorch")
+    parser.add_argument("--bucketing", action="store_true",
+                        help="Mide la agrupación por longitud en la indexación masiva")
+    args = parser.parse_args()
+
+    texts = load_texts(args.texts)
+    if args.bucketing:
+        return bucketing(texts, args.tolerance)
+    queries = [t[:200] for t in texts[:args.queries]]
+    print(f"🧪  {settings.EMBEDDING_MODEL_NAME}: {len(texts)} textos, {len(queries)} consultas\n")
+
+    reference = bench("torch", HuggingFaceEmbeddings(
+        model_name=settings.EMBEDDING_MODEL_NAME,
+        model_kwargs={"device": "cpu"},
+        encode_kwargs={"batch_size": settings.BATCH_SIZE},
+    ), texts, queries)
+
+    ok = True
+    for name, quantize in (("onnx", False), ("onnx-int8", True)):
+        embedder = OnnxEmbeddings(
+            settings.EMBEDDING_MODEL_NAME,
+            settings.EMBEDDING_ONNX_PATH,
+            quantize=quantize,
+            batch_size=settings.BATCH_SIZE,
+            threads=settings.EMBEDDING_ONNX_THREADS,
+        )
+        sims = cosine(reference, bench(name, embedder, texts, queries))
+        passed = sims.min() >= args.tolerance
+        ok &= passed
+        print(f"{'':<10} coseno vs torch: min {sims.min():.4f}  media {sims.mean():.4f}  "
+              f"{'✅' if passed else '❌'}")
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
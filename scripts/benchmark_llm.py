@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+scripts/benchmark_llm.py
+
+Mide el LLM local (llama.cpp) con prompts reales: los de cada perfil de
+``GPT_PROFILES`` con el contexto que recupera Weaviate para cada pregunta
+(o un contexto de ejemplo con ``--no-retrieval``).
+
+Con ``--prefix-cache`` compara el tiempo hasta el primer token (TTFT) sin
+reutilizar nada (contexto vacío en cada prompt) frente a restaurar el estado
+KV del prefijo fijo del perfil (``src/rag_logic/prefix_cache.py``). Los
+prompts alternan perfiles, como en la API.
+
+Con ``--speculative`` genera la respuesta completa (hasta ``--max-tokens``)
+con y sin el borrador de ``LLM_DRAFT_MODEL_PATH`` y muestra tokens/segundo,
+la tasa de aceptación de los tokens propuestos y si las respuestas coinciden
+(deben ser idénticas: todos los perfiles usan ``temperature=0.0``).
+
+Uso:
+    python scripts/benchmark_llm.py --prefix-cache
+    python scripts/benchmark_llm.py --prefix-cache --questions preguntas.txt --no-retrieval
+    LLM_DRAFT_MODEL_PATH=models/draft.gguf python scripts/benchmark_llm.py --speculative
+    LLM_DRAFT_MODEL_PATH=prompt-lookup python scripts/benchmark_llm.py --speculative --max-tokens 300
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from src.config import settings                                       # noqa: E402
+from src.config.gpt_profiles import GPT_PROFILES, prompt_for          # noqa: E402
+
+_QUESTIONS = [
+    "¿Cuál es el plazo de garantía en los contratos menores?",
+    "¿Qué requisitos debe cumplir un procedimiento abierto simplificado?",
+    "¿Cuándo puede resolverse un contrato de obras por demora del contratista?",
+    "¿Qué documentación hay que aportar para acreditar la solvencia técnica?",
+]
+
+_SAMPLE_CONTEXT = (
+    "El plazo de garantía se establecerá en el pliego de cláusulas administrativas "
+    "particulares atendiendo a la naturaleza y complejidad del contrato."
+)
+
+
+def load_questions(path: str | None) -> list[str]:
+    if not path:
+        return _QUESTIONS
+    return [line.strip() for line in Path(path).read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+def build_prompts(questions: list[str], retrieval: bool) -> list[str]:
+    """Un prompt por pregunta y perfil, alternando perfiles."""
+    prompts = []
+    for question in questions:
+        for gpt_id, profile in GPT_PROFILES.items():
+            context = _SAMPLE_CONTEXT
+            if retrieval:
+                from src.rag_logic.generator import filter_docs_by_token_limit
+                from src.rag_logic.retriever_module import get_retriever
+
+                retriever = get_retriever(k=settings.RETRIEVER_K, collection_name=profile["collection"])
+                docs = filter_docs_by_token_limit(retriever.get_relevant_documents(question))
+                context = "\n\n".join(d.page_content for d in docs)
+            prompts.append(prompt_for(profile).format(context=context, question=question))
+    return prompts
+
+
+def load_model(draft_model=None):
+    from llama_cpp import Llama
+
+    return Llama(
+        model_path=str(settings.LLM_MODEL_PATH),
+        n_ctx=4096,
+        use_mmap=settings.LLM_USE_MMAP,
+        verbose=False,
+        draft_model=draft_model,
+    )
+
+
+def ttft(llm, prompt: str) -> float:
+    """Segundos hasta el primer token de ``prompt``."""
+    start = time.perf_counter()
+    stream = llm.create_completion(prompt, max_tokens=1, temperature=0.0, stream=True)
+    try:
+        next(iter(stream))
+    finally:
+        stream.close()
+    return time.perf_counter() - start
+
+
+def report(name: str, values: list[float]) -> float:
+    values = sorted(values)
+    p50 = statistics.median(values)
+    p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+    print(f"   {name:<22} TTFT p50 {p50 * 1000:8.1f} ms   p95 {p95 * 1000:8.1f} ms")
+    return p50
+
+
+def bench_prefix_cache(prompts: list[str]) -> None:
+    from src.rag_logic.prefix_cache import PrefixCachedLlama, PrefixKVCache, profile_prefixes
+
+    llm = load_model()
+    ttft(llm, prompts[0])  # calentamiento
+
+    cold = []
+    for prompt in prompts:
+        llm.reset()  # sin reutilizar el contexto anterior
+        cold.append(ttft(llm, prompt))
+
+    cache = PrefixKVCache(llm, settings.LLM_PREFIX_CACHE_DIR)
+    cache.warm(profile_prefixes())
+    cached_llm = PrefixCachedLlama(llm, cache)
+    warm = [ttft(cached_llm, prompt) for prompt in prompts]
+
+    print(f"\n⏱️  {len(prompts)} prompts, {len(cache._states)} prefijos")
+    before = report("sin caché de prefijo", cold)
+    after = report("con caché de prefijo", warm)
+    print(f"   Mejora p50: {(1 - after / before) * 100:.1f}%  ({cache.loads} estados restaurados)")
+
+
+def generate_all(llm, prompts: list[str], max_tokens: int) -> tuple[list[str], int, float]:
+    """Respuestas completas, tokens generados y segundos empleados."""
+    texts, tokens, seconds = [], 0, 0.0
+    for prompt in prompts:
+        llm.reset()
+        start = time.perf_counter()
+        out = llm.create_completion(prompt, max_tokens=max_tokens, temperature=0.0)
+        seconds += time.perf_counter() - start
+        texts.append(out["choices"][0]["text"])
+        tokens += out["usage"]["completion_tokens"]
+    return texts, tokens, seconds
+
+
+def bench_speculative(prompts: list[str], max_tokens: int) -> None:
+    from src.rag_logic.speculative import build_draft_model
+
+    if not settings.LLM_DRAFT_MODEL_PATH:
+        sys.exit("❌  Define LLM_DRAFT_MODEL_PATH (GGUF borrador o 'prompt-lookup')")
+
+    base = load_model()
+    base.create_completion(prompts[0], max_tokens=8, temperature=0.0)  # calentamiento
+    base_texts, base_tokens, base_seconds = generate_all(base, prompts, max_tokens)
+    del base
+
+    draft = build_draft_model(n_ctx=4096)
+    spec = load_model(draft_model=draft)
+    spec.create_completion(prompts[0], max_tokens=8, temperature=0.0)
+    draft.proposed = draft.accepted = 0
+    spec_texts, spec_tokens, spec_seconds = generate_all(spec, prompts, max_tokens)
+
+    same = sum(a == b for a, b in zip(base_texts, spec_texts))
+    base_rate = base_tokens / base_seconds
+    spec_rate = spec_tokens / spec_seconds
+    stats = draft.stats()
+    print(f"\n⏱️  {len(prompts)} prompts, hasta {max_tokens} tokens, borrador {settings.LLM_DRAFT_MODEL_PATH} "
+          f"(lookahead {settings.LLM_DRAFT_LOOKAHEAD})")
+    print(f"   {'sin especulación':<22} {base_rate:8.2f} tokens/s  ({base_tokens} tokens en {base_seconds:.1f}s)")
+    print(f"   {'con especulación':<22} {spec_rate:8.2f} tokens/s  ({spec_tokens} tokens en {spec_seconds:.1f}s)")
+    print(f"   Aceleración: x{spec_rate / base_rate:.2f}   aceptación {stats['acceptance_rate'] * 100:.1f}% "
+          f"({stats['accepted']}/{stats['proposed']} tokens propuestos)")
+    print(f"   Respuestas idénticas: {same}/{len(prompts)}")
+    if same != len(prompts):
+        sys.exit(1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark del LLM local")
+    parser.add_argument("--prefix-cache", action="store_true", help="TTFT con y sin caché KV de prefijos")
+    parser.add_argument("--speculative", action="store_true", help="Tokens/s con y sin decodificación especulativa")
+    parser.add_argument("--max-tokens", type=int, default=settings.MAX_COMPLETION_TOKENS,
+                        help="Tokens máximos por respuesta con --speculative")
+    parser.add_argument("--questions", help="Fichero con una pregunta por línea")
+    parser.add_argument("--no-retrieval", action="store_true", help="Contexto de ejemplo en lugar de Weaviate")
+    args = parser.parse_args()
+
+    prompts = build_prompts(load_questions(args.questions), retrieval=not args.no_retrieval)
+    if args.prefix_cache:
+        bench_prefix_cache(prompts)
+    if args.speculative:
+        bench_speculative(prompts, args.max_tokens)
+    if not (args.prefix_cache or args.speculative):
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
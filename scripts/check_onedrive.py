@@ -4,9 +4,14 @@ from pathlib import Path
 # Añade root del proyecto al PYTHONPATH
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
+from src.startup_profile import maybe_profile_startup, startup_done  # noqa: E402
+maybe_profile_startup()
+
 from src.config import settings
 from src.ingestion.onedrive_client import OneDriveClient
 
+startup_done()
+
 
 def main():
     print("\n=== DEBUG check_onedrive.py ===")
@@ -10,9 +10,14 @@ from urllib.parse import urlparse
 ROOT = Path(__file__).resolve().parent.parent
 sys.path.append(str(ROOT))
 
+from src.startup_profile import maybe_profile_startup, startup_done  # noqa: E402
+maybe_profile_startup()
+
 from weaviate import connect_to_custom
 from src.config import settings
 
+startup_done()
+
 # ── Construcción de conexión ──
 parsed = urlparse(settings.WEAVIATE_URL)
 host = parsed.hostname or "localhost"
@@ -20,6 +20,9 @@ from pathlib import Path
 ROOT = Path(__file__).resolve().parent.parent
 sys.path.append(str(ROOT))
 
+from src.startup_profile import maybe_profile_startup, startup_done  # noqa: E402
+maybe_profile_startup()
+
 from src.vectorstore.embedder import (           # noqa: E402
     load_documents_from_folder,
     chunk_documents,
@@ -28,6 +31,8 @@ from src.vectorstore.embedder import (           # noqa: E402
 )
 from src.config import settings                  # noqa: E402
 
+startup_done()
+
 # ──────────────────────────────────────────────────────────────── #
 if __name__ == "__main__":
     input_folder = Path(settings.DATA_CHUNKS_PATH)
@@ -41,15 +46,18 @@ if __name__ == "__main__":
     # 2) Chunking
     chunks = chunk_documents(
         docs,
-        chunk_size=settings.CHUNK_SIZE,
-        chunk_overlap=settings.CHUNK_OVERLAP,
+        size=settings.CHUNK_SIZE,
+        overlap=settings.CHUNK_OVERLAP,
     )
     print(f"🔪 {len(chunks)} chunks generados")
 
     # 3) Indexar en Weaviate
-    index_chunks(chunks)
+    failed = index_chunks(chunks)
     elapsed = time.perf_counter() - start
-    print(f"✅ Chunks indexados correctamente en Weaviate ({elapsed:,.1f} s)")
+    if failed:
+        print(f"⚠️  {len(failed)} chunks no se pudieron indexar ({elapsed:,.1f} s)")
+    else:
+        print(f"✅ Chunks indexados correctamente en Weaviate ({elapsed:,.1f} s)")
 
     # 4) Cerrar conexión (buena práctica)
     get_weaviate_client().close()
@@ -4,9 +4,14 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
+from src.startup_profile import maybe_profile_startup, startup_done  # noqa: E402
+maybe_profile_startup()
+
 from src.ingestion.ingestor import process_documents
 from src.config import settings
 
+startup_done()
+
 if __name__ == "__main__":
     input_path = settings.DATA_RAW_PATH
     output_path = settings.DATA_CHUNKS_PATH
@@ -8,9 +8,14 @@ from typing import List, Sequence
 ROOT = Path(__file__).resolve().parent.parent
 sys.path.append(str(ROOT))
 
+from src.startup_profile import maybe_profile_startup, startup_done  # noqa: E402
+maybe_profile_startup()
+
 from weaviate import connect_to_custom
 from src.config import settings
 
+startup_done()
+
 # ---------- Conexión ----------
 parsed = urlparse(settings.WEAVIATE_URL)
 host, secure = parsed.hostname or "localhost", parsed.scheme == "https"
@@ -13,11 +13,16 @@ warnings.filterwarnings("ignore")
 null_output = open(os.devnull, 'w')
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
+from src.startup_profile import maybe_profile_startup, startup_done  # noqa: E402
+maybe_profile_startup()
+
 from src.config import settings
 NUM_K = settings.RETRIEVER_K  # Número de documentos a recuperar
 
 from src.rag_logic.generator import get_rag_chain
 
+startup_done()
+
 # if __name__ == "__main__":
 #     with redirect_stderr(null_output):
 #         print("Generador RAG iniciado. (Ctrl+C para salir).")
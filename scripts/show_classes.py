@@ -13,9 +13,14 @@ from urllib.parse import urlparse
 ROOT = Path(__file__).resolve().parent.parent
 sys.path.append(str(ROOT))
 
+from src.startup_profile import maybe_profile_startup, startup_done  # noqa: E402
+maybe_profile_startup()
+
 from weaviate import connect_to_custom                         # v4 helper
 from src.config import settings                                 # noqa: E402
 
+startup_done()
+
 # ───────────── Construir la conexión ───────────── #
 parsed = urlparse(settings.WEAVIATE_URL)
 
@@ -3,25 +3,137 @@
 from __future__ import annotations
 
 import os
+import signal
 import sys
+import threading
+import time
+import traceback
 from pathlib import Path
 
 # 1️⃣  AÑADIR LA RAÍZ **ANTES** DE CUALQUIER IMPORT DE `src`
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 sys.path.append(str(PROJECT_ROOT))
 
+from src.startup_profile import maybe_profile_startup, profiling, startup_done  # noqa: E402
+maybe_profile_startup()
+
 from src.config import settings  # noqa: E402  ← ahora sí funciona
 
 import uvicorn  # noqa: E402  (se importa después para mantener orden lógico)
 
+APP = "src.api.main:app"
+# Un worker que muere antes de este tiempo no se sustituye (fallo al arrancar)
+MIN_WORKER_UPTIME = 10.0
+
+
+def _run_worker(config: uvicorn.Config, sock) -> None:
+    """Proceso hijo: sirve la app sobre el socket heredado del padre."""
+    code = 1
+    try:
+        uvicorn.Server(config).run(sockets=[sock])
+        code = 0
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        # No volver al bucle del padre ni ejecutar sus manejadores de salida
+        os._exit(code)
+
+
+def run_preloaded(port: int, workers: int) -> None:
+    """Precarga los modelos y hace ``fork`` de los workers de uvicorn.
+
+    ``uvicorn.run(workers=N)`` arranca los workers con ``spawn``, de modo que
+    cada uno vuelve a cargar los modelos. Aquí el padre los carga una vez,
+    abre el socket y crea los hijos con ``fork``: comparten la memoria de los
+    modelos por copy-on-write. Si un worker termina inesperadamente se
+    sustituye por otro (también heredando los modelos precargados), salvo
+    que falle nada más arrancar.
+    """
+    from src.rag_logic.preload import memory_report, preload_models
+
+    config = uvicorn.Config(APP, host="0.0.0.0", port=port, reload=False, workers=1)
+    sock = config.bind_socket()
+    preload_models()
+
+    children: dict[int, float] = {}
+    stopping = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(config, sock)
+        children[pid] = time.monotonic()
+
+    def stop(signum, _frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for _ in range(workers):
+        spawn()
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    print(f"🚀  {workers} workers (fork) escuchando en el puerto {port}: {sorted(children)}")
+
+    if settings.API_MEMORY_REPORT_SECONDS > 0:
+        def report() -> None:
+            print("📊  Memoria por worker:\n" + memory_report(sorted(children)))
+
+        timer = threading.Timer(settings.API_MEMORY_REPORT_SECONDS, report)
+        timer.daemon = True
+        timer.start()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = children.pop(pid, None)
+        if stopping or started is None:
+            continue
+        if time.monotonic() - started < MIN_WORKER_UPTIME:
+            print(f"❌  Worker {pid} terminó al arrancar (estado {status}); deteniendo el servidor")
+            stop(signal.SIGTERM, None)
+        else:
+            print(f"⚠️  Worker {pid} terminó (estado {status}); arrancando otro")
+            spawn()
+    sock.close()
+
+
+def profile_worker_startup() -> None:
+    """Lo que hace un worker antes de aceptar peticiones: importar la app y
+    calentar los modelos (``--profile-startup`` mide hasta aquí)."""
+    import src.api.main  # noqa: F401
+
+    if settings.API_WARMUP:
+        from src.rag_logic.preload import warm_up
+
+        warm_up()
+    startup_done()
+
+
 if __name__ == "__main__":
+    if profiling():
+        profile_worker_startup()
+
     # No usar reload en Windows, rompe multiprocessing + imports
     port = int(os.getenv("API_PORT", "8000"))
     workers = int(os.getenv("API_WORKERS", "2"))
-    uvicorn.run(
-        "src.api.main:app",
-        host="0.0.0.0",
-        port=port,
-        reload=False,
-        workers=workers,
-    )
+    if settings.API_PRELOAD and hasattr(os, "fork"):
+        run_preloaded(port, workers)
+    else:
+        if settings.API_PRELOAD:
+            print("⚠️  API_PRELOAD requiere fork (no disponible en Windows); se ignora")
+        uvicorn.run(
+            APP,
+            host="0.0.0.0",
+            port=port,
+            reload=False,
+            workers=workers,
+        )
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+scripts/start_llm_server.py
+
+Arranca el servidor LLM local (``src/llm_server``): un único proceso que
+carga el GGUF y atiende las generaciones de todos los workers de la API.
+
+La dirección es ``LLM_MODEL_URL``: ``http://host:puerto`` o
+``unix:///ruta/al/socket``. La API lo usa con ``LLM_SERVER_ENABLED=true``.
+
+Uso:
+    python scripts/start_llm_server.py
+    LLM_SERVER_BACKEND=stub python scripts/start_llm_server.py   # sin modelo
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+from urllib.parse import urlparse
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from src.startup_profile import maybe_profile_startup, startup_done  # noqa: E402
+maybe_profile_startup()
+
+from src.config import settings  # noqa: E402
+
+import uvicorn  # noqa: E402
+
+APP = "src.llm_server.app:app"
+
+startup_done()
+
+
+def main() -> None:
+    url = settings.LLM_MODEL_URL
+    if url.startswith("unix://"):
+        path = url[len("unix://"):]
+        Path(path).unlink(missing_ok=True)  # socket de una ejecución anterior
+        print(f"🧠  Servidor LLM en {path}")
+        uvicorn.run(APP, uds=path, workers=1)
+    else:
+        parsed = urlparse(url)
+        print(f"🧠  Servidor LLM en {parsed.hostname}:{parsed.port or 8001}")
+        uvicorn.run(APP, host=parsed.hostname or "127.0.0.1", port=parsed.port or 8001, workers=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,35 +6,54 @@ import argparse
 # Añadir el directorio raíz al path para imports absolutos
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
-from src.config import settings
-from src.ingestion.ingestor import process_documents
-from src.vectorstore.embedder import index_chunks, chunk_documents
+from src.startup_profile import maybe_profile_startup, startup_done  # noqa: E402
+maybe_profile_startup()
 
-# Ruta al archivo que lleva control de los documentos ya procesados
+from src.config import settings
+from src.ingestion.ingestor import iter_documents
+from src.ingestion.manifest import Manifest
+from src.ingestion.pipeline import run_pipeline
+from src.vectorstore.embedder import (
+    collection_name_for,
+    delete_chunks,
+    delete_documents,
+    find_chunk_uuids,
+)
+
+startup_done()
+
+# Tracker JSON de versiones anteriores: se migra al manifiesto SQLite
 TRACKER_FILE = Path("data/.processed_files.json")
+DELTA_STATE_FILE = Path("data/.onedrive_delta.json")
 
-def load_tracker():
-    """Carga el archivo de seguimiento.
+def open_manifest(gpt_id: str) -> Manifest:
+    """Abre el manifiesto de la colección del ``gpt_id`` migrando el JSON antiguo.
 
-    A partir de la versión actual se almacena un diccionario con el
-    ``doc_id`` y un indicador ``chunked``. Para mantener compatibilidad con
-    versiones anteriores, si el valor es una cadena se asume que el documento
-    ya estaba procesado y troceado.
+    El tracker JSON era global, así que sus entradas se importan en la
+    colección con la que se ejecute la primera sincronización tras actualizar.
     """
-    if not TRACKER_FILE.exists():
-        return {}
+    collection = collection_name_for(gpt_id)
+    manifest = Manifest(settings.MANIFEST_PATH, collection)
+    manifest.migrate_json(TRACKER_FILE)
 
-    data = json.loads(TRACKER_FILE.read_text(encoding="utf-8"))
+    delta_key = f"onedrive_delta:{collection}"
+    if DELTA_STATE_FILE.exists() and manifest.get_meta(delta_key) is None:
+        manifest.set_meta(delta_key, DELTA_STATE_FILE.read_text(encoding="utf-8"))
+        DELTA_STATE_FILE.rename(DELTA_STATE_FILE.with_name(DELTA_STATE_FILE.name + ".migrated"))
+    return manifest
 
-    for src, val in data.items():
-        if isinstance(val, str):
-            data[src] = {"doc_id": val, "chunked": True, "indexed": True}
+def purge_sources(manifest: Manifest, sources, gpt_id: str) -> int:
+    """Elimina de Weaviate y del manifiesto los documentos de ``sources``.
 
-    return data
-
-def save_tracker(tracker):
-    """Guarda el diccionario actualizado de documentos procesados en disco."""
-    TRACKER_FILE.write_text(json.dumps(tracker, indent=2), encoding="utf-8")
+    Se borran exactamente los UUID registrados en el manifiesto; los
+    documentos indexados antes de guardarse los UUID se borran por ``source``.
+    """
+    removed = 0
+    for src in sources:
+        entry = manifest.pop(src)
+        uuids = entry["chunk_uuids"] if entry else []
+        removed += delete_chunks(uuids, gpt_id=gpt_id) if uuids else delete_documents([src], gpt_id=gpt_id)
+    return removed
 
 def sync_and_index(gpt_id: str):
     """
@@ -43,61 +62,124 @@ def sync_and_index(gpt_id: str):
     - Detecta documentos nuevos en la ruta indicada por DOCS_INPUT_PATH.
     - Procesa su contenido y genera chunks en DOCS_OUTPUT_PATH.
     - Indexa solo los documentos nuevos en la clase de Weaviate asociada al `gpt_id`.
+
+    La extracción, el troceado, los embeddings y la escritura en Weaviate se
+    solapan en un pipeline en streaming (``run_pipeline``): cada documento se
+    marca como indexado en el manifiesto SQLite en cuanto sus chunks están
+    escritos, junto con los UUID de esos chunks.
+
+    Con ``ONEDRIVE_DELTA_SYNC`` solo se descargan los cambios de OneDrive.
+
+    Los chunks tienen UUID deterministas: al reindexar un documento se
+    sobrescriben sus objetos y se borran los que sobran de la versión
+    anterior. Los ficheros borrados (en disco o en OneDrive) se eliminan
+    también de Weaviate.
     """
     input_path = Path(settings.DOCS_INPUT_PATH)
     output_path = Path(settings.DOCS_OUTPUT_PATH)
-    tracker = load_tracker()
-
-    # Procesar todos los documentos disponibles
-    all_docs = process_documents(
-        input_path,
-        output_path,
-        save_to_disk=True,
-        tracker=tracker,
-    )
-
-    # Filtrar aquellos que aún no han sido chunkificados o cuyo contenido cambió
-    new_docs = []
-    for doc in all_docs:
-        source = doc["metadata"]["source"]
-        doc_id = doc["metadata"]["doc_id"]
-
-        entry = tracker.get(source)
-        if entry and entry.get("doc_id") == doc_id and entry.get("chunked") and entry.get("indexed"):
-            # Ya se procesó y se indexó este documento
-            continue
-
-        new_docs.append(doc)
-        tracker[source] = {"doc_id": doc_id, "chunked": False, "indexed": False}
-
-    # Guardar inmediatamente el estado para evitar reprocesar en caso de fallo
-    save_tracker(tracker)
-
-    if new_docs:
-        print(f"\n🟢 Nuevos documentos detectados: {len(new_docs)}")
-        chunks = chunk_documents(
-            new_docs,
-            size=settings.CHUNK_SIZE,
-            overlap=settings.CHUNK_OVERLAP,
-        )
-
-        # Marcar como troceados para evitar reprocesos futuros
-        for doc in new_docs:
-            tracker[doc["metadata"]["source"]]["chunked"] = True
-        save_tracker(tracker)
-
-        index_chunks(chunks, gpt_id=gpt_id)
-
-        # Marcar como indexados tras completarse sin errores
-        for doc in new_docs:
-            tracker[doc["metadata"]["source"]]["indexed"] = True
+    manifest = open_manifest(gpt_id)
+    delta_key = f"onedrive_delta:{manifest.collection}"
+    delta_state = json.loads(manifest.get_meta(delta_key) or "{}")
+    deleted = []
+
+    def new_documents():
+        """Filtra los documentos que aún no se han indexado o cuyo contenido cambió."""
+        for doc in iter_documents(
+            input_path,
+            output_path,
+            save_to_disk=True,
+            tracker=manifest,
+            delta_state=delta_state,
+            deleted=deleted,
+        ):
+            source = doc["metadata"]["source"]
+            doc_id = doc["metadata"]["doc_id"]
+            fingerprint = doc.get("fingerprint", {})
+
+            entry = manifest.get(source)
+            if entry and entry.get("doc_id") == doc_id and entry.get("indexed"):
+                # Ya se procesó y se indexó este documento: solo actualizamos
+                # los datos de stat() para no volver a leerlo la próxima vez
+                manifest[source] = {**entry, **fingerprint}
+                continue
+
+            # Se conservan los UUID anteriores hasta que la nueva versión esté
+            # escrita; None indica que no se conocen (indexado con versiones
+            # anteriores) y habrá que buscarlos en Weaviate
+            previous = entry["chunk_uuids"] if entry else []
+            doc["previous_chunk_uuids"] = previous if (previous or not entry) else None
+            manifest[source] = {
+                "doc_id": doc_id,
+                "raw_hash": fingerprint.get("raw_hash"),
+                "state": "pending",
+                "chunk_uuids": previous,
+                **fingerprint,
+            }
+
+            yield doc
+
+    def mark_indexed(docs):
+        """Borra los chunks obsoletos y marca los documentos como indexados.
+
+        Los chunks nuevos ya sobrescribieron a los que conservan su UUID; solo
+        quedan por borrar los que ya no existen en la nueva versión.
+        """
+        stale = []
+        for d in docs:
+            previous = d.get("previous_chunk_uuids")
+            if previous is None:
+                previous = find_chunk_uuids(d["metadata"]["source"], gpt_id=gpt_id)
+            stale.extend(set(previous) - set(d["chunk_uuids"]))
+        if stale:
+            delete_chunks(stale, gpt_id=gpt_id)
+        manifest.mark_indexed([(d["metadata"]["source"], d["chunk_uuids"]) for d in docs])
+
+    try:
+        summary = run_pipeline(new_documents(), gpt_id=gpt_id, on_indexed=mark_indexed)
+        changed = summary["documents"] > 0 or summary["failed"] > 0
+
+        if deleted:
+            # Se resuelve el id de OneDrive contra el manifiesto: un fichero nuevo
+            # con el mismo nombre tiene otro id y no se borra
+            sources = [
+                src for src in (manifest.find_by_onedrive_id(d["onedrive_id"]) for d in deleted)
+                if src
+            ]
+            if sources:
+                n = purge_sources(manifest, sources, gpt_id)
+                changed = True
+                print(f"🗑️  Eliminados de OneDrive: {len(sources)} documentos ({n} chunks)")
+
+        # Ficheros locales que ya no existen en DOCS_INPUT_PATH
+        root = input_path.resolve()
+        missing = [
+            src for src, _ in manifest.items()
+            if not src.startswith("OneDrive:")
+            and Path(src).is_relative_to(root)
+            and not Path(src).exists()
+        ]
+        if missing:
+            n = purge_sources(manifest, missing, gpt_id)
+            changed = True
+            print(f"🗑️  Eliminados del disco: {len(missing)} documentos ({n} chunks)")
+
+        if summary["failed"] == 0:
+            # El enlace delta solo avanza si todos los cambios quedaron indexados
+            manifest.set_meta(delta_key, json.dumps(delta_state))
+
+        if changed:
+            # Invalida las respuestas cacheadas por la API para esta colección
+            version = manifest.bump_index_version()
+            print(f"🔖 Versión del índice de {manifest.collection}: {version}")
+    finally:
+        manifest.close()
+
+    if summary["documents"]:
+        print(f"\n🟢 Documentos indexados: {summary['documents']} ({summary['chunks']} chunks)")
         print("✅ Reindexado completado.")
     else:
         print("No hay documentos nuevos para indexar.")
 
-    # Guardar el nuevo estado del tracker
-    save_tracker(tracker)
-
 if __name__ == "__main__":
     # Permite especificar el GPT (colección Weaviate) como parámetro por CLI
     parser = argparse.ArgumentParser()
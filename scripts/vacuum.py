@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+scripts/vacuum.py
+
+Busca objetos huérfanos en una colección de Weaviate comparándola con el
+manifiesto SQLite y, con ``--purge``, los elimina.
+
+Se consideran huérfanos:
+    - los chunks cuyo ``source`` ya no figura en el manifiesto (ficheros
+      borrados o colecciones indexadas por duplicado);
+    - los chunks de un documento cuyo UUID no está entre los registrados
+      para su versión actual (restos de reindexados anteriores).
+
+Los documentos indexados antes de que el manifiesto guardase los UUID
+(migrados del tracker JSON) se comprueban por ``doc_id``: los chunks de su
+``source`` con otro ``doc_id`` son de versiones anteriores y también son
+huérfanos. Solo se informan aparte, sin borrarlos, los que no se pueden
+comprobar (sin ``doc_id`` o con el documento a medio reindexar).
+
+Uso:
+    python scripts/vacuum.py --gpt_id default            # solo informe
+    python scripts/vacuum.py --gpt_id default --purge    # informe y borrado
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from src.startup_profile import maybe_profile_startup, startup_done  # noqa: E402
+maybe_profile_startup()
+
+from src.config import settings                          # noqa: E402
+from src.ingestion.manifest import Manifest              # noqa: E402
+from src.vectorstore.embedder import (                   # noqa: E402
+    collection_name_for,
+    delete_chunks,
+    get_weaviate_client,
+    iter_chunk_refs,
+)
+
+startup_done()
+
+
+def find_orphans(manifest: Manifest, gpt_id: str):
+    """Devuelve ``(huérfanos, sin_verificar, total)`` de la colección."""
+    known: dict[str, set[str] | None] = {}
+    versions: dict[str, str] = {}  # doc_id actual de los documentos sin UUID registrados
+    for source, entry in manifest.items():
+        known[source] = set(entry["chunk_uuids"]) or None
+        if known[source] is None and entry["indexed"] and entry["doc_id"]:
+            versions[source] = entry["doc_id"]
+
+    orphans: list[tuple[str, str | None]] = []
+    unverified = 0
+    total = 0
+    for uuid, source, doc_id in iter_chunk_refs(gpt_id):
+        total += 1
+        if source not in known:
+            orphans.append((uuid, source))
+        elif known[source] is not None:
+            if uuid not in known[source]:
+                orphans.append((uuid, source))
+        elif source in versions and doc_id:
+            if doc_id != versions[source]:
+                orphans.append((uuid, source))  # versión anterior del documento
+        else:
+            unverified += 1
+    return orphans, unverified, total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Informe y purga de objetos huérfanos en Weaviate")
+    parser.add_argument("--gpt_id", default="default", help="Identificador del GPT (colección en Weaviate)")
+    parser.add_argument("--purge", action="store_true", help="Eliminar los huérfanos encontrados")
+    args = parser.parse_args()
+
+    collection = collection_name_for(args.gpt_id)
+    manifest = Manifest(settings.MANIFEST_PATH, collection)
+    try:
+        print(f"\n🧹  Analizando '{collection}' …")
+        orphans, unverified, total = find_orphans(manifest, args.gpt_id)
+    finally:
+        manifest.close()
+
+    print(f"   Objetos en la colección : {total}")
+    print(f"   Huérfanos               : {len(orphans)}")
+    print(f"   Sin verificar           : {unverified}")
+
+    by_source = Counter(source for _, source in orphans)
+    for source, n in by_source.most_common(20):
+        print(f"   - {n:5d}  {source}")
+    if len(by_source) > 20:
+        print(f"   … y {len(by_source) - 20} fuentes más")
+
+    if orphans and args.purge:
+        n = delete_chunks([uuid for uuid, _ in orphans], gpt_id=args.gpt_id)
+        print(f"✅  Eliminados {n} objetos huérfanos")
+        manifest = Manifest(settings.MANIFEST_PATH, collection)
+        try:
+            manifest.bump_index_version()  # invalida las respuestas cacheadas
+        finally:
+            manifest.close()
+    elif orphans:
+        print("ℹ️  Ejecuta de nuevo con --purge para eliminarlos.")
+
+    get_weaviate_client().close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+# src/api/admission.py
+"""
+Control de admisión de ``/query`` y ``/query/stream``.
+
+Sin límites, una ráfaga de la acción de ChatGPT llenaba el threadpool, los
+límites de OpenAI empezaban a fallar y la latencia subía para todos. Cada
+petición tiene que conseguir plaza, por este orden, en:
+
+    1. su cliente        (``API_CLIENT_MAX_CONCURRENT`` / ``API_CLIENT_MAX_QUEUED``),
+                          identificado por su IP o por ``API_CLIENT_ID_HEADER``;
+    2. su ``gpt_id``     (``GPT_MAX_CONCURRENT`` / ``GPT_MAX_QUEUED``, o
+                          ``max_concurrent`` / ``max_queued`` del perfil);
+    3. el worker         (``API_MAX_CONCURRENT_QUERIES`` / ``API_MAX_QUEUED_QUERIES``).
+
+Si la cola correspondiente está llena se responde al momento: 429 si es el
+cliente el que se ha pasado de su cuota, 503 si el servicio está saturado.
+Quien espera más de ``ADMISSION_QUEUE_TIMEOUT_SECONDS`` recibe un 503. Todas
+llevan ``Retry-After``, estimado a partir del tiempo medio de servicio.
+
+El tiempo en cola cuenta para el plazo total de la petición
+(``API_REQUEST_DEADLINE_SECONDS``): :meth:`Ticket.remaining` dice cuánto
+queda para la consulta.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import deque
+
+from src.config import settings
+from src.config.gpt_profiles import GPT_PROFILES
+
+# Por encima de tantos clientes se olvidan los que no tienen nada en curso
+_MAX_CLIENTS = 4096
+
+
+class Rejected(Exception):
+    """No hay plaza: ``status`` (429/503) y segundos de ``Retry-After``."""
+
+    def __init__(self, status: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> dict:
+        return {"Retry-After": str(self.retry_after)}
+
+
+class Limiter:
+    """Plazas activas y cola FIFO acotada de un ámbito (cliente, gpt_id o worker)."""
+
+    def __init__(self, name: str, max_active: int, max_queued: int, status: int):
+        self.name = name
+        self.max_active = max(1, max_active)
+        self.max_queued = max(0, max_queued)
+        self.status = status
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._service = 1.0  # media móvil de segundos por petición
+
+    def retry_after(self) -> int:
+        """Segundos aproximados hasta que se libere una plaza para un recién llegado."""
+        backlog = len(self._waiters) + 1
+        return max(1, math.ceil(self._service * backlog / self.max_active))
+
+    async def acquire(self, timeout: float) -> None:
+        if self.active < self.max_active and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_queued:
+            self.rejected += 1
+            raise Rejected(self.status, f"Demasiadas consultas en curso ({self.name})", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                self._waiters.remove(waiter)
+                waiter.cancel()
+                self.timeouts += 1
+                raise Rejected(503, f"Tiempo de espera agotado en la cola ({self.name})", self.retry_after())
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release(None)  # la plaza ya era suya: se pasa al siguiente
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+        # release() ya ha contado la plaza al despertar a este waiter
+        self.admitted += 1
+
+    def release(self, seconds: float | None) -> None:
+        if seconds is not None:
+            self._service = 0.9 * self._service + 0.1 * seconds
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # la plaza pasa directamente al siguiente
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": len(self._waiters),
+            "max_active": self.max_active,
+            "max_queued": self.max_queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "mean_service_s": round(self._service, 3),
+        }
+
+
+class Ticket:
+    """Plazas concedidas a una petición; :meth:`release` es idempotente."""
+
+    def __init__(self, limiters: list[Limiter], started: float, deadline: float):
+        self.limiters = limiters
+        self.started = started
+        self.admitted_at = time.monotonic()
+        self.deadline = deadline
+        self._released = False
+
+    @property
+    def queued_seconds(self) -> float:
+        return self.admitted_at - self.started
+
+    def remaining(self) -> float:
+        """Segundos que quedan del plazo de la petición (descontada la cola)."""
+        return max(0.0, self.deadline - time.monotonic())
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        seconds = time.monotonic() - self.admitted_at
+        for limiter in reversed(self.limiters):
+            limiter.release(seconds)
+
+
+class AdmissionController:
+    def __init__(self):
+        self.worker = Limiter(
+            "worker", settings.API_MAX_CONCURRENT_QUERIES, settings.API_MAX_QUEUED_QUERIES, 503
+        )
+        self._gpts: dict[str, Limiter] = {}
+        self._clients: dict[str, Limiter] = {}
+
+    def _gpt(self, gpt_id: str) -> Limiter:
+        # Los gpt_id desconocidos usan el perfil "default" (como get_rag_chain)
+        gpt_id = gpt_id if gpt_id in GPT_PROFILES else "default"
+        if gpt_id not in self._gpts:
+            profile = GPT_PROFILES.get(gpt_id, GPT_PROFILES["default"])
+            self._gpts[gpt_id] = Limiter(
+                f"gpt_id={gpt_id}",
+                profile.get("max_concurrent", settings.GPT_MAX_CONCURRENT),
+                profile.get("max_queued", settings.GPT_MAX_QUEUED),
+                503,
+            )
+        return self._gpts[gpt_id]
+
+    def _client(self, client: str) -> Limiter:
+        if client not in self._clients:
+            if len(self._clients) >= _MAX_CLIENTS:
+                # Un limitador sin plazas ni cola no guarda nada que perder
+                for name, limiter in list(self._clients.items()):
+                    if not limiter.active and not limiter._waiters:
+                        del self._clients[name]
+            self._clients[client] = Limiter(
+                f"cliente {client}", settings.API_CLIENT_MAX_CONCURRENT, settings.API_CLIENT_MAX_QUEUED, 429
+            )
+        return self._clients[client]
+
+    async def admit(self, gpt_id: str, client: str) -> Ticket:
+        """Espera plaza en cliente, gpt_id y worker; lanza :class:`Rejected` si no la hay."""
+        started = time.monotonic()
+        deadline = started + settings.API_REQUEST_DEADLINE_SECONDS
+        limit = started + min(settings.ADMISSION_QUEUE_TIMEOUT_SECONDS, settings.API_REQUEST_DEADLINE_SECONDS)
+        acquired: list[Limiter] = []
+        try:
+            for limiter in (self._client(client), self._gpt(gpt_id), self.worker):
+                await limiter.acquire(max(0.0, limit - time.monotonic()))
+                acquired.append(limiter)
+        except BaseException:
+            for limiter in reversed(acquired):
+                limiter.release(None)
+            raise
+        return Ticket(acquired, started, deadline)
+
+    def stats(self) -> dict:
+        return {
+            "worker": self.worker.stats(),
+            "gpt_id": {gpt_id: l.stats() for gpt_id, l in self._gpts.items()},
+            "client": {l.name: l.stats() for l in self._clients.values()},
+        }
+
+
+admission = AdmissionController()
@@ -1,16 +1,52 @@
-from fastapi import FastAPI, HTTPException, Depends, Header
-from fastapi.concurrency import run_in_threadpool
+import asyncio
+import json
+import threading
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Depends, Header, Request
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from src.api.admission import Rejected, Ticket, admission
 from src.api.schemas import QueryRequest, QueryResponse, SourceDocument
+from src.rag_logic.answer_cache import get_answer_cache
 from src.rag_logic.generator import get_rag_chain
+from src.rag_logic.semantic_cache import get_semantic_cache
+from src.rag_logic.singleflight import coalesce_key, flights
+from src.rag_logic.retriever_module import _get_query_embedder
 from fastapi import Header
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
 from pathlib import Path
 import traceback
 
 from src.config import settings  # <-- importar configuración del .env
 
-app = FastAPI(title="RAG API", description="API de consulta semántica legal", version="0.1.0")
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Calentamiento: uvicorn no acepta peticiones hasta que termina, así que
+    # la primera consulta real no paga la carga de los modelos
+    if settings.API_WARMUP:
+        from src.rag_logic.preload import warm_up
+
+        try:
+            await run_in_threadpool(warm_up)
+        except Exception:
+            print("⚠️  Falló el calentamiento; los modelos se cargarán con la primera consulta")
+            traceback.print_exc()
+    yield
+    if settings.API_ASYNC_QUERY and not settings.USE_MOCK_MODE:
+        from src.rag_logic.async_pipeline import close_async_weaviate_client
+
+        await close_async_weaviate_client()
+
+
+app = FastAPI(
+    title="RAG API",
+    description="API de consulta semántica legal",
+    version="0.1.0",
+    lifespan=lifespan,
+)
 ALLOWED_ORIGINS = ["https://chatgpt.com"]  # o añade tu dominio de front-end
 
 # Permitir el acceso a la API desde cualquier origen para que la 
@@ -33,8 +69,34 @@ def verify_api_key(
     if settings.API_KEY and x_api_key != settings.API_KEY:
         raise HTTPException(status_code=401, detail="Invalid API key")
 
+
+def client_identity(http_request: Request) -> str:
+    """Quién hace la petición, para su cuota en el control de admisión.
+
+    Con ``API_CLIENT_ID_HEADER`` se usa esa cabecera (p. ej. ``X-Forwarded-For``
+    detrás de un proxy, del que se toma el primer valor); si no, la IP de la
+    conexión. La clave de API no sirve: hay una sola para todos.
+    """
+    if settings.API_CLIENT_ID_HEADER:
+        value = http_request.headers.get(settings.API_CLIENT_ID_HEADER, "").split(",")[0].strip()
+        if value:
+            return value
+    return http_request.client.host if http_request.client else "desconocido"
+
+
+async def _admit(gpt_id: str, client: str) -> Ticket:
+    """Plaza para la consulta o respuesta inmediata 429/503 con Retry-After."""
+    try:
+        return await admission.admit(gpt_id, client)
+    except Rejected as e:
+        raise HTTPException(status_code=e.status, detail=e.detail, headers=e.headers)
+
 @app.post("/query", response_model=QueryResponse)
-async def query(request: QueryRequest, valid: bool = Depends(verify_api_key)):
+async def query(
+    request: QueryRequest,
+    valid: bool = Depends(verify_api_key),
+    client: str = Depends(client_identity),
+):
     if settings.USE_MOCK_MODE:
         print(f"[MOCK] Recibida pregunta: {request.question}")
         return QueryResponse(
@@ -47,10 +109,27 @@ async def query(request: QueryRequest, valid: bool = Depends(verify_api_key)):
             ]
         )
 
+    # Si la misma pregunta ya está en curso, se espera su resultado sin
+    # ocupar plaza: no añade trabajo (ver src/rag_logic/singleflight.py)
+    key = coalesce_key(request.gpt_id, request.question, settings.RETRIEVER_K)
+    coalesce = settings.SINGLEFLIGHT_ENABLED
+    ticket = None if coalesce and flights.in_flight(key) else await _admit(request.gpt_id, client)
+    queued = ticket.queued_seconds if ticket else 0.0
     try:
-        
         chain = get_rag_chain(gpt_id=request.gpt_id, k=settings.RETRIEVER_K)
-        result = await run_in_threadpool(chain, request.question)
+        if settings.API_ASYNC_QUERY:
+            compute = lambda: chain.arun(request.question)
+        else:
+            compute = lambda: run_in_threadpool(chain, request.question)
+        # El tiempo en cola ya cuenta para el plazo de la petición
+        remaining = ticket.remaining() if ticket else settings.API_REQUEST_DEADLINE_SECONDS
+        if coalesce:
+            # La plaza pasa al cálculo compartido, que la libera al terminar
+            # aunque este cliente se desconecte antes
+            call, ticket = flights.do(key, compute, ticket), None
+        else:
+            call = compute()
+        result = await asyncio.wait_for(call, remaining)
 
         sources = [
             SourceDocument(
@@ -65,10 +144,127 @@ async def query(request: QueryRequest, valid: bool = Depends(verify_api_key)):
             sources=sources
         )
 
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=504,
+            detail=f"Plazo de {settings.API_REQUEST_DEADLINE_SECONDS:g}s agotado "
+                   f"({queued:.1f}s en cola)",
+        )
     except Exception as e:
         print("ERROR en /query:")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error al procesar la consulta: {str(e)}")
+    finally:
+        if ticket is not None:
+            ticket.release()
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def _close_quietly(events) -> None:
+    """Cierra el generador de eventos sin propagar errores: después hay que
+    liberar el ticket de admisión pase lo que pase."""
+    try:
+        events.close()
+    except ValueError:
+        # Un hilo sigue dentro de next(): terminará al ver la cancelación
+        pass
+    except Exception as exc:
+        print(f"⚠️  Error al cerrar el stream: {exc!r}")
+
+
+def _mock_events(question: str):
+    print(f"[MOCK] Recibida pregunta (stream): {question}")
+    yield "sources", [
+        SourceDocument(
+            content="(Documento simulado) Este sería un fragmento relevante del corpus legal.",
+            metadata={"simulado": True, "documento": "ejemplo.txt"}
+        )
+    ]
+    for word in "(Simulación) El sistema ha recibido tu pregunta y funcionaría correctamente.".split(" "):
+        yield "token", word + " "
+
+
+@app.post("/query/stream")
+async def query_stream(
+    request: QueryRequest,
+    valid: bool = Depends(verify_api_key),
+    client: str = Depends(client_identity),
+):
+    """Como ``/query``, pero en Server-Sent Events.
+
+    Eventos: ``sources`` (fuentes recuperadas, antes de generar), ``token``
+    (fragmentos de la respuesta según los produce el LLM), ``done`` y, si
+    algo falla, ``error``. Si el cliente se desconecta se deja de generar.
+    """
+    cancelled = threading.Event()
+    ticket = None
+    if settings.USE_MOCK_MODE:
+        events = _mock_events(request.question)
+    else:
+        ticket = await _admit(request.gpt_id, client)
+        try:
+            chain = get_rag_chain(gpt_id=request.gpt_id, k=settings.RETRIEVER_K)
+        except Exception as e:
+            ticket.release()
+            traceback.print_exc()
+            raise HTTPException(status_code=500, detail=f"Error al procesar la consulta: {str(e)}")
+        events = chain.stream(request.question, cancelled)
+
+    async def body():
+        try:
+            async for kind, payload in iterate_in_threadpool(events):
+                if kind == "sources":
+                    payload = jsonable_encoder([
+                        doc if isinstance(doc, SourceDocument)
+                        else SourceDocument(content=doc.page_content, metadata=doc.metadata)
+                        for doc in payload
+                    ])
+                yield _sse(kind, payload)
+                if ticket is not None and not ticket.remaining():
+                    yield _sse("error", {"detail": f"Plazo de {settings.API_REQUEST_DEADLINE_SECONDS:g}s agotado"})
+                    return
+            yield _sse("done", {})
+        except Exception as e:
+            print("ERROR en /query/stream:")
+            traceback.print_exc()
+            yield _sse("error", {"detail": f"Error al procesar la consulta: {str(e)}"})
+        finally:
+            # Desconexión del cliente (o fin normal): se corta la generación
+            # (sin await: la tarea puede estar ya cancelada)
+            cancelled.set()
+            _close_quietly(events)
+            if ticket is not None:
+                ticket.release()
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Por si el cliente se va antes de empezar el cuerpo (release es idempotente)
+        background=BackgroundTask(ticket.release) if ticket is not None else None,
+    )
+
+@app.get("/stats", include_in_schema=False)
+async def stats(valid: bool = Depends(verify_api_key)):
+    """Métricas internas del worker que atiende la petición."""
+    embedder = _get_query_embedder() if _get_query_embedder.cache_info().currsize else None
+    cache = get_answer_cache()
+    semantic = get_semantic_cache()
+    speculative = None
+    if settings.USE_LOCAL_LLM and settings.LLM_DRAFT_MODEL_PATH and not settings.LLM_SERVER_ENABLED:
+        from src.rag_logic.speculative import speculative_stats
+
+        speculative = speculative_stats()
+    return {
+        "query_embeddings": embedder.stats() if hasattr(embedder, "stats") else None,
+        "answer_cache": cache.stats() if cache else None,
+        "semantic_cache": semantic.stats() if semantic else None,
+        "admission": admission.stats(),
+        "singleflight": flights.stats(),
+        "speculative": speculative,
+    }
 
 app.get("/openapi.yaml", include_in_schema=False)
 async def openapi_yaml():
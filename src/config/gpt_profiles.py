@@ -1,11 +1,17 @@
 # src/config/gpt_profiles.py
 
-from langchain.prompts import PromptTemplate
+from langchain_core.prompts import PromptTemplate
+
+# Prompt de los perfiles sin uno propio
+DEFAULT_PROMPT = PromptTemplate.from_template("Contexto:\n{context}\n\nPregunta: {question}\n\nRespuesta:")
 
 GPT_PROFILES = {
 
     # Define aquí los perfiles de GPT que usarás en tu aplicación
     # Cada perfil debe tener un nombre único y puede incluir una colección de documentos
+    # En los prompts, todo el texto fijo (instrucciones) va ANTES de {context} y
+    # {question}: con el LLM local su caché KV se calcula una vez y se reutiliza
+    # (ver src/rag_logic/prefix_cache.py)
     "default": {
         "collection": "LegalDocs",
         "prompt": PromptTemplate(
@@ -44,9 +50,25 @@ Conclusión:
 
     # este es un ejemplo de cómo podrías definir un perfil para recursos humanos
     # no es necesario que uses un PromptTemplate específico, puedes dejarlo como None
+    # con "semantic_cache": True el perfil reutiliza respuestas de preguntas parecidas
+    # (si SEMANTIC_CACHE_ENABLED=true)
+    # "max_concurrent" / "max_queued" sustituyen a GPT_MAX_CONCURRENT / GPT_MAX_QUEUED
+    # para este perfil (control de admisión de /query)
 
     "rrhh": {
         "collection": "LegalDocs_rrhh",
         "prompt": None  # Si quisieras usar uno genérico
     }
 }
+
+
+def prompt_for(profile: dict) -> PromptTemplate:
+    return profile.get("prompt") or DEFAULT_PROMPT
+
+
+def static_prefix(prompt: PromptTemplate) -> str:
+    """Parte fija inicial del prompt: hasta el último salto de línea anterior a
+    la primera variable (así su tokenización no depende de lo que siga)."""
+    template = prompt.template
+    head = template[:template.find("{")] if "{" in template else template
+    return head[:head.rfind("\n") + 1]
@@ -23,6 +23,9 @@ OPENAI_MODEL_NAME = os.getenv("OPENAI_MODEL_NAME", "gpt-4o")
 # Se usa para la indexación y búsqueda de documentos legales
 WEAVIATE_URL = os.getenv("WEAVIATE_URL")
 WEAVIATE_API_KEY = os.getenv("WEAVIATE_API_KEY")
+# Escritura por lotes en Weaviate: objetos por petición y peticiones en paralelo
+WEAVIATE_BATCH_SIZE = int(os.getenv("WEAVIATE_BATCH_SIZE", "200"))
+WEAVIATE_BATCH_CONCURRENCY = int(os.getenv("WEAVIATE_BATCH_CONCURRENCY", "2"))
 
 # Verifica si se debe usar un LLM local o uno remoto
 # Si USE_LOCAL_LLM es "true", se usará un modelo local, de lo contrario, se usará un modelo remoto
@@ -30,9 +33,56 @@ WEAVIATE_API_KEY = os.getenv("WEAVIATE_API_KEY")
 USE_LOCAL_LLM = os.getenv("USE_LOCAL_LLM", "true").lower() == "true"
 LLM_MODEL_PATH = Path(os.getenv("LLM_MODEL_PATH", BASE_DIR / "models" / "mistral-7b-instruct-v0.1.Q4_K_M.gguf"))
 LLM_MODEL_URL = os.getenv("LLM_MODEL_URL", "http://localhost:8001")
+# Abre los pesos GGUF con mmap: quedan en la caché de páginas del sistema y
+# los procesos que cargan el mismo fichero comparten esa memoria
+LLM_USE_MMAP = os.getenv("LLM_USE_MMAP", "true").lower() == "true"
+# Modelo de sentence-transformers usado para los embeddings (indexado y consultas)
+EMBEDDING_MODEL_NAME = os.getenv(
+    "EMBEDDING_MODEL_NAME", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+)
 # Dispositivo para generar los embeddings locales ("cpu" o "cuda")
 EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "cpu")
 BATCH_SIZE = int(os.getenv("BATCH_SIZE", "64"))
+# Backend de embeddings: "torch" (HuggingFaceEmbeddings) u "onnx" (ONNX Runtime).
+# Con "onnx" el modelo se exporta la primera vez a EMBEDDING_ONNX_PATH y, si
+# EMBEDDING_ONNX_QUANTIZE es "true", se cuantiza a int8. Hilos 0 = automático.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_ONNX_PATH = Path(os.getenv("EMBEDDING_ONNX_PATH", BASE_DIR / "models" / "onnx"))
+EMBEDDING_ONNX_QUANTIZE = os.getenv("EMBEDDING_ONNX_QUANTIZE", "true").lower() == "true"
+EMBEDDING_ONNX_THREADS = int(os.getenv("EMBEDDING_ONNX_THREADS", "0"))
+
+# Indexación masiva: los chunks se ordenan por longitud en tokens antes de
+# vectorizarlos para que cada lote tenga poco relleno. EMBEDDING_SORT_WINDOW es
+# el número de chunks que el pipeline agrupa y ordena juntos en cada llamada.
+# Con EMBEDDING_PROCESSES > 1 (solo backend torch) los lotes se reparten entre
+# varios procesos con el pool de sentence-transformers.
+EMBEDDING_LENGTH_BUCKETING = os.getenv("EMBEDDING_LENGTH_BUCKETING", "true").lower() == "true"
+EMBEDDING_SORT_WINDOW = int(os.getenv("EMBEDDING_SORT_WINDOW", "512"))
+EMBEDDING_PROCESSES = int(os.getenv("EMBEDDING_PROCESSES", "1"))
+
+# Micro-lotes de embeddings de consultas en la API: las preguntas concurrentes
+# se agrupan durante QUERY_BATCH_WAIT_MS milisegundos o hasta reunir
+# QUERY_BATCH_MAX_SIZE (1 desactiva la agrupación)
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))
+QUERY_BATCH_WAIT_MS = float(os.getenv("QUERY_BATCH_WAIT_MS", "5"))
+
+# Caché en disco de embeddings (modelo, hash del texto) → vector para no
+# recalcular los chunks ya vistos al reindexar. Tamaño máximo en vectores.
+USE_EMBEDDING_CACHE = os.getenv("USE_EMBEDDING_CACHE", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = Path(os.getenv("EMBEDDING_CACHE_PATH", BASE_DIR / "data" / "embedding_cache"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+
+# Número de procesos usados para extraer el texto de los documentos en paralelo.
+# Con 1 la extracción es secuencial; por defecto se usan todos los núcleos.
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+# Los PDF con más páginas que este valor se reparten por rangos entre procesos
+# (0 desactiva la división)
+PDF_SHARD_PAGES = int(os.getenv("PDF_SHARD_PAGES", "200"))
+
+# Pipeline de indexación en streaming: tamaño máximo de cada cola entre fases
+# (documentos o lotes) y segundos tras los que se escribe un lote incompleto
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+PIPELINE_FLUSH_SECONDS = float(os.getenv("PIPELINE_FLUSH_SECONDS", "2"))
 
 # Ruta al directorio de OneDrive, donde se almacenarán los documentos legales
 # Este directorio se usa para sincronizar documentos desde OneDrive a la aplicación
@@ -48,10 +98,25 @@ ONEDRIVE_FOLDER = os.getenv("ONEDRIVE_FOLDER", "")  # carpeta raíz por defecto
 # Configuración de reintentos para el cliente de OneDrive
 ONEDRIVE_MAX_RETRIES = int(os.getenv("ONEDRIVE_MAX_RETRIES", "3"))
 ONEDRIVE_RETRY_DELAY = float(os.getenv("ONEDRIVE_RETRY_DELAY", "2"))
+# Espera máxima entre reintentos (el retardo crece de forma exponencial salvo
+# que Graph indique otro valor con la cabecera Retry-After)
+ONEDRIVE_MAX_BACKOFF = float(os.getenv("ONEDRIVE_MAX_BACKOFF", "60"))
+
+# Descargas simultáneas desde OneDrive y carpeta para los ficheros temporales
+# (por defecto la carpeta temporal del sistema)
+ONEDRIVE_DOWNLOAD_WORKERS = int(os.getenv("ONEDRIVE_DOWNLOAD_WORKERS", "4"))
+ONEDRIVE_TEMP_DIR = os.getenv("ONEDRIVE_TEMP_DIR") or None
 
 # Habilita la descarga automática de archivos desde OneDrive
 USE_ONEDRIVE = os.getenv("USE_ONEDRIVE", "false").lower() == "true"
 
+# Sincronización incremental con el endpoint /delta de Microsoft Graph: solo se
+# descargan los ficheros añadidos o modificados desde la última ejecución
+ONEDRIVE_DELTA_SYNC = os.getenv("ONEDRIVE_DELTA_SYNC", "true").lower() == "true"
+
+# URL base de Microsoft Graph (se puede apuntar a un servidor falso para pruebas)
+ONEDRIVE_GRAPH_URL = os.getenv("ONEDRIVE_GRAPH_URL", "https://graph.microsoft.com/v1.0")
+
 # Futuro endpoint público (p.ej. URL de despliegue de la API)
 ENTRYPOINT_URL = os.getenv("ENTRYPOINT_URL")
 
@@ -67,6 +132,10 @@ DATA_CHUNKS_PATH = Path(os.getenv("DATA_CHUNKS_PATH", BASE_DIR / "data" / "chunk
 # Este índice se usa para la búsqueda y recuperación de documentos relevantes
 DATA_INDEX_PATH = Path(os.getenv("DATA_INDEX_PATH", BASE_DIR / "data" / "index"))
 
+# Manifiesto SQLite con el estado de indexación de cada documento
+# (sustituye a data/.processed_files.json, que se migra automáticamente)
+MANIFEST_PATH = Path(os.getenv("MANIFEST_PATH", BASE_DIR / "data" / "manifest.sqlite3"))
+
 # Verifica si el modo de simulación está activado
 # Si USE_MOCK_MODE es "true", se simularán las respuestas sin usar el LLM real
 # Si es "false", se usará el LLM real para generar respuestas
@@ -91,6 +160,12 @@ DOCS_OUTPUT_PATH = os.getenv("DOCS_OUTPUT_PATH", "data/chunks")
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "400"))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "50"))
 
+# Tokenizer para contar tokens del contexto: "auto" (el del LLM configurado:
+# vocabulario del GGUF o tiktoken), "tiktoken[:<codificación>]",
+# "gguf[:<ruta>]" o "hf:<modelo>". Textos cuyo recuento se cachea (LRU).
+LLM_TOKENIZER = os.getenv("LLM_TOKENIZER", "auto").strip()
+TOKEN_COUNT_CACHE_SIZE = int(os.getenv("TOKEN_COUNT_CACHE_SIZE", "20000"))
+
 # Límite máximo de tokens a enviar como contexto al modelo
 MAX_CONTEXT_TOKENS = int(os.getenv("MAX_CONTEXT_TOKENS", "3000"))
 
@@ -100,3 +175,90 @@ MAX_COMPLETION_TOKENS = int(os.getenv("MAX_COMPLETION_TOKENS", "800"))
 # Número de documentos a recuperar por el retriever si no se especifica otro valor
 RETRIEVER_K = int(os.getenv("RETRIEVER_K", "5"))
 
+# Precarga tokenizer, embedder y LLM local en el proceso padre de
+# scripts/start_api.py antes de crear los workers (fork), que comparten esa
+# memoria por copy-on-write. Segundos tras los que se informa de la memoria
+# por worker (0 desactiva el informe).
+API_PRELOAD = os.getenv("API_PRELOAD", "false").lower() == "true"
+API_MEMORY_REPORT_SECONDS = float(os.getenv("API_MEMORY_REPORT_SECONDS", "30"))
+
+# Cada worker de la API carga sus modelos y hace una consulta de prueba al
+# embedder antes de aceptar peticiones (la primera consulta real no paga la carga)
+API_WARMUP = os.getenv("API_WARMUP", "true").lower() == "true"
+
+# Caché de respuestas exactas (gpt_id, pregunta normalizada, k, perfil y
+# versión del índice): LRU en memoria con caducidad y, si ANSWER_CACHE_SHARED
+# es "true", un nivel SQLite en ANSWER_CACHE_PATH compartido por los workers.
+# La versión del índice se relee del manifiesto cada INDEX_VERSION_CHECK_SECONDS.
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+ANSWER_CACHE_SHARED = os.getenv("ANSWER_CACHE_SHARED", "true").lower() == "true"
+ANSWER_CACHE_PATH = Path(os.getenv("ANSWER_CACHE_PATH", BASE_DIR / "data" / "answer_cache.sqlite3"))
+INDEX_VERSION_CHECK_SECONDS = float(os.getenv("INDEX_VERSION_CHECK_SECONDS", "2"))
+
+# Caché semántica: reutiliza la respuesta de una pregunta ya respondida del
+# mismo perfil si la similitud coseno de sus embeddings supera el umbral.
+# Preguntas guardadas por perfil en el índice en memoria de cada worker.
+# Desactivada por defecto: una paráfrasis puede no pedir lo mismo (p. ej.
+# cambia una fecha o un artículo). Con SEMANTIC_CACHE_ENABLED=true solo la
+# usan los perfiles con "semantic_cache": True en GPT_PROFILES.
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+
+# /query asíncrono: búsqueda con WeaviateAsyncClient y OpenAI con ainvoke; el
+# embedding, el recorte por tokens y el LLM local van a ejecutores propios.
+# Límites por worker: consultas en curso, hilos de CPU y llamadas a OpenAI.
+API_ASYNC_QUERY = os.getenv("API_ASYNC_QUERY", "true").lower() == "true"
+API_MAX_CONCURRENT_QUERIES = int(os.getenv("API_MAX_CONCURRENT_QUERIES", "256"))
+API_MAX_QUEUED_QUERIES = int(os.getenv("API_MAX_QUEUED_QUERIES", "512"))
+ASYNC_CPU_WORKERS = int(os.getenv("ASYNC_CPU_WORKERS", "4"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "64"))
+
+# Servidor LLM local (scripts/start_llm_server.py): carga el GGUF una vez y
+# atiende a todos los workers en LLM_MODEL_URL (http://host:puerto o
+# unix:///ruta.sock). Reparte los turnos por gpt_id con un máximo de
+# generaciones activas y en espera por gpt_id. LLM_SERVER_SLOTS generaciones
+# en paralelo (comparten los pesos por mmap). El backend "stub" no carga
+# ningún modelo (pruebas en CPU).
+LLM_SERVER_ENABLED = os.getenv("LLM_SERVER_ENABLED", "false").lower() == "true"
+LLM_SERVER_BACKEND = os.getenv("LLM_SERVER_BACKEND", "llama").lower()
+LLM_SERVER_SLOTS = int(os.getenv("LLM_SERVER_SLOTS", "1"))
+LLM_SERVER_MAX_PER_GPT = int(os.getenv("LLM_SERVER_MAX_PER_GPT", "1"))
+LLM_SERVER_MAX_QUEUE = int(os.getenv("LLM_SERVER_MAX_QUEUE", "64"))
+LLM_SERVER_TIMEOUT = float(os.getenv("LLM_SERVER_TIMEOUT", "300"))
+LLM_SERVER_STUB_TOKENS_PER_SECOND = float(os.getenv("LLM_SERVER_STUB_TOKENS_PER_SECOND", "50"))
+
+# Caché KV de la parte fija de los prompts de cada perfil con el LLM local:
+# se evalúa una vez y se restaura antes de generar; los estados se guardan en
+# LLM_PREFIX_CACHE_DIR para que los reinicios no los recalculen.
+LLM_PREFIX_CACHE = os.getenv("LLM_PREFIX_CACHE", "true").lower() == "true"
+LLM_PREFIX_CACHE_DIR = Path(os.getenv("LLM_PREFIX_CACHE_DIR", BASE_DIR / "data" / "kv_prefix_cache"))
+
+# Decodificación especulativa del LLM local: un GGUF borrador pequeño con el
+# mismo vocabulario (o "prompt-lookup", n-gramas del propio prompt) propone
+# LLM_DRAFT_LOOKAHEAD tokens que el modelo principal verifica. Vacío = desactivada.
+LLM_DRAFT_MODEL_PATH = os.getenv("LLM_DRAFT_MODEL_PATH", "")
+LLM_DRAFT_LOOKAHEAD = int(os.getenv("LLM_DRAFT_LOOKAHEAD", "5"))
+
+# Control de admisión de /query: plazas activas y cola por cliente, por
+# gpt_id (un perfil puede fijar "max_concurrent" / "max_queued") y por worker
+# (API_MAX_CONCURRENT_QUERIES / API_MAX_QUEUED_QUERIES). Con la cola llena se
+# responde 429 (cliente) o 503 (servicio) con Retry-After. El tiempo en cola
+# cuenta para el plazo total de la petición.
+# El cliente es la IP de la conexión o, con API_CLIENT_ID_HEADER, el primer
+# valor de esa cabecera (p. ej. X-Forwarded-For detrás de un proxy de
+# confianza). API_KEY_MAX_* se siguen aceptando como nombres antiguos.
+GPT_MAX_CONCURRENT = int(os.getenv("GPT_MAX_CONCURRENT", "32"))
+GPT_MAX_QUEUED = int(os.getenv("GPT_MAX_QUEUED", "64"))
+API_CLIENT_MAX_CONCURRENT = int(os.getenv("API_CLIENT_MAX_CONCURRENT", os.getenv("API_KEY_MAX_CONCURRENT", "64")))
+API_CLIENT_MAX_QUEUED = int(os.getenv("API_CLIENT_MAX_QUEUED", os.getenv("API_KEY_MAX_QUEUED", "128")))
+API_CLIENT_ID_HEADER = os.getenv("API_CLIENT_ID_HEADER", "")
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "10"))
+API_REQUEST_DEADLINE_SECONDS = float(os.getenv("API_REQUEST_DEADLINE_SECONDS", "120"))
+
+# Agrupación de preguntas idénticas en curso: las peticiones con el mismo
+# (gpt_id, pregunta normalizada, k) que llegan mientras la primera se calcula
+# esperan su resultado en lugar de repetir búsqueda y generación.
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
@@ -1,6 +1,12 @@
-from typing import List, Dict
+from typing import List, Dict, Iterable, Iterator
 from pathlib import Path
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import io
+import os
+import stat
+import tempfile
+import time
 import fitz  # PyMuPDF
 import docx
 import hashlib
@@ -31,16 +37,91 @@ def extract_text_from_txt(file_path: Path) -> str:
     with open(file_path, "r", encoding="utf-8") as f:
         return f.read()
 
+def extract_text_from_pdf_pages(file_path: Path, start: int, end: int) -> str:
+    """Extrae solo las páginas ``[start, end)`` de un PDF."""
+    with fitz.open(file_path) as doc:
+        return "".join(doc[i].get_text() for i in range(start, end))
+
 def extract_text(file_path: Path) -> str:
-    if file_path.suffix == ".pdf":
+    ext = file_path.suffix.lower()
+    if ext == ".pdf":
         return extract_text_from_pdf(file_path)
-    elif file_path.suffix == ".docx":
+    elif ext == ".docx":
         return extract_text_from_docx(file_path)
-    elif file_path.suffix == ".txt":
+    elif ext == ".txt":
         return extract_text_from_txt(file_path)
     else:
         raise ValueError(f"Unsupported file type: {file_path.suffix}")
 
+# ── extracción en paralelo ──────────────────────────────────────────
+def _plan_extraction(file_path: Path, shard_pages: int) -> list[tuple]:
+    """Divide un fichero en trabajos ``(ruta, inicio, fin)``.
+
+    Los PDF con más de ``shard_pages`` páginas se reparten por rangos de
+    páginas; el resto de ficheros se extrae en un único trabajo.
+    """
+    if file_path.suffix.lower() == ".pdf" and shard_pages > 0:
+        with fitz.open(file_path) as doc:
+            pages = doc.page_count
+        if pages > shard_pages:
+            return [
+                (file_path, start, min(start + shard_pages, pages))
+                for start in range(0, pages, shard_pages)
+            ]
+    return [(file_path, None, None)]
+
+def _extract_job(job: tuple) -> str:
+    """Ejecuta un trabajo de extracción (se llama dentro de los procesos hijo)."""
+    file_path, start, end = job
+    if start is None:
+        return extract_text(file_path)
+    return extract_text_from_pdf_pages(file_path, start, end)
+
+def iter_extracted_texts(
+    files: Iterable[Path],
+    workers: int | None = None,
+) -> Iterator[tuple[Path, str | None, Exception | None]]:
+    """Extrae el texto de ``files`` y devuelve ``(ruta, texto, error)`` en orden.
+
+    Con ``workers > 1`` los ficheros (y los trozos de los PDF grandes) se
+    reparten en un ``ProcessPoolExecutor``. Solo se mantienen en vuelo
+    ``2 * workers`` ficheros a la vez para no acumular textos en memoria.
+    """
+    workers = settings.INGEST_WORKERS if workers is None else workers
+
+    if workers <= 1:
+        for file in files:
+            try:
+                yield file, extract_text(file), None
+            except Exception as e:
+                yield file, None, e
+        return
+
+    window = 2 * workers
+    pending: deque = deque()
+
+    def _collect(file, futures, error):
+        if error is not None:
+            return file, None, error
+        try:
+            return file, "".join(f.result() for f in futures), None
+        except Exception as e:
+            return file, None, e
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for file in files:
+            try:
+                jobs = _plan_extraction(file, settings.PDF_SHARD_PAGES)
+                pending.append((file, [pool.submit(_extract_job, j) for j in jobs], None))
+            except Exception as e:
+                pending.append((file, [], e))
+
+            if len(pending) >= window:
+                yield _collect(*pending.popleft())
+
+        while pending:
+            yield _collect(*pending.popleft())
+
 def extract_text_from_bytes(filename: str, data: bytes) -> str:
     ext = Path(filename).suffix.lower()
     if ext == ".pdf":
@@ -61,25 +142,116 @@ def compute_hash(data: bytes) -> str:
     """Devuelve un hash SHA1 del contenido para identificarlo de forma estable."""
     return hashlib.sha1(data).hexdigest()
 
+def compute_file_hash(file_path: Path, block_size: int = 1 << 20) -> str:
+    """Hash SHA1 de los bytes del fichero, leído por bloques sin extraer el texto."""
+    h = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        while block := f.read(block_size):
+            h.update(block)
+    return h.hexdigest()
+
+def file_fingerprint(st: os.stat_result) -> dict:
+    """Datos de ``stat()`` con los que se detecta si un fichero ha cambiado."""
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "inode": st.st_ino}
+
+def _same_fingerprint(entry: dict, fingerprint: dict) -> bool:
+    return all(entry.get(k) == v for k, v in fingerprint.items())
+
 def process_documents(
     input_folder: Path,
     output_folder: Path,
     save_to_disk: bool = True,
     tracker: dict | None = None,
+    workers: int | None = None,
 ) -> List[Dict]:
     """Procesa documentos locales y, opcionalmente, archivos remotos de OneDrive.
 
     Si ``save_to_disk`` es ``False`` los textos extraídos no se guardan en
     ``output_folder`` y solo se devuelven en memoria.
     Cuando se pasa ``tracker`` se omiten los archivos locales ya procesados
-    (marcados como ``chunked`` e ``indexed``) para evitar releerlos.
+    (marcados como ``chunked`` e ``indexed``) que no han cambiado desde
+    entonces: primero se compara ``(size, mtime_ns, inode)`` y, si difiere,
+    el hash de los bytes (``raw_hash``) antes de extraer el texto.
+    ``workers`` fija el número de procesos de extracción local
+    (por defecto ``settings.INGEST_WORKERS``).
+
+    Los documentos locales incluyen además la clave ``fingerprint`` con los
+    datos de ``stat()`` y el ``raw_hash`` que se deben guardar en el tracker.
+
+    Devuelve la lista completa; para procesar el corpus sin cargarlo entero
+    en memoria usa :func:`iter_documents`.
+    """
+    return list(iter_documents(
+        input_folder,
+        output_folder,
+        save_to_disk=save_to_disk,
+        tracker=tracker,
+        workers=workers,
+    ))
+
+def _remote_source(name: str) -> str:
+    return f"OneDrive:{settings.ONEDRIVE_FOLDER}/{name}"
+
+def _onedrive_delta_items(client, delta_state: dict, deleted: list | None):
+    """Obtiene solo los cambios de OneDrive desde la última sincronización.
+
+    Añade a ``deleted`` los elementos borrados y devuelve los ficheros nuevos
+    o modificados, la clave de ``delta_state`` y el nuevo enlace delta. El
+    llamador debe guardar el enlace únicamente cuando haya procesado todos
+    los cambios, para no perder ninguno si algo falla.
+    """
+    key = f"{settings.ONEDRIVE_DRIVE_ID}:{settings.ONEDRIVE_FOLDER}"
+    items, delta_link = client.get_delta(
+        settings.ONEDRIVE_DRIVE_ID,
+        settings.ONEDRIVE_FOLDER,
+        delta_state.get(key),
+    )
+    files = []
+    removed = 0
+    for item in items:
+        if "deleted" in item:
+            # Incluye los movidos fuera de la carpeta; los que nunca estuvieron
+            # en ella no aparecen en el manifiesto y no se borra nada
+            removed += 1
+            if deleted is not None:
+                deleted.append({"onedrive_id": item["id"], "name": item.get("name")})
+            continue
+        files.append(item)
+    print(f"🔄  OneDrive delta: {len(files)} ficheros nuevos o modificados, {removed} borrados o fuera de la carpeta")
+    return files, key, delta_link
+
+def _needs_download(item: dict, tracker) -> bool:
+    if Path(item["name"]).suffix.lower() not in SUPPORTED_EXTENSIONS:
+        return False
+    # Los cambios solo de metadatos (p. ej. permisos) no alteran el cTag
+    entry = tracker.get(_remote_source(item["name"])) if tracker else None
+    ctag = item.get("cTag")
+    return not (entry and ctag and entry.get("ctag") == ctag and entry.get("indexed"))
+
+def iter_documents(
+    input_folder: Path,
+    output_folder: Path,
+    save_to_disk: bool = True,
+    tracker: dict | None = None,
+    workers: int | None = None,
+    delta_state: dict | None = None,
+    deleted: list | None = None,
+) -> Iterator[Dict]:
+    """Versión perezosa de :func:`process_documents`.
+
+    Devuelve cada documento ``{"text", "metadata"}`` en cuanto se extrae, de
+    modo que las siguientes fases pueden empezar antes de leer todo el corpus.
+
+    Con ``ONEDRIVE_DELTA_SYNC`` y un ``delta_state`` (diccionario persistido
+    por el llamador) solo se descargan los ficheros remotos añadidos o
+    modificados desde la última ejecución; los borrados se añaden a
+    ``deleted`` como ``{"onedrive_id", "name"}`` para que el indexador los
+    elimine. ``delta_state`` se actualiza al terminar de recorrer OneDrive.
     """
     if save_to_disk:
         output_folder.mkdir(parents=True, exist_ok=True)
     input_folder.mkdir(parents=True, exist_ok=True)
 
-    processed_docs = []
-
     if settings.USE_ONEDRIVE and OneDriveClient:
         try:
             client = OneDriveClient(
@@ -87,47 +259,102 @@ def process_documents(
                 settings.ONEDRIVE_CLIENT_SECRET,
                 settings.ONEDRIVE_TENANT_ID,
             )
-            for name, item_id, modified, data in client.iter_files(
-                drive_id=settings.ONEDRIVE_DRIVE_ID,
-                folder_path=settings.ONEDRIVE_FOLDER,
-                recursive=True,
-            ):
-                if Path(name).suffix.lower() not in SUPPORTED_EXTENSIONS:
-                    continue
+            drive_id = settings.ONEDRIVE_DRIVE_ID
+            use_delta = settings.ONEDRIVE_DELTA_SYNC and delta_state is not None
+            if use_delta:
+                items, delta_key, delta_link = _onedrive_delta_items(client, delta_state, deleted)
+            else:
+                items = client.walk_files(drive_id, settings.ONEDRIVE_FOLDER, recursive=True)
+            items = (item for item in items if _needs_download(item, tracker))
 
+            # Las descargas (en paralelo, a ficheros temporales) alimentan
+            # directamente la extracción en procesos; ambas van acotadas
+            with tempfile.TemporaryDirectory(dir=settings.ONEDRIVE_TEMP_DIR) as tmp_dir:
+                downloaded: dict[Path, tuple[dict, str]] = {}
+                failures = []
 
+                def _downloaded_paths():
+                    for item, path, raw_hash, error in client.iter_downloads(drive_id, items, Path(tmp_dir)):
+                        if error is not None:
+                            print(f"Error descargando {item['name']}: {error}")
+                            failures.append(item["name"])
+                            continue
+                        downloaded[path] = (item, raw_hash)
+                        yield path
 
-                print(f"Procesando remoto: {name}")
-                content = extract_text_from_bytes(name, data)
-                file_hash = compute_hash(data)
-                metadata = {
-                    "doc_id": file_hash,
-                    "filename": name,
-                    "created": modified or datetime.datetime.now().isoformat(),
-                    "source": f"OneDrive:{settings.ONEDRIVE_FOLDER}/{name}",
-                    "onedrive_id": item_id,
-                }
-                if save_to_disk:
-                    with open(output_folder / f"{file_hash}.txt", "w", encoding="utf-8") as f_out:
-                        f_out.write(content)
-                processed_docs.append({"text": content, "metadata": metadata})
+                for path, content, error in iter_extracted_texts(_downloaded_paths(), workers=workers):
+                    item, raw_hash = downloaded.pop(path)
+                    path.unlink(missing_ok=True)
+                    name = item["name"]
+                    if error is not None:
+                        print(f"Error procesando {name}: {error}")
+                        failures.append(name)
+                        continue
+
+                    print(f"Procesando remoto: {name}")
+                    metadata = {
+                        "doc_id": raw_hash,
+                        "filename": name,
+                        "created": item.get("lastModifiedDateTime") or datetime.datetime.now().isoformat(),
+                        "source": _remote_source(name),
+                        "onedrive_id": item["id"],
+                    }
+                    if save_to_disk:
+                        with open(output_folder / f"{raw_hash}.txt", "w", encoding="utf-8") as f_out:
+                            f_out.write(content)
+                    yield {
+                        "text": content,
+                        "metadata": metadata,
+                        "fingerprint": {"onedrive_id": item["id"], "ctag": item.get("cTag")},
+                    }
+
+            if use_delta and not failures:
+                delta_state[delta_key] = delta_link
         except Exception as e:
             print(f"Error sincronizando OneDrive: {e}")
 
-    for file in input_folder.rglob("*"):
-        if not file.is_file() or file.suffix.lower() not in SUPPORTED_EXTENSIONS:
-            continue
+    fingerprints: dict[Path, dict] = {}
 
-        source = str(file.resolve())
-        if tracker:
-            entry = tracker.get(source)
-            if entry and entry.get("chunked") and entry.get("indexed"):
-                # Documento ya procesado por completo
+    def _pending_files():
+        for file in input_folder.rglob("*"):
+            if file.suffix.lower() not in SUPPORTED_EXTENSIONS:
+                continue
+            try:
+                st = file.stat()
+            except OSError:
                 continue
+            if not stat.S_ISREG(st.st_mode):
+                continue
+
+            source = str(file.resolve())
+            fingerprint = file_fingerprint(st)
+            entry = tracker.get(source) if tracker else None
+            if entry and entry.get("chunked") and entry.get("indexed"):
+                if _same_fingerprint(entry, fingerprint):
+                    # Documento ya procesado por completo y sin cambios
+                    continue
+                # Metadatos distintos (copia, touch, edición revertida…):
+                # comparamos los bytes antes de volver a extraer el texto
+                raw_hash = compute_file_hash(file)
+                if entry.get("raw_hash") == raw_hash:
+                    tracker[source] = {**entry, **fingerprint}
+                    continue
+            else:
+                raw_hash = compute_file_hash(file)
+
+            fingerprints[file] = {**fingerprint, "raw_hash": raw_hash}
+            yield file
+
+    start = time.perf_counter()
+    extracted = 0
+    for file, content, error in iter_extracted_texts(_pending_files(), workers=workers):
+        fingerprint = fingerprints.pop(file, {})
+        if error is not None:
+            print(f"Error procesando {file.name}: {error}")
+            continue
 
         print(f"Procesando: {file.name}")
         try:
-            content = extract_text(file)
             data_bytes = content.encode("utf-8")
             file_hash = compute_hash(data_bytes)
             metadata = {
@@ -142,9 +369,14 @@ def process_documents(
                 with open(output_folder / f"{file_hash}.txt", "w", encoding="utf-8") as f_out:
                     f_out.write(content)
 
-            processed_docs.append({"text": content, "metadata": metadata})
-
         except Exception as e:
             print(f"Error procesando {file.name}: {e}")
-    
-    return processed_docs
+            continue
+
+        extracted += 1
+        yield {"text": content, "metadata": metadata, "fingerprint": fingerprint}
+
+    elapsed = time.perf_counter() - start
+    if extracted:
+        print(f"⏱️  {extracted} documentos extraídos en {elapsed:.1f}s "
+              f"({extracted / max(elapsed, 1e-9):.1f} docs/s)")
@@ -0,0 +1,287 @@
+# src/ingestion/manifest.py
+"""
+Manifiesto SQLite con el estado de indexación de cada documento.
+
+Sustituye al antiguo ``data/.processed_files.json``: cada documento es una
+fila independiente, así que actualizar su estado es una única sentencia
+(O(1)) en lugar de reescribir todo el fichero, y el modo WAL garantiza que
+un fallo a mitad de sincronización no deja el manifiesto inconsistente.
+
+Las filas se agrupan por colección de Weaviate, de modo que el mismo fichero
+puede indexarse en varios ``LegalDocs_{gpt_id}`` de forma independiente.
+La clase expone una interfaz tipo diccionario (``get``, ``[]``, ``in``…)
+compatible con el ``tracker`` que esperan ``iter_documents`` y
+``process_documents``.
+"""
+
+from __future__ import annotations
+
+import datetime
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterator
+
+STATES = ("pending", "chunked", "indexed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    collection   TEXT NOT NULL,
+    source       TEXT NOT NULL,
+    doc_id       TEXT,               -- hash del texto extraído
+    raw_hash     TEXT,               -- hash de los bytes del fichero
+    state        TEXT NOT NULL DEFAULT 'pending',
+    chunk_count  INTEGER NOT NULL DEFAULT 0,
+    chunk_uuids  TEXT NOT NULL DEFAULT '[]',
+    size         INTEGER,
+    mtime_ns     INTEGER,
+    inode        INTEGER,
+    onedrive_id  TEXT,
+    ctag         TEXT,
+    updated_at   TEXT,
+    PRIMARY KEY (collection, source)
+);
+CREATE INDEX IF NOT EXISTS idx_documents_onedrive
+    ON documents (collection, onedrive_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_FIELDS = (
+    "doc_id", "raw_hash", "state", "chunk_count", "chunk_uuids",
+    "size", "mtime_ns", "inode", "onedrive_id", "ctag",
+)
+
+
+def _state_of(entry: dict) -> str:
+    """Traduce los indicadores ``chunked``/``indexed`` del formato JSON a ``state``."""
+    if entry.get("indexed"):
+        return "indexed"
+    if entry.get("chunked"):
+        return "chunked"
+    return entry.get("state") if entry.get("state") in STATES else "pending"
+
+
+class Manifest:
+    """Estado de los documentos de una colección guardado en SQLite (WAL)."""
+
+    def __init__(self, path: Path, collection: str):
+        self.path = Path(path)
+        self.collection = collection
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Autocommit: cada sentencia es su propia transacción salvo que se
+        # agrupen explícitamente con ``transaction()``
+        self._conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        # El pipeline accede desde varios hilos
+        self._lock = threading.RLock()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # ---------- interfaz tipo diccionario ----------------------------------
+    def _row_to_entry(self, row: sqlite3.Row) -> dict:
+        entry = {k: row[k] for k in _FIELDS}
+        entry["chunk_uuids"] = json.loads(row["chunk_uuids"])
+        entry["chunked"] = row["state"] in ("chunked", "indexed")
+        entry["indexed"] = row["state"] == "indexed"
+        return entry
+
+    def get(self, source: str, default=None) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM documents WHERE collection = ? AND source = ?",
+                (self.collection, source),
+            ).fetchone()
+        return self._row_to_entry(row) if row else default
+
+    def __getitem__(self, source: str) -> dict:
+        entry = self.get(source)
+        if entry is None:
+            raise KeyError(source)
+        return entry
+
+    def __contains__(self, source: str) -> bool:
+        return self.get(source) is not None
+
+    def __setitem__(self, source: str, entry: dict) -> None:
+        """Inserta o reemplaza la fila de ``source`` a partir de ``entry``."""
+        values = {k: entry.get(k) for k in _FIELDS}
+        values["state"] = _state_of(entry)
+        values["chunk_count"] = entry.get("chunk_count") or 0
+        values["chunk_uuids"] = json.dumps(entry.get("chunk_uuids") or [])
+        cols = ", ".join(_FIELDS)
+        marks = ", ".join("?" for _ in _FIELDS)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO documents (collection, source, {cols}, updated_at) "
+                f"VALUES (?, ?, {marks}, ?)",
+                (self.collection, source, *(values[k] for k in _FIELDS), _now()),
+            )
+
+    def __delitem__(self, source: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM documents WHERE collection = ? AND source = ?",
+                (self.collection, source),
+            )
+
+    def pop(self, source: str, default=None):
+        entry = self.get(source)
+        if entry is None:
+            return default
+        del self[source]
+        return entry
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM documents WHERE collection = ?", (self.collection,)
+            ).fetchone()[0]
+
+    def __bool__(self) -> bool:
+        # Un manifiesto vacío sigue siendo un tracker válido
+        return True
+
+    def items(self) -> Iterator[tuple[str, dict]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM documents WHERE collection = ?", (self.collection,)
+            ).fetchall()
+        for row in rows:
+            yield row["source"], self._row_to_entry(row)
+
+    # ---------- operaciones específicas ------------------------------------
+    def mark_indexed(self, docs: list[tuple[str, list[str]]]) -> None:
+        """Marca como indexados ``(source, chunk_uuids)`` en una sola transacción."""
+        with self._lock, self.transaction():
+            self._conn.executemany(
+                "UPDATE documents SET state = 'indexed', chunk_count = ?, chunk_uuids = ?, "
+                "updated_at = ? WHERE collection = ? AND source = ?",
+                [
+                    (len(uuids), json.dumps(uuids), _now(), self.collection, source)
+                    for source, uuids in docs
+                ],
+            )
+
+    def find_by_onedrive_id(self, onedrive_id: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT source FROM documents WHERE collection = ? AND onedrive_id = ?",
+                (self.collection, onedrive_id),
+            ).fetchone()
+        return row["source"] if row else None
+
+    def get_meta(self, key: str, default: str | None = None) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else default
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    def transaction(self):
+        return _Transaction(self._conn)
+
+    # ---------- versión del índice --------------------------------------------
+    def index_version(self) -> int:
+        return int(self.get_meta(_index_version_key(self.collection), "0"))
+
+    def bump_index_version(self) -> int:
+        """Incrementa la versión de la colección tras cambiar su contenido.
+
+        Las cachés de respuestas incluyen esta versión en sus claves, así que
+        las entradas anteriores dejan de usarse automáticamente.
+        """
+        key = _index_version_key(self.collection)
+        with self._lock, self.transaction():
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, '1') "
+                "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1",
+                (key,),
+            )
+            return int(self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0])
+
+    # ---------- migración ---------------------------------------------------
+    def migrate_json(self, json_path: Path) -> int:
+        """Importa un ``.processed_files.json`` antiguo si existe.
+
+        Los valores de tipo cadena (formato más antiguo) se consideran
+        documentos ya troceados e indexados. Tras importarlo, el fichero se
+        renombra a ``*.migrated`` para no volver a procesarlo.
+        """
+        json_path = Path(json_path)
+        if not json_path.exists():
+            return 0
+
+        data = json.loads(json_path.read_text(encoding="utf-8"))
+        with self._lock, self.transaction():
+            for source, val in data.items():
+                if isinstance(val, str):
+                    val = {"doc_id": val, "chunked": True, "indexed": True}
+                self[source] = val
+        json_path.rename(json_path.with_name(json_path.name + ".migrated"))
+        print(f"📦  Migrados {len(data)} documentos de {json_path} al manifiesto SQLite")
+        return len(data)
+
+
+class _Transaction:
+    """Agrupa varias sentencias en una transacción (``BEGIN``/``COMMIT``)."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def __enter__(self):
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN")
+            self._owner = True
+        else:
+            self._owner = False
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self._owner:
+            return False
+        self._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def _index_version_key(collection: str) -> str:
+    return f"index_version:{collection}"
+
+
+def read_index_version(path: Path, collection: str) -> int:
+    """Lee la versión del índice sin crear el manifiesto (solo lectura).
+
+    La usa la API, que no debe escribir en el manifiesto de la ingesta.
+    Devuelve 0 si el manifiesto o la colección aún no existen.
+    """
+    path = Path(path)
+    if not path.exists():
+        return 0
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            row = conn.execute(
+                "SELECT value FROM meta WHERE key = ?", (_index_version_key(collection),)
+            ).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return 0
+    return int(row[0]) if row else 0
+
+
+def _now() -> str:
+    return datetime.datetime.now().isoformat(timespec="seconds")
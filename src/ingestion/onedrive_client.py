@@ -1,8 +1,17 @@
+import email.utils
+import hashlib
 import json
+import random
+import tempfile
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import unquote
 import requests
-from requests.exceptions import RequestException
+from requests.adapters import HTTPAdapter
+from requests.exceptions import HTTPError, RequestException
 from msal import ConfidentialClientApplication, SerializableTokenCache
 from src.config import settings
 
@@ -11,14 +20,23 @@ class OneDriveClient:
     """Cliente para acceder a OneDrive vía Microsoft Graph (flujo client-credentials)."""
 
     def __init__(self, client_id: str, client_secret: str, tenant_id: str,
-                 max_retries: int | None = None, retry_delay: float | None = None):
+                 max_retries: int | None = None, retry_delay: float | None = None,
+                 download_workers: int | None = None):
         self.client_id = client_id
         self.client_secret = client_secret
         self.tenant_id = tenant_id
         self.scopes = ["https://graph.microsoft.com/.default"]
-        self.base_url = "https://graph.microsoft.com/v1.0"
+        self.base_url = settings.ONEDRIVE_GRAPH_URL.rstrip("/")
         self.max_retries = max_retries if max_retries is not None else settings.ONEDRIVE_MAX_RETRIES
         self.retry_delay = retry_delay if retry_delay is not None else settings.ONEDRIVE_RETRY_DELAY
+        self.download_workers = download_workers or settings.ONEDRIVE_DOWNLOAD_WORKERS
+
+        # ---- Sesión HTTP con conexiones persistentes (keep-alive) ----
+        # El pool admite tantas conexiones como descargas simultáneas
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(self.download_workers, 4))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
 
         # ---- MSAL application & token cache ----
         cache = SerializableTokenCache()
@@ -31,6 +49,7 @@ class OneDriveClient:
 
         self._token: dict | None = None
         self._token_exp: float = 0.0
+        self._token_lock = threading.Lock()
 
     # ---------- Autenticación -------------------------------------------------
     def _authenticate(self) -> dict:
@@ -63,126 +82,219 @@ class OneDriveClient:
 
     def _get_token(self) -> str:
         """Devuelve un access-token válido refrescándolo si es necesario."""
-        if time.time() > self._token_exp - 300:
-            token_info = self._authenticate()
-            self._token = token_info["access_token"]
-            self._token_exp = time.time() + token_info.get("expires_in", 0)
-        return self._token
+        with self._token_lock:  # las descargas concurrentes comparten el token
+            if time.time() > self._token_exp - 300:
+                token_info = self._authenticate()
+                self._token = token_info["access_token"]
+                self._token_exp = time.time() + token_info.get("expires_in", 0)
+            return self._token
 
     def _headers(self) -> dict:
         return {"Authorization": f"Bearer {self._get_token()}"}
 
-    # ---------- Operaciones de ficheros --------------------------------------
-    def list_files(self, drive_id: str, folder_path: str):
-        """Lista los elementos de la carpeta."""
-        url = f"{self.base_url}/drives/{drive_id}/root:/{folder_path}:/children"
-        headers = self._headers()
+    # ---------- Peticiones HTTP con reintentos -------------------------------
+    def _backoff(self, attempt: int, resp: requests.Response | None = None) -> float:
+        """Segundos de espera antes del siguiente intento.
 
+        Respeta la cabecera ``Retry-After`` (segundos o fecha HTTP) que Graph
+        envía al limitar peticiones (429/503); si no existe o no se puede
+        interpretar, usa un backoff exponencial con jitter a partir de
+        ``retry_delay``.
+        """
+        retry_after = resp.headers.get("Retry-After") if resp is not None else None
+        if retry_after:
+            try:
+                return max(float(retry_after), 0.0)
+            except ValueError:
+                pass
+            try:
+                when = email.utils.parsedate_to_datetime(retry_after)
+                return max(when.timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                print(f"   ⚠️  Retry-After no válido: {retry_after!r}")
+        delay = min(self.retry_delay * 2 ** (attempt - 1), settings.ONEDRIVE_MAX_BACKOFF)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _request(self, url: str, auth: bool = True, stream: bool = False) -> requests.Response:
+        """GET con reintentos ante errores de conexión, 429 y 5xx."""
         for attempt in range(1, self.max_retries + 1):
             print(f"🌐  GET {url} (intento {attempt}/{self.max_retries})")
             try:
-                resp = requests.get(url, headers=headers)
+                headers = self._headers() if auth else None
+                resp = self.session.get(url, headers=headers, stream=stream, timeout=(10, 300))
             except RequestException as e:
                 print(f"   ❌  Error de conexión: {e}")
                 if attempt == self.max_retries:
                     raise
-                print(f"   ↻  Reintentando en {self.retry_delay}s…")
-                time.sleep(self.retry_delay)
+                delay = self._backoff(attempt)
+                print(f"   ↻  Reintentando en {delay:.1f}s…")
+                time.sleep(delay)
                 continue
 
             print("   → Status", resp.status_code)
 
-            if resp.status_code == 200:
-                return resp.json().get("value", [])
+            if resp.status_code < 400:
+                return resp
 
-            if resp.status_code >= 500:
-                print("   ❌  Error del servidor")
+            if resp.status_code == 429 or resp.status_code >= 500:
+                print("   ❌  Servidor saturado o con errores")
                 if attempt == self.max_retries:
                     resp.raise_for_status()
-                print(f"   ↻  Reintentando en {self.retry_delay}s…")
-                time.sleep(self.retry_delay)
+                delay = self._backoff(attempt, resp)
+                resp.close()
+                print(f"   ↻  Reintentando en {delay:.1f}s…")
+                time.sleep(delay)
                 continue
 
             print("   ❌  Cuerpo:", resp.text[:500])
             resp.raise_for_status()
 
-    def download_folder(self, drive_id: str, folder_path: str, dest_dir: Path):
-        """Descarga todos los archivos de la carpeta en dest_dir."""
-        items = self.list_files(drive_id, folder_path)
-        dest_dir.mkdir(parents=True, exist_ok=True)
+    def _get_json(self, url: str) -> dict:
+        return self._request(url).json()
 
-        for item in items:
-            if "file" not in item:
-                continue  # salta subcarpetas
-            download_url = item.get("@microsoft.graph.downloadUrl")
-            if not download_url:
-                continue
-            filename = item["name"]
-
-            for attempt in range(1, self.max_retries + 1):
-                print(f"⬇️  Descargando {filename} (intento {attempt}/{self.max_retries})")
-                try:
-                    file_resp = requests.get(download_url)
-                except RequestException as e:
-                    print(f"   ❌  Error de conexión: {e}")
-                    if attempt == self.max_retries:
-                        raise
-                    print(f"   ↻  Reintentando en {self.retry_delay}s…")
-                    time.sleep(self.retry_delay)
-                    continue
+    def _iter_pages(self, url: str):
+        """Recorre todas las páginas de un listado siguiendo ``@odata.nextLink``."""
+        while url:
+            page = self._get_json(url)
+            yield from page.get("value", [])
+            url = page.get("@odata.nextLink")
 
-                if file_resp.status_code >= 500:
-                    print(f"   ❌  Status {file_resp.status_code}")
-                    if attempt == self.max_retries:
-                        file_resp.raise_for_status()
-                    print(f"   ↻  Reintentando en {self.retry_delay}s…")
-                    time.sleep(self.retry_delay)
-                    continue
+    # ---------- Operaciones de ficheros --------------------------------------
+    def list_files(self, drive_id: str, folder_path: str):
+        """Lista los elementos de la carpeta (todas las páginas)."""
+        url = f"{self.base_url}/drives/{drive_id}/root:/{folder_path}:/children"
+        return list(self._iter_pages(url))
 
-                file_resp.raise_for_status()
-                (dest_dir / filename).write_bytes(file_resp.content)
-                break
+    def walk_files(self, drive_id: str, folder_path: str, recursive: bool = False):
+        """Iterador perezoso de los elementos de tipo fichero de la carpeta."""
+        url = f"{self.base_url}/drives/{drive_id}/root:/{folder_path}:/children"
+        for item in self._iter_pages(url):
+            if "file" in item:
+                yield item
+            elif recursive and "folder" in item:
+                sub_path = f"{folder_path}/{item['name']}".strip("/")
+                yield from self.walk_files(drive_id, sub_path, recursive=True)
 
-    def get_file_bytes(self, drive_id: str, item_id: str) -> bytes:
-        """Obtiene el contenido binario de un archivo dado su item_id."""
-        url = f"{self.base_url}/drives/{drive_id}/items/{item_id}/content"
-        headers = self._headers()
-        for attempt in range(1, self.max_retries + 1):
+    def download_to_file(self, drive_id: str, item: dict, dest_dir: Path) -> tuple[Path, str]:
+        """Descarga un fichero en streaming a ``dest_dir`` sin cargarlo en memoria.
+
+        El fichero temporal conserva la extensión original para que el
+        extractor pueda abrirlo directamente. Devuelve la ruta y el SHA1 de
+        los bytes, calculado durante la descarga.
+        """
+        url = item.get("@microsoft.graph.downloadUrl")
+        auth = not url  # la URL pre-firmada no necesita token
+        url = url or f"{self.base_url}/drives/{drive_id}/items/{item['id']}/content"
+        suffix = Path(item["name"]).suffix.lower()
+
+        h = hashlib.sha1()
+        with self._request(url, auth=auth, stream=True) as resp, tempfile.NamedTemporaryFile(
+            dir=dest_dir, suffix=suffix, delete=False
+        ) as f_out:
+            for block in resp.iter_content(chunk_size=1 << 20):
+                h.update(block)
+                f_out.write(block)
+        return Path(f_out.name), h.hexdigest()
+
+    def iter_downloads(self, drive_id: str, items, dest_dir: Path):
+        """Descarga ``items`` en paralelo y devuelve ``(item, ruta, sha1, error)``.
+
+        Se usan ``download_workers`` hilos sobre la misma sesión HTTP y solo
+        hay ``2 * download_workers`` descargas en vuelo, de modo que el
+        llamador puede ir procesando los ficheros mientras llegan los demás.
+        """
+        window = 2 * self.download_workers
+        pending: deque = deque()
+
+        def _collect(item, future):
             try:
-                resp = requests.get(url, headers=headers)
-            except RequestException as e:
-                print(f"   ❌  Error de conexión: {e}")
-                if attempt == self.max_retries:
-                    raise
-                print(f"   ↻  Reintentando en {self.retry_delay}s…")
-                time.sleep(self.retry_delay)
-                continue
+                path, raw_hash = future.result()
+                return item, path, raw_hash, None
+            except Exception as e:
+                return item, None, None, e
 
-            if resp.status_code >= 500:
-                print(f"   ❌  Status {resp.status_code}")
-                if attempt == self.max_retries:
-                    resp.raise_for_status()
-                print(f"   ↻  Reintentando en {self.retry_delay}s…")
-                time.sleep(self.retry_delay)
+        with ThreadPoolExecutor(max_workers=self.download_workers) as pool:
+            for item in items:
+                pending.append((item, pool.submit(self.download_to_file, drive_id, item, dest_dir)))
+                if len(pending) >= window:
+                    yield _collect(*pending.popleft())
+            while pending:
+                yield _collect(*pending.popleft())
+
+    def get_delta(self, drive_id: str, folder_path: str = "",
+                  delta_link: str | None = None) -> tuple[list[dict], str]:
+        """Devuelve los cambios del drive desde ``delta_link`` y el nuevo enlace.
+
+        Usa el endpoint ``/delta`` de Graph. Sin ``delta_link`` se obtiene el
+        estado completo (primera sincronización). Solo se devuelven los
+        elementos bajo ``folder_path``; los borrados (faceta ``deleted``) se
+        devuelven siempre porque Graph no incluye su ruta. Los ficheros que
+        ahora están fuera de la carpeta (movidos, o dentro de una carpeta
+        renombrada) no llegan como borrados, así que se devuelven con la
+        faceta ``deleted`` añadida: para el indexador han desaparecido. Si el
+        enlace ha caducado (410 Gone) se vuelve a enumerar desde cero.
+
+        En OneDrive para la Empresa/SharePoint ``/delta`` solo se admite en la
+        raíz del drive, por eso el filtrado por carpeta se hace aquí.
+        """
+        url = delta_link or f"{self.base_url}/drives/{drive_id}/root/delta"
+        prefix = "/" + folder_path.strip("/") if folder_path.strip("/") else ""
+        items: list[dict] = []
+
+        while True:
+            try:
+                page = self._get_json(url)
+            except HTTPError as e:
+                if e.response is not None and e.response.status_code == 410 and delta_link:
+                    print("   ↻  Token delta caducado: resincronización completa")
+                    return self.get_delta(drive_id, folder_path, None)
+                raise
+
+            for item in page.get("value", []):
+                if "deleted" in item:
+                    items.append(item)
+                    continue
+                if "file" not in item:
+                    continue
+                parent = unquote(item.get("parentReference", {}).get("path", ""))
+                parent = parent.split("root:", 1)[1] if "root:" in parent else ""
+                if (parent + "/").startswith(prefix + "/"):
+                    items.append(item)
+                elif prefix:
+                    items.append({**item, "deleted": {"state": "movedOut"}})
+
+            if "@odata.nextLink" in page:
+                url = page["@odata.nextLink"]
                 continue
+            return items, page["@odata.deltaLink"]
 
-            resp.raise_for_status()
-            return resp.content
+    def download_folder(self, drive_id: str, folder_path: str, dest_dir: Path):
+        """Descarga todos los archivos de la carpeta en dest_dir."""
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        items = self.walk_files(drive_id, folder_path)
+
+        for item, path, _, error in self.iter_downloads(drive_id, items, dest_dir):
+            if error is not None:
+                raise error
+            path.replace(dest_dir / item["name"])
+            print(f"⬇️  Descargado {item['name']}")
+
+    def get_file_bytes(self, drive_id: str, item_id: str) -> bytes:
+        """Obtiene el contenido binario de un archivo dado su item_id."""
+        url = f"{self.base_url}/drives/{drive_id}/items/{item_id}/content"
+        return self._request(url).content
 
     def iter_files(self, drive_id: str, folder_path: str, recursive: bool = False):
         """Iterador que devuelve (nombre, id, fecha_mod, bytes).
 
         Si ``recursive`` es ``True`` también recorre subcarpetas de forma
-        recursiva siguiendo una búsqueda en profundidad.
+        recursiva siguiendo una búsqueda en profundidad. Para ficheros grandes
+        es preferible ``iter_downloads``, que no los carga en memoria.
         """
-        for item in self.list_files(drive_id, folder_path):
-            if "file" in item:
-                yield (
-                    item["name"],
-                    item["id"],
-                    item.get("lastModifiedDateTime"),
-                    self.get_file_bytes(drive_id, item["id"]),
-                )
-            elif recursive and "folder" in item:
-                sub_path = f"{folder_path}/{item['name']}".strip("/")
-                yield from self.iter_files(drive_id, sub_path, recursive=True)
+        for item in self.walk_files(drive_id, folder_path, recursive=recursive):
+            yield (
+                item["name"],
+                item["id"],
+                item.get("lastModifiedDateTime"),
+                self.get_file_bytes(drive_id, item["id"]),
+            )
@@ -0,0 +1,257 @@
+# src/ingestion/pipeline.py
+"""
+Pipeline en streaming extracción → chunking → embeddings → Weaviate.
+
+Cada fase corre en su propio hilo y se comunica con la siguiente mediante
+colas acotadas: si Weaviate o el modelo de embeddings van más lentos, las
+fases anteriores se bloquean (backpressure) en lugar de acumular documentos
+en memoria. Los primeros lotes se escriben en cuanto están listos, sin
+esperar a que termine la extracción del corpus completo.
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from typing import Callable, Iterable
+
+from src.config import settings
+from src.vectorstore.embedder import (
+    add_token_counts,
+    collection_name_for,
+    ensure_collection,
+    get_local_embedder,
+    get_weaviate_client,
+    iter_chunks,
+)
+from src.vectorstore.writer import BatchWriter
+
+_STOP = object()  # marca de fin de flujo entre fases
+
+
+class _Batch:
+    """Lote de chunks que viaja por el pipeline.
+
+    ``completed`` contiene los documentos cuyo último chunk va en este lote
+    (o que no generaron ningún chunk): se consideran indexados cuando el
+    lote se escribe sin errores.
+    """
+
+    __slots__ = ("chunks", "completed", "vectors")
+
+    def __init__(self):
+        self.chunks: list[dict] = []
+        self.completed: list[dict] = []
+        self.vectors: list[list[float]] | None = None
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """Encola ``item`` esperando mientras la cola esté llena.
+
+    Devuelve ``False`` si el pipeline se ha cancelado mientras esperaba.
+    """
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+    return _STOP
+
+
+def _get_nowait(q: queue.Queue):
+    """Devuelve el siguiente elemento de ``q`` o ``None`` si está vacía."""
+    try:
+        return q.get_nowait()
+    except queue.Empty:
+        return None
+
+
+def run_pipeline(
+    docs: Iterable[dict],
+    gpt_id: str = "default",
+    on_indexed: Callable[[list[dict]], None] | None = None,
+    chunk_size: int | None = None,
+    chunk_overlap: int | None = None,
+) -> dict:
+    """Trocea, vectoriza e indexa ``docs`` en streaming.
+
+    ``docs`` puede ser un generador (p. ej. :func:`iter_documents`); se
+    consume a medida que avanza el pipeline. Tras escribir cada lote se
+    llama a ``on_indexed`` con los documentos que han quedado completamente
+    indexados; cada uno lleva en ``chunk_uuids`` los UUID de sus objetos en
+    Weaviate. Devuelve un resumen con el número de documentos y chunks.
+    """
+    chunk_size = chunk_size or settings.CHUNK_SIZE
+    chunk_overlap = chunk_overlap if chunk_overlap is not None else settings.CHUNK_OVERLAP
+    # Con la agrupación por longitud conviene vectorizar ventanas mayores que
+    # un lote del modelo: los chunks se ordenan dentro de cada ventana
+    batch_size = settings.BATCH_SIZE
+    if settings.EMBEDDING_LENGTH_BUCKETING:
+        batch_size = max(batch_size, settings.EMBEDDING_SORT_WINDOW)
+    flush_after = settings.PIPELINE_FLUSH_SECONDS
+
+    client = get_weaviate_client()
+    index_name = collection_name_for(gpt_id)
+    ensure_collection(client, index_name)
+    writer = BatchWriter(client.collections.get(index_name))
+
+    stop = threading.Event()
+    errors: list[BaseException] = []
+    docs_q: queue.Queue = queue.Queue(maxsize=settings.PIPELINE_QUEUE_SIZE)
+    batch_q: queue.Queue = queue.Queue(maxsize=settings.PIPELINE_QUEUE_SIZE)
+    vector_q: queue.Queue = queue.Queue(maxsize=settings.PIPELINE_QUEUE_SIZE)
+
+    def _stage(fn):
+        def wrapper():
+            try:
+                fn()
+            except BaseException as e:  # se relanza en el hilo principal
+                errors.append(e)
+                stop.set()
+        return threading.Thread(target=wrapper, daemon=True)
+
+    # 1) Extracción: consume el generador de documentos
+    def extract():
+        for doc in docs:
+            if not _put(docs_q, doc, stop):
+                return
+        _put(docs_q, _STOP, stop)
+
+    # 2) Chunking: agrupa los chunks en lotes de ``batch_size``
+    def chunk():
+        batch = _Batch()
+        started = time.monotonic()
+
+        def flush():
+            nonlocal batch, started
+            if batch.chunks or batch.completed:
+                if not _put(batch_q, batch, stop):
+                    return False
+            batch, started = _Batch(), time.monotonic()
+            return True
+
+        while not stop.is_set():
+            try:
+                doc = docs_q.get(timeout=flush_after)
+            except queue.Empty:
+                # La extracción va lenta: escribimos lo que tengamos
+                if batch.chunks and not flush():
+                    return
+                continue
+            if doc is _STOP:
+                break
+
+            for c in iter_chunks([doc], size=chunk_size, overlap=chunk_overlap):
+                batch.chunks.append(c)
+                if len(batch.chunks) >= batch_size and not flush():
+                    return
+            batch.completed.append(doc)
+
+            if batch.chunks and time.monotonic() - started >= flush_after and not flush():
+                return
+
+        if flush():
+            _put(batch_q, _STOP, stop)
+
+    # 3) Embeddings (el modelo se carga con el primer lote: si no hay nada
+    #    nuevo que indexar, la sincronización no paga su carga)
+    used_embedder = []
+
+    def embed():
+        embedder = None
+        while True:
+            batch = _get(batch_q, stop)
+            if batch is _STOP:
+                break
+            if batch.chunks:
+                if embedder is None:
+                    embedder = get_local_embedder()
+                    used_embedder.append(embedder)
+                add_token_counts(batch.chunks)
+                batch.vectors = embedder.embed_documents([c["text"] for c in batch.chunks])
+            if not _put(vector_q, batch, stop):
+                return
+        _put(vector_q, _STOP, stop)
+
+    threads = [_stage(extract), _stage(chunk), _stage(embed)]
+    for t in threads:
+        t.start()
+
+    # 4) Escritura en Weaviate (hilo principal). Se agrupan los lotes ya
+    #    vectorizados hasta ``BatchWriter.group_size`` objetos para que el batch
+    #    nativo pueda enviar varias peticiones en paralelo; si no hay más lotes
+    #    esperando se escribe lo que haya, sin añadir latencia.
+    n_docs = n_chunks = n_failed = 0
+    failed_sources: set[str] = set()
+    uuids_by_source: dict[str, list[str]] = {}
+    start = time.perf_counter()
+
+    def take_group() -> tuple[list[_Batch], bool]:
+        group = []
+        size = 0
+        while True:
+            batch = _get(vector_q, stop) if not group else _get_nowait(vector_q)
+            if batch is None:
+                return group, False
+            if batch is _STOP:
+                return group, True
+            group.append(batch)
+            size += len(batch.chunks)
+            if size >= writer.group_size:
+                return group, False
+
+    try:
+        finished = False
+        while not finished:
+            group, finished = take_group()
+            chunks = [c for b in group for c in b.chunks]
+            vectors = [v for b in group if b.chunks for v in b.vectors]
+
+            write_errors = writer.write(chunks, vectors)
+            for idx in write_errors:
+                failed_sources.add(chunks[idx]["metadata"]["source"])
+            for idx, c in enumerate(chunks):
+                if idx not in write_errors:
+                    uuids_by_source.setdefault(c["metadata"]["source"], []).append(str(c["uuid"]))
+            n_failed += len(write_errors)
+            n_chunks += len(chunks) - len(write_errors)
+
+            done = []
+            for d in (d for b in group for d in b.completed):
+                source = d["metadata"]["source"]
+                d["chunk_uuids"] = uuids_by_source.pop(source, [])
+                if source not in failed_sources:
+                    done.append(d)
+            n_docs += len(done)
+            if done and on_indexed:
+                on_indexed(done)
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+
+    if errors:
+        raise errors[0]
+
+    elapsed = time.perf_counter() - start
+    print(f"⏱️  Pipeline: {n_docs} documentos, {n_chunks} chunks en {elapsed:.1f}s "
+          f"({n_chunks / max(elapsed, 1e-9):.1f} chunks/s)")
+    if writer.written or writer.failed:
+        print(f"📤  Weaviate: {writer.summary()}")
+    cache = getattr(used_embedder[0], "cache", None) if used_embedder else None
+    if cache is not None:
+        stats = cache.stats()
+        print(f"🗄️  Caché de embeddings: {stats['hits']} aciertos, {stats['misses']} calculados "
+              f"({stats['hit_rate']:.0%})")
+    return {"documents": n_docs, "chunks": n_chunks, "failed": n_failed}
@@ -0,0 +1,94 @@
+# src/llm_server/app.py
+"""
+Servidor de inferencia local: carga el GGUF una sola vez y atiende a todos
+los workers de la API (ver ``scripts/start_llm_server.py``).
+
+    POST /generate   {"prompt", "gpt_id", "max_tokens", "stop", "stream"}
+                     → {"text", "tokens"} o, con ``stream``, NDJSON
+                       con una línea ``{"token": …}`` por fragmento
+    GET  /metrics    profundidad de la cola (total y por gpt_id), slots
+                     ocupados, tokens/s en el último minuto, TTFT p50 y,
+                     con decodificación especulativa, tasa de aceptación
+    GET  /health
+"""
+
+from __future__ import annotations
+
+import json
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from src.config import settings
+from src.llm_server.backends import build_backends
+from src.llm_server.scheduler import QueueFull, Scheduler
+
+scheduler: Scheduler | None = None
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    global scheduler
+    scheduler = Scheduler(
+        build_backends(),
+        max_per_gpt=settings.LLM_SERVER_MAX_PER_GPT,
+        max_queued=settings.LLM_SERVER_MAX_QUEUE,
+    )
+    print(f"🧠  Servidor LLM listo: {len(scheduler.backends)} slots ({settings.LLM_SERVER_BACKEND})")
+    yield
+
+
+app = FastAPI(title="RAG LLM server", lifespan=lifespan)
+
+
+class GenerateRequest(BaseModel):
+    prompt: str
+    gpt_id: Optional[str] = "default"
+    max_tokens: int = settings.MAX_COMPLETION_TOKENS
+    stop: Optional[List[str]] = None
+    stream: bool = False
+
+
+@app.post("/generate")
+async def generate(request: GenerateRequest):
+    try:
+        job = scheduler.submit(request.gpt_id, request.prompt, request.max_tokens, request.stop)
+    except QueueFull:
+        raise HTTPException(status_code=429, detail=f"Cola llena para '{request.gpt_id}'")
+
+    if request.stream:
+        async def body():
+            try:
+                async for token in job.tokens():
+                    yield json.dumps({"token": token}, ensure_ascii=False) + "\n"
+            finally:
+                # Cliente desconectado (o fin): el slot deja de decodificar
+                scheduler.queue.cancel(job)
+
+        return StreamingResponse(body(), media_type="application/x-ndjson")
+
+    parts = []
+    try:
+        async for token in job.tokens():
+            parts.append(token)
+    finally:
+        scheduler.queue.cancel(job)
+    return {"text": "".join(parts), "tokens": len(parts)}
+
+
+@app.get("/metrics")
+async def metrics():
+    data = scheduler.metrics()
+    if settings.LLM_DRAFT_MODEL_PATH and settings.LLM_SERVER_BACKEND == "llama":
+        from src.rag_logic.speculative import speculative_stats
+
+        data["speculative"] = speculative_stats()
+    return data
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
@@ -0,0 +1,78 @@
+# src/llm_server/backends.py
+"""
+Backends de generación de los slots del servidor LLM.
+
+- :class:`LlamaBackend`: un ``llama_cpp.Llama`` sobre el GGUF configurado.
+  Con ``use_mmap`` todos los slots comparten las páginas de los pesos; cada
+  uno tiene su contexto (caché KV) y decodifica en su hilo, ya que
+  llama.cpp libera el GIL durante la evaluación. Cada slot restaura el
+  estado KV del prefijo fijo del prompt (ver ``prefix_cache.py``) y, con
+  ``LLM_DRAFT_MODEL_PATH``, tiene su propio borrador (``speculative.py``).
+- :class:`StubBackend`: sin modelo, devuelve un texto fijo a un ritmo
+  configurable. Sirve para probar la cola y la API en máquinas sin el GGUF.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from typing import Iterator
+
+from src.config import settings
+
+
+class LlamaBackend:
+    def __init__(self, n_threads: int):
+        from llama_cpp import Llama
+
+        from src.rag_logic.prefix_cache import with_prefix_cache
+        from src.rag_logic.speculative import build_draft_model
+
+        self.llm = with_prefix_cache(Llama(
+            model_path=str(settings.LLM_MODEL_PATH),
+            n_ctx=4096,
+            n_threads=n_threads,
+            use_mmap=settings.LLM_USE_MMAP,
+            verbose=False,
+            draft_model=build_draft_model(n_ctx=4096),  # None sin LLM_DRAFT_MODEL_PATH
+        ))
+        if hasattr(self.llm, "warm"):
+            self.llm.warm()  # el servidor no hace fork: los prefijos se calculan al arrancar
+
+    def generate(self, prompt: str, max_tokens: int, stop: list[str] | None) -> Iterator[str]:
+        for chunk in self.llm.create_completion(
+            prompt,
+            max_tokens=max_tokens,
+            temperature=0.0,
+            stop=stop or [],
+            stream=True,
+        ):
+            text = chunk["choices"][0]["text"]
+            if text:
+                yield text
+
+
+class StubBackend:
+    _TEXT = "(Simulación) Respuesta generada por el servidor LLM de pruebas para: "
+
+    def __init__(self, tokens_per_second: float):
+        self.delay = 1.0 / tokens_per_second if tokens_per_second > 0 else 0.0
+
+    def generate(self, prompt: str, max_tokens: int, stop: list[str] | None) -> Iterator[str]:
+        question = prompt.strip().splitlines()[-1] if prompt.strip() else ""
+        words = (self._TEXT + question).split(" ")
+        for word in words[:max_tokens]:
+            time.sleep(self.delay)
+            yield word + " "
+
+
+def build_backends() -> list:
+    """Un backend por slot según ``LLM_SERVER_BACKEND`` y ``LLM_SERVER_SLOTS``."""
+    slots = max(1, settings.LLM_SERVER_SLOTS)
+    if settings.LLM_SERVER_BACKEND == "stub":
+        return [StubBackend(settings.LLM_SERVER_STUB_TOKENS_PER_SECOND) for _ in range(slots)]
+    if settings.LLM_SERVER_BACKEND != "llama":
+        raise ValueError(f"LLM_SERVER_BACKEND desconocido: {settings.LLM_SERVER_BACKEND!r}")
+    # Los núcleos se reparten entre los slots para que no compitan entre sí
+    n_threads = max(1, (os.cpu_count() or 1) // slots)
+    return [LlamaBackend(n_threads) for _ in range(slots)]
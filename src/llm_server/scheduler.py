@@ -0,0 +1,218 @@
+# src/llm_server/scheduler.py
+"""
+Cola justa de generaciones y slots que las ejecutan.
+
+Las peticiones se encolan por ``gpt_id`` y se reparten por turnos entre los
+``gpt_id`` con trabajo pendiente, de modo que un GPT con muchas preguntas no
+deja sin turno a los demás. Cada ``gpt_id`` tiene un máximo de generaciones
+activas a la vez (``LLM_SERVER_MAX_PER_GPT``) y de peticiones en espera
+(``LLM_SERVER_MAX_QUEUE``; por encima se rechazan con :class:`QueueFull`).
+
+Cada slot es un hilo con su propio backend (ver ``backends.py``); los slots
+decodifican en paralelo y, al compartir los pesos por mmap, cada uno solo
+añade su caché KV.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+
+
+class QueueFull(Exception):
+    """El ``gpt_id`` ya tiene demasiadas peticiones en espera."""
+
+
+_DONE = object()
+
+
+@dataclass
+class Job:
+    gpt_id: str
+    prompt: str
+    max_tokens: int
+    stop: list[str] | None
+    loop: asyncio.AbstractEventLoop
+    output: asyncio.Queue = field(default_factory=asyncio.Queue)
+    cancelled: threading.Event = field(default_factory=threading.Event)
+    enqueued: float = field(default_factory=time.monotonic)
+
+    def emit(self, item) -> None:
+        """Entrega un token (o el fin, o un error) al handler HTTP desde el slot."""
+        self.loop.call_soon_threadsafe(self.output.put_nowait, item)
+
+    async def tokens(self):
+        while True:
+            item = await self.output.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+
+class FairQueue:
+    """Cola por ``gpt_id`` con turnos rotatorios y límite de activas por ``gpt_id``."""
+
+    def __init__(self, max_per_gpt: int, max_queued: int):
+        self.max_per_gpt = max(1, max_per_gpt)
+        self.max_queued = max(1, max_queued)
+        self._queues: OrderedDict[str, deque[Job]] = OrderedDict()
+        self._active: dict[str, int] = {}
+        self._cond = threading.Condition()
+
+    def put(self, job: Job) -> None:
+        with self._cond:
+            pending = self._queues.setdefault(job.gpt_id, deque())
+            if len(pending) >= self.max_queued:
+                raise QueueFull(job.gpt_id)
+            pending.append(job)
+            self._cond.notify()
+
+    def _pop_ready(self) -> Job | None:
+        for gpt_id in list(self._queues):
+            pending = self._queues[gpt_id]
+            while pending and pending[0].cancelled.is_set():
+                pending.popleft().emit(_DONE)  # abandonada antes de empezar
+            if not pending:
+                del self._queues[gpt_id]
+                continue
+            if self._active.get(gpt_id, 0) >= self.max_per_gpt:
+                continue
+            job = pending.popleft()
+            # Este gpt_id pasa al final del turno
+            self._queues.move_to_end(gpt_id)
+            if not pending:
+                del self._queues[gpt_id]
+            self._active[gpt_id] = self._active.get(gpt_id, 0) + 1
+            return job
+        return None
+
+    def get(self) -> Job:
+        """Bloquea hasta que haya una petición que pueda ejecutarse."""
+        with self._cond:
+            while True:
+                job = self._pop_ready()
+                if job is not None:
+                    return job
+                self._cond.wait()
+
+    def done(self, job: Job) -> None:
+        with self._cond:
+            self._active[job.gpt_id] -= 1
+            if not self._active[job.gpt_id]:
+                del self._active[job.gpt_id]
+            self._cond.notify_all()
+
+    def cancel(self, job: Job) -> None:
+        job.cancelled.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def depth(self) -> dict[str, int]:
+        with self._cond:
+            return {gpt_id: len(q) for gpt_id, q in self._queues.items()}
+
+    def active(self) -> dict[str, int]:
+        with self._cond:
+            return dict(self._active)
+
+
+class _Meter:
+    """Tokens generados y su ritmo en una ventana deslizante."""
+
+    def __init__(self, window: float = 60.0):
+        self.window = window
+        self.total_tokens = 0
+        self.total_requests = 0
+        self.cancelled = 0
+        self._events: deque[tuple[float, int]] = deque()
+        self._ttft: deque[float] = deque(maxlen=200)
+        self._lock = threading.Lock()
+
+    def record(self, tokens: int, ttft: float | None, cancelled: bool) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self.total_tokens += tokens
+            self.total_requests += 1
+            self.cancelled += cancelled
+            self._events.append((now, tokens))
+            if ttft is not None:
+                self._ttft.append(ttft)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            while self._events and now - self._events[0][0] > self.window:
+                self._events.popleft()
+            recent = sum(n for _, n in self._events)
+            ttft = sorted(self._ttft)
+        return {
+            "requests": self.total_requests,
+            "cancelled": self.cancelled,
+            "tokens": self.total_tokens,
+            "tokens_per_second": round(recent / self.window, 2),
+            "ttft_p50_ms": round(ttft[len(ttft) // 2] * 1000, 1) if ttft else None,
+        }
+
+
+class Scheduler:
+    """Slots de generación alimentados por una :class:`FairQueue`."""
+
+    def __init__(self, backends: list, max_per_gpt: int, max_queued: int):
+        self.queue = FairQueue(max_per_gpt, max_queued)
+        self.meter = _Meter()
+        self.backends = backends
+        self._busy = [False] * len(backends)
+        self._threads = [
+            threading.Thread(target=self._run, args=(i,), name=f"llm-slot-{i}", daemon=True)
+            for i in range(len(backends))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, gpt_id: str, prompt: str, max_tokens: int, stop: list[str] | None) -> Job:
+        job = Job(gpt_id, prompt, max_tokens, stop, asyncio.get_running_loop())
+        self.queue.put(job)
+        return job
+
+    def _run(self, slot: int) -> None:
+        backend = self.backends[slot]
+        while True:
+            job = self.queue.get()
+            self._busy[slot] = True
+            ttft, tokens, aborted = None, 0, False
+            try:
+                stream = backend.generate(job.prompt, job.max_tokens, job.stop)
+                try:
+                    for token in stream:
+                        if job.cancelled.is_set():
+                            aborted = True
+                            break
+                        if ttft is None:
+                            ttft = time.monotonic() - job.enqueued  # incluye la espera en cola
+                        tokens += 1
+                        job.emit(token)
+                finally:
+                    stream.close()  # corta la decodificación si se canceló
+                job.emit(_DONE)
+            except Exception as exc:
+                job.emit(exc)
+            finally:
+                self._busy[slot] = False
+                self.meter.record(tokens, ttft, aborted)
+                self.queue.done(job)
+
+    def metrics(self) -> dict:
+        depth = self.queue.depth()
+        return {
+            "slots": len(self.backends),
+            "busy_slots": sum(self._busy),
+            "queue_depth": sum(depth.values()),
+            "queue_depth_by_gpt": depth,
+            "active_by_gpt": self.queue.active(),
+            **self.meter.snapshot(),
+        }
@@ -0,0 +1,211 @@
+# src/rag_logic/answer_cache.py
+"""
+Caché de respuestas exactas para ``run_rag``.
+
+Muchas preguntas se repiten literalmente ("plazo de garantía en contratos
+menores"…) y cada repetición pagaba una búsqueda en Weaviate y una
+generación completa. La clave de la caché combina:
+
+    - el ``gpt_id`` y el número de documentos ``k``;
+    - la pregunta normalizada (Unicode NFKC, minúsculas, espacios y signos
+      de interrogación/exclamación iniciales y finales eliminados);
+    - un hash del perfil (colección y prompt) y del LLM configurado;
+    - la versión del índice de la colección, que ``sync_and_index.py``
+      incrementa en el manifiesto al cambiar su contenido: las entradas
+      anteriores dejan de coincidir sin tener que borrarlas.
+
+Hay dos niveles: uno en memoria por proceso (LRU con caducidad TTL) y, con
+``ANSWER_CACHE_SHARED``, uno en SQLite (``ANSWER_CACHE_PATH``) que ven todos
+los workers de uvicorn.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+
+from src.config import settings
+from src.config.gpt_profiles import prompt_for
+from src.ingestion.manifest import read_index_version
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    key        TEXT PRIMARY KEY,
+    value      TEXT NOT NULL,
+    created    REAL NOT NULL,
+    last_used  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_answers_last_used ON answers (last_used);
+"""
+
+_EDGE_PUNCT = "¿?¡!.,;: \t\n"
+
+
+def normalize_question(question: str) -> str:
+    text = unicodedata.normalize("NFKC", question).lower()
+    return re.sub(r"\s+", " ", text).strip(_EDGE_PUNCT)
+
+
+def profile_hash(profile: dict) -> str:
+    """Hash de lo que cambia la respuesta además de la pregunta y el índice."""
+    parts = [
+        profile.get("collection"),
+        prompt_for(profile).template,
+        settings.LLM_MODEL_PATH.name if settings.USE_LOCAL_LLM else settings.OPENAI_MODEL_NAME,
+        settings.MAX_CONTEXT_TOKENS,
+        settings.MAX_COMPLETION_TOKENS,
+    ]
+    return hashlib.sha1(json.dumps(parts, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+class _IndexVersions:
+    """Versión del índice de cada colección, releída como mucho cada pocos segundos."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._cache: dict[str, tuple[float, int]] = {}
+
+    def get(self, collection: str) -> int:
+        now = time.monotonic()
+        cached = self._cache.get(collection)
+        if cached and now - cached[0] < self.ttl:
+            return cached[1]
+        version = read_index_version(settings.MANIFEST_PATH, collection)
+        self._cache[collection] = (now, version)
+        return version
+
+
+_versions = _IndexVersions(settings.INDEX_VERSION_CHECK_SECONDS)
+
+
+def index_version(collection: str) -> int:
+    """Versión actual del índice de ``collection`` (ver ``Manifest.bump_index_version``)."""
+    return _versions.get(collection)
+
+
+class AnswerCache:
+    """Respuestas por clave con LRU + TTL en memoria y nivel SQLite opcional."""
+
+    def __init__(self, max_entries: int, ttl: float, path: Path | None = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._db: sqlite3.Connection | None = None
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(_SCHEMA)
+
+    def key(self, gpt_id: str, question: str, k: int, profile: dict) -> str:
+        version = index_version(profile["collection"])
+        parts = [gpt_id, normalize_question(question), k, profile_hash(profile), version]
+        return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    # ---------- lectura / escritura -------------------------------------------
+    def get(self, key: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(key)
+            if item and now - item[0] < self.ttl:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            if item:
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created FROM answers WHERE key = ? AND created > ?",
+                    (key, now - self.ttl),
+                ).fetchone()
+                if row:
+                    self._db.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, key))
+                    value = json.loads(row[0])
+                    self._remember(key, row[1], value)
+                    self.shared_hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO answers (key, value, created, last_used) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False, default=str), now, now),
+                )
+                self._prune(now)
+
+    def _remember(self, key: str, created: float, value: dict) -> None:
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _prune(self, now: float) -> None:
+        """Borra del nivel SQLite lo caducado y lo menos usado por encima del límite."""
+        self._db.execute("DELETE FROM answers WHERE created <= ?", (now - self.ttl,))
+        self._db.execute(
+            "DELETE FROM answers WHERE key IN ("
+            " SELECT key FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def stats(self) -> dict:
+        total = self.hits + self.shared_hits + self.misses
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.shared_hits) / total, 3) if total else 0.0,
+            "entries": len(self._memory),
+        }
+
+
+@lru_cache(maxsize=1)
+def get_answer_cache() -> AnswerCache | None:
+    """Caché compartida del proceso (``None`` si está desactivada)."""
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    return AnswerCache(
+        settings.ANSWER_CACHE_MAX_ENTRIES,
+        settings.ANSWER_CACHE_TTL_SECONDS,
+        settings.ANSWER_CACHE_PATH if settings.ANSWER_CACHE_SHARED else None,
+    )
+
+
+def serialize_result(result: dict) -> dict:
+    """Resultado de ``run_rag`` en un formato apto para JSON."""
+    return {
+        "result": result["result"],
+        "source_documents": [
+            {"page_content": d.page_content, "metadata": d.metadata}
+            for d in result["source_documents"]
+        ],
+    }
+
+
+def deserialize_result(value: dict) -> dict:
+    from langchain_core.documents import Document
+
+    return {
+        "result": value["result"],
+        "source_documents": [Document(**d) for d in value["source_documents"]],
+    }
@@ -0,0 +1,151 @@
+# src/rag_logic/async_pipeline.py
+"""
+Piezas asíncronas de la consulta RAG para la API.
+
+``/query`` ejecutaba toda la cadena síncrona en el threadpool de Starlette:
+cada petición ocupaba un hilo mientras esperaba a Weaviate y a OpenAI, y el
+tamaño del threadpool limitaba las peticiones en curso. Aquí:
+
+    - la búsqueda usa ``WeaviateAsyncClient`` (uno por worker);
+    - OpenAI se llama con ``ainvoke``;
+    - solo lo que consume CPU sale del event loop: el embedding de la
+      pregunta (micro-lotes de ``BatchedQueryEmbeddings`` o un pool de
+      ``ASYNC_CPU_WORKERS`` hilos), el recorte del contexto por tokens y el
+      LLM local en el proceso (un hilo propio: llama.cpp no admite llamadas
+      concurrentes sobre el mismo modelo). Con ``LLM_SERVER_ENABLED`` el LLM
+      local también se espera de forma asíncrona.
+
+``OPENAI_MAX_CONCURRENCY`` limita las llamadas simultáneas a OpenAI; las
+consultas en curso las limita el control de admisión (``src/api/admission.py``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import TYPE_CHECKING
+from urllib.parse import urlparse
+
+from src.config import settings
+from src.rag_logic.retriever_module import _get_query_embedder
+from src.vectorstore.query_batcher import BatchedQueryEmbeddings
+
+if TYPE_CHECKING:
+    from weaviate import WeaviateAsyncClient
+
+_GRPC_PORT = 50051
+
+_client: WeaviateAsyncClient | None = None
+_client_lock: asyncio.Lock | None = None
+
+
+# ── ejecutores y límites (se crean en cada worker, tras el fork) ──────────
+@lru_cache(maxsize=1)
+def _cpu_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=settings.ASYNC_CPU_WORKERS, thread_name_prefix="rag-cpu")
+
+
+@lru_cache(maxsize=1)
+def _llm_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-llm")
+
+
+@lru_cache(maxsize=1)
+def _openai_slots() -> asyncio.Semaphore:
+    return asyncio.Semaphore(settings.OPENAI_MAX_CONCURRENCY)
+
+
+async def run_cpu(func, *args, **kwargs):
+    """Ejecuta ``func`` en el pool de CPU sin bloquear el event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_cpu_executor(), partial(func, *args, **kwargs))
+
+
+# ── embedding ─────────────────────
+async def aembed_query(question: str) -> list[float]:
+    embedder = _get_query_embedder()
+    if isinstance(embedder, BatchedQueryEmbeddings):
+        # El hilo despachador hace el trabajo; aquí solo se espera el lote
+        return await embedder.aembed_query(question)
+    return await run_cpu(embedder.embed_query, question)
+
+
+# ── Weaviate ──────────────────────
+async def _connect() -> WeaviateAsyncClient:
+    from weaviate import use_async_with_custom
+
+    parsed = urlparse(settings.WEAVIATE_URL)
+    host, secure = parsed.hostname or "localhost", parsed.scheme == "https"
+    http_port = parsed.port or (443 if secure else 80)
+
+    client = use_async_with_custom(
+        http_host=host, http_port=http_port, http_secure=secure,
+        grpc_host=host, grpc_port=_GRPC_PORT, grpc_secure=False,
+    )
+    await client.connect()
+    return client
+
+
+async def get_async_weaviate_client(reconnect: bool = False) -> WeaviateAsyncClient:
+    """Cliente asíncrono del worker; ``reconnect`` lo recrea tras un error."""
+    global _client, _client_lock
+    if _client is not None and not reconnect:
+        return _client
+    if _client_lock is None:
+        _client_lock = asyncio.Lock()
+    async with _client_lock:
+        if reconnect and _client is not None:
+            try:
+                await _client.close()
+            except Exception:
+                pass
+            _client = None
+        if _client is None:
+            _client = await _connect()
+    return _client
+
+
+async def close_async_weaviate_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+async def asearch(collection: str, vector: list[float], k: int):
+    """Los ``k`` chunks más cercanos a ``vector``, como ``Document`` de LangChain."""
+    from langchain_core.documents import Document
+
+    async def _query(client):
+        return await client.collections.get(collection).query.near_vector(near_vector=vector, limit=k)
+
+    try:
+        response = await _query(await get_async_weaviate_client())
+    except Exception:
+        response = await _query(await get_async_weaviate_client(reconnect=True))
+
+    docs = []
+    for obj in response.objects:
+        # Mismo formato que WeaviateVectorStore: el texto aparte, el resto en metadatos
+        properties = dict(obj.properties)
+        text = properties.pop("text", "") or ""
+        docs.append(Document(page_content=text, metadata=properties))
+    return docs
+
+
+# ── LLM ───────────────────────────
+def _text(message) -> str:
+    # ChatOpenAI devuelve mensajes; LlamaCpp, texto
+    return getattr(message, "content", message)
+
+
+async def agenerate(llm, text: str) -> str:
+    if settings.USE_LOCAL_LLM and settings.LLM_SERVER_ENABLED:
+        # El servidor LLM tiene su propia cola: aquí solo se espera la respuesta
+        return await llm.ainvoke(text)
+    if settings.USE_LOCAL_LLM:
+        loop = asyncio.get_running_loop()
+        return _text(await loop.run_in_executor(_llm_executor(), llm.invoke, text))
+    async with _openai_slots():
+        return _text(await llm.ainvoke(text))
@@ -1,25 +1,37 @@
-from langchain.chains.combine_documents.stuff import StuffDocumentsChain
-from langchain.chains.llm import LLMChain
-from langchain_core.documents import Document
+from __future__ import annotations
+
+import threading
+from contextlib import closing
+from typing import TYPE_CHECKING
+
 from src.rag_logic.retriever_module import get_retriever, _create_weaviate_client
 from src.rag_logic.llm_local import get_local_llm
-from src.config.gpt_profiles import GPT_PROFILES
-from transformers import BertTokenizer
-from langchain.prompts import PromptTemplate
+from src.config.gpt_profiles import GPT_PROFILES, prompt_for
 from src.config import settings
 from src.rag_logic.llm_openai import get_openai_llm
+from src.rag_logic.tokenizer import count_tokens, tokenizer_id, truncate_text
+from src.rag_logic.answer_cache import (
+    deserialize_result,
+    get_answer_cache,
+    index_version,
+    profile_hash,
+    serialize_result,
+)
+from src.rag_logic.retriever_module import _get_query_embedder
+from src.rag_logic import async_pipeline, semantic_cache
 from functools import lru_cache
 
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
 
-# Tokenizer para estimar tamaño de contexto
-tokenizer = BertTokenizer.from_pretrained("bert-base-uncased")
 
-def estimate_tokens(text: str) -> int:
-    return len(tokenizer.encode(text, truncation=False))
-
-def truncate_text(text: str, max_tokens: int) -> str:
-    tokens = tokenizer.encode(text, truncation=True, max_length=max_tokens)
-    return tokenizer.decode(tokens, skip_special_tokens=True)
+def estimate_tokens(doc: Document) -> int:
+    """Tokens del chunk: los guardados al indexar si se contaron con el mismo
+    tokenizer; si no (chunks antiguos o LLM distinto), se cuentan ahora."""
+    stored = doc.metadata.get("token_count")
+    if stored is not None and doc.metadata.get("tokenizer") == tokenizer_id():
+        return int(stored)
+    return count_tokens(doc.page_content)
 
 
 def filter_docs_by_token_limit(docs, max_tokens: int = settings.MAX_CONTEXT_TOKENS):
@@ -27,7 +39,7 @@ def filter_docs_by_token_limit(docs, max_tokens: int = settings.MAX_CONTEXT_TOKE
     total = 0
     selected = []
     for doc in docs:
-        tokens = estimate_tokens(doc.page_content)
+        tokens = estimate_tokens(doc)
         if total + tokens > max_tokens:
             remaining = max_tokens - total
             if remaining <= 0:
@@ -42,16 +54,20 @@ def filter_docs_by_token_limit(docs, max_tokens: int = settings.MAX_CONTEXT_TOKE
 
 @lru_cache(maxsize=None)
 def get_rag_chain(gpt_id: str = "default", k: int = settings.RETRIEVER_K):
+    # LangChain se importa con la primera cadena, no al importar el módulo
+    from langchain.chains.combine_documents.stuff import StuffDocumentsChain
+    from langchain.chains.llm import LLMChain
+
     profile = GPT_PROFILES.get(gpt_id, GPT_PROFILES["default"])
 
     # Recuperador
     retriever = get_retriever(k=k, collection_name=profile["collection"])
 
     # LLM local
-    llm = get_local_llm() if settings.USE_LOCAL_LLM else get_openai_llm()
+    llm = get_local_llm(gpt_id) if settings.USE_LOCAL_LLM else get_openai_llm()
 
     # Prompt
-    prompt = profile["prompt"] or PromptTemplate.from_template("Contexto:\n{context}\n\nPregunta: {question}\n\nRespuesta:")
+    prompt = prompt_for(profile)
 
     # LLMChain para aplicar el prompt
     llm_chain = LLMChain(
@@ -65,16 +81,148 @@ def get_rag_chain(gpt_id: str = "default", k: int = settings.RETRIEVER_K):
         document_variable_name="context"  # debe coincidir con el nombre usado en prompt.input_variables
     )
 
+    cache = get_answer_cache()
+    semantic = semantic_cache.get_semantic_cache() if semantic_cache.enabled_for(profile) else None
+    namespace = (gpt_id, k, profile_hash(profile))
+
+    def _exact(question: str):
+        """Caché exacta; devuelve ``(clave, valor guardado o None)``."""
+        # Preguntas repetidas: misma respuesta mientras no cambie el índice
+        key = cache.key(gpt_id, question, k, profile) if cache else None
+        return key, cache.get(key) if cache else None
+
+    def _similar(vector):
+        """Caché semántica; devuelve ``(versión del índice, valor o None)``."""
+        version = index_version(profile["collection"])
+        hit = semantic.lookup(namespace, vector, version)
+        return version, hit[0] if hit is not None else None
+
+    def _lookup(question: str):
+        """Busca en las cachés; devuelve ``(resultado, clave, vector, versión)``."""
+        key, cached = _exact(question)
+        if cached is not None:
+            return deserialize_result(cached), key, None, None
+
+        # Paráfrasis de una pregunta ya respondida (el vector se reutiliza
+        # para la búsqueda si no hay acierto)
+        vector = version = None
+        if semantic:
+            vector = _get_query_embedder().embed_query(question)
+            version, hit = _similar(vector)
+            if hit is not None:
+                return deserialize_result(hit), key, None, None
+        return None, key, vector, version
+
+    def _store(key, vector, version, result) -> None:
+        value = serialize_result(result)
+        if cache:
+            cache.put(key, value)
+        # Si se ha reindexado durante la generación, la respuesta se basa en
+        # el índice anterior y no se guarda para las paráfrasis
+        if semantic and index_version(profile["collection"]) == version:
+            semantic.add(namespace, vector, version, value)
+
     def run_rag(question: str):
+        cached, key, vector, version = _lookup(question)
+        if cached is not None:
+            return cached
+        docs = _retrieve(question, vector)
+        answer = combine_chain.run({
+            "input_documents": docs,
+            "question": question
+        })
+        result = {
+            "result": answer,
+            "source_documents": docs
+        }
+        _store(key, vector, version, result)
+        return result
+
+    def stream_rag(question: str, cancelled: threading.Event | None = None):
+        """Versión en streaming de ``run_rag``.
+
+        Genera ``("sources", docs)`` en cuanto termina la búsqueda y después
+        ``("token", texto)`` a medida que el LLM produce la respuesta. Si se
+        activa ``cancelled`` (el cliente se ha desconectado) se deja de pedir
+        tokens y se cierra el stream del LLM, que detiene la generación.
+        """
+        cached, key, vector, version = _lookup(question)
+        if cached is not None:
+            yield "sources", cached["source_documents"]
+            yield "token", cached["result"]
+            return
+
+        docs = _retrieve(question, vector)
+        yield "sources", docs
+
+        parts = []
+        with closing(iter(llm.stream(_prompt_text(question, docs)))) as tokens:
+            for chunk in tokens:
+                if cancelled is not None and cancelled.is_set():
+                    return
+                # ChatOpenAI devuelve mensajes parciales; LlamaCpp, texto
+                token = getattr(chunk, "content", chunk)
+                if token:
+                    parts.append(token)
+                    yield "token", token
+        _store(key, vector, version, {"result": "".join(parts), "source_documents": docs})
+
+    async def arun_rag(question: str):
+        """Versión asíncrona de ``run_rag`` (ver ``async_pipeline``).
+
+        Las cachés (SQLite, versión del índice en Weaviate, producto de
+        matrices de la caché semántica) se consultan en el pool de CPU para
+        no bloquear el event loop.
+        """
+        key, cached = await async_pipeline.run_cpu(_exact, question)
+        if cached is not None:
+            return deserialize_result(cached)
+
+        # El vector se calcula siempre: la búsqueda asíncrona lo necesita
+        vector = await async_pipeline.aembed_query(question)
+        version = None
+        if semantic:
+            version, hit = await async_pipeline.run_cpu(_similar, vector)
+            if hit is not None:
+                return deserialize_result(hit)
+
+        docs = await async_pipeline.asearch(profile["collection"], vector, k)
+        docs = await async_pipeline.run_cpu(
+            filter_docs_by_token_limit, docs, max_tokens=settings.MAX_CONTEXT_TOKENS
+        )
+        _debug_print(docs)
+        answer = await async_pipeline.agenerate(llm, _prompt_text(question, docs))
+        result = {
+            "result": answer,
+            "source_documents": docs
+        }
+        await async_pipeline.run_cpu(_store, key, vector, version, result)
+        return result
+
+    def _prompt_text(question: str, docs) -> str:
+        return prompt.format(
+            context="\n\n".join(d.page_content for d in docs),  # igual que StuffDocumentsChain
+            question=question,
+        )
+
+    def _search(question: str, vector=None):
+        if vector is None:
+            return retriever.get_relevant_documents(question)
+        return retriever.vectorstore.similarity_search_by_vector(vector, k=k)
+
+    def _retrieve(question: str, vector=None):
         nonlocal retriever
         try:
-            docs = retriever.get_relevant_documents(question)
+            docs = _search(question, vector)
         except Exception:
             _create_weaviate_client.cache_clear()
             retriever = get_retriever(k=k, collection_name=profile["collection"])
-            docs = retriever.get_relevant_documents(question)
+            docs = _search(question, vector)
         docs = filter_docs_by_token_limit(docs, max_tokens=settings.MAX_CONTEXT_TOKENS)
+        _debug_print(docs)
+        return docs
 
+    def _debug_print(docs) -> None:
         if settings.DEBUG_PRINT_CONTEXT:
             print("\n[DEBUG] Contexto recuperado:")
             for i, doc in enumerate(docs, 1):
@@ -82,14 +230,6 @@ def get_rag_chain(gpt_id: str = "default", k: int = settings.RETRIEVER_K):
                 print(doc.page_content)
                 print("Metadatos:", doc.metadata)
 
-        answer = combine_chain.run({
-            "input_documents": docs,
-            "question": question
-        })
-
-        return {
-            "result": answer,
-            "source_documents": docs
-        }
-
+    run_rag.stream = stream_rag
+    run_rag.arun = arun_rag
     return run_rag
@@ -1,19 +1,52 @@
 # src/rag_logic/llm_local.py
 
-from langchain_community.llms import LlamaCpp
-from pathlib import Path
 from functools import lru_cache
 from src.config import settings
 
 
+def get_local_llm(gpt_id: str = "default"):
+    """Devuelve el LLM local: el cliente del servidor LLM (con
+    ``LLM_SERVER_ENABLED``) o una instancia compartida en el proceso."""
+    if settings.LLM_SERVER_ENABLED:
+        return _get_server_llm(gpt_id)
+    return _get_inprocess_llm()
+
+
+@lru_cache(maxsize=None)
+def _get_server_llm(gpt_id: str):
+    # Un cliente por gpt_id: el servidor reparte los turnos por gpt_id
+    from src.rag_logic.llm_remote import LocalServerLLM
+
+    return LocalServerLLM(
+        url=settings.LLM_MODEL_URL,
+        gpt_id=gpt_id,
+        max_tokens=settings.MAX_COMPLETION_TOKENS,
+        timeout=settings.LLM_SERVER_TIMEOUT,
+    )
+
+
 @lru_cache(maxsize=1)
-def get_local_llm():
-    """Devuelve una instancia compartida del LLM local."""
+def _get_inprocess_llm():
+    from langchain_community.llms import LlamaCpp
+
+    from src.rag_logic.prefix_cache import with_prefix_cache
+
+    model_kwargs = {}
+    if settings.LLM_DRAFT_MODEL_PATH:
+        from src.rag_logic.speculative import build_draft_model
+
+        # Decodificación especulativa: misma salida con temperature=0.0
+        model_kwargs["draft_model"] = build_draft_model(n_ctx=4096)
 
-    return LlamaCpp(
+    llm = LlamaCpp(
         model_path=str(settings.LLM_MODEL_PATH),  # requerido por Pydantic
         model_url=settings.LLM_MODEL_URL,
         n_ctx=4096,
         temperature=0.0,
+        use_mmap=settings.LLM_USE_MMAP,
         verbose=False,
+        model_kwargs=model_kwargs,
     )
+    # Estado KV de los prefijos fijos de los prompts, calculado una vez
+    llm.client = with_prefix_cache(llm.client)
+    return llm
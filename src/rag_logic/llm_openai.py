@@ -1,11 +1,12 @@
 # src/rag_logic/llm_openai.py
-from langchain_openai import ChatOpenAI
 from src.config import settings
 from functools import lru_cache
 
 @lru_cache(maxsize=1)
 def get_openai_llm():
     """Instancia compartida del modelo de OpenAI."""
+    from langchain_openai import ChatOpenAI
+
     print("🧠 MODELO USADO:", settings.OPENAI_MODEL_NAME)  # ← DEBUG
     return ChatOpenAI(
         api_key=settings.OPENAI_API_KEY,
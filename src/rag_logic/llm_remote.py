@@ -0,0 +1,121 @@
+# src/rag_logic/llm_remote.py
+"""
+Cliente LangChain del servidor LLM local (``src/llm_server``).
+
+Con ``LLM_SERVER_ENABLED`` los workers de la API no cargan el GGUF: envían
+el prompt a ``LLM_MODEL_URL`` (``http://host:puerto`` o ``unix:///ruta.sock``)
+junto con el ``gpt_id``, que el servidor usa para repartir los turnos.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import httpx
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+_UDS_PREFIX = "unix://"
+
+
+def _client_args(url: str) -> tuple[str, dict]:
+    if url.startswith(_UDS_PREFIX):
+        return "http://llm-server", {"uds": url[len(_UDS_PREFIX):]}
+    return url.rstrip("/"), {}
+
+
+class LocalServerLLM(LLM):
+    """LLM servido por ``scripts/start_llm_server.py``."""
+
+    url: str
+    gpt_id: str = "default"
+    max_tokens: int = 800
+    timeout: float = 300.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "rag-llm-server"
+
+    def _payload(self, prompt: str, stop: Optional[List[str]], stream: bool) -> dict:
+        return {
+            "prompt": prompt,
+            "gpt_id": self.gpt_id,
+            "max_tokens": self.max_tokens,
+            "stop": stop,
+            "stream": stream,
+        }
+
+    def _client(self) -> httpx.Client:
+        base_url, transport = _client_args(self.url)
+        return httpx.Client(
+            base_url=base_url, timeout=self.timeout, transport=httpx.HTTPTransport(**transport)
+        )
+
+    def _aclient(self) -> httpx.AsyncClient:
+        base_url, transport = _client_args(self.url)
+        return httpx.AsyncClient(
+            base_url=base_url, timeout=self.timeout, transport=httpx.AsyncHTTPTransport(**transport)
+        )
+
+    # ---------- síncrono ------------------------------------------------------
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        with self._client() as client:
+            response = client.post("/generate", json=self._payload(prompt, stop, False))
+            response.raise_for_status()
+            return response.json()["text"]
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        # Al cerrar el iterador se cierra la conexión y el servidor cancela
+        with self._client() as client:
+            with client.stream("POST", "/generate", json=self._payload(prompt, stop, True)) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if line:
+                        chunk = GenerationChunk(text=json.loads(line)["token"])
+                        if run_manager:
+                            run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                        yield chunk
+
+    # ---------- asíncrono -----------------------------------------------------
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        async with self._aclient() as client:
+            response = await client.post("/generate", json=self._payload(prompt, stop, False))
+            response.raise_for_status()
+            return response.json()["text"]
+
+    async def _astream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[GenerationChunk]:
+        async with self._aclient() as client:
+            async with client.stream("POST", "/generate", json=self._payload(prompt, stop, True)) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line:
+                        chunk = GenerationChunk(text=json.loads(line)["token"])
+                        if run_manager:
+                            await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                        yield chunk
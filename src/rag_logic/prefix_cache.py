@@ -0,0 +1,188 @@
+# src/rag_logic/prefix_cache.py
+"""
+Caché KV de la parte fija de los prompts para el LLM local (llama.cpp).
+
+Cada prompt de ``GPT_PROFILES`` empieza con un bloque fijo de instrucciones
+(ver ``static_prefix``). Sin caché, cada petición vuelve a evaluar (prefill)
+esos tokens en CPU antes de llegar al contexto. Aquí el estado de llama.cpp
+tras evaluar cada prefijo se calcula una vez por perfil:
+
+    - al generar, si el prompt empieza por un prefijo conocido y el contexto
+      del modelo no lo tiene ya cargado, se restaura su estado; después
+      ``Llama.generate`` reutiliza los tokens comunes y solo evalúa el resto;
+    - los estados se guardan en ``LLM_PREFIX_CACHE_DIR`` (uno por modelo,
+      ``n_ctx`` y texto del prefijo), así que tras reiniciar se cargan del
+      disco en lugar de recalcularse. Cada fichero se calcula bajo un bloqueo
+      de fichero (los workers arrancan a la vez) y se escribe en un temporal
+      propio del proceso que se renombra al terminar; uno ilegible se
+      recalcula.
+
+:class:`PrefixCachedLlama` envuelve un ``llama_cpp.Llama`` y se usa tanto en
+el LLM local de la API (``LlamaCpp.client``) como en los slots del servidor
+LLM. Serializa las generaciones sobre el mismo modelo: restaurar un estado a
+mitad de otra generación la corrompería. En streaming el turno dura hasta que
+el generador termina o se cierra, y cada token puede pedirse desde un hilo
+distinto (``iterate_in_threadpool``), por eso se usa un semáforo y no un
+``Lock``, que solo puede liberar el hilo que lo adquirió.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import os
+import pickle
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+from src.config import settings
+from src.config.gpt_profiles import GPT_PROFILES, prompt_for, static_prefix
+
+
+def profile_prefixes() -> list[str]:
+    """Prefijos fijos distintos de los prompts de todos los perfiles."""
+    prefixes = {static_prefix(prompt_for(profile)) for profile in GPT_PROFILES.values()}
+    return sorted(p for p in prefixes if p.strip())
+
+
+@contextmanager
+def _file_lock(path: Path):
+    """Bloqueo exclusivo entre procesos sobre el estado de ``path``."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_suffix(".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class PrefixKVCache:
+    """Estados de llama.cpp tras evaluar cada prefijo, en memoria y en disco."""
+
+    def __init__(self, llama, directory: Path | None):
+        self.llama = llama
+        self.directory = Path(directory) if directory else None
+        self.hits = 0
+        self.loads = 0
+        self._states: dict[str, tuple[list[int], object]] = {}
+
+    def _path(self, prefix: str) -> Path | None:
+        if self.directory is None:
+            return None
+        model = Path(self.llama.model_path)
+        stat = model.stat()
+        parts = f"{model.name}|{stat.st_size}|{stat.st_mtime_ns}|{self.llama.n_ctx()}|{prefix}"
+        return self.directory / f"{hashlib.sha1(parts.encode('utf-8')).hexdigest()}.kv"
+
+    @staticmethod
+    def _read(path: Path):
+        """Estado guardado en ``path`` o ``None`` si no existe o no se puede leer."""
+        if not path.exists():
+            return None
+        try:
+            with path.open("rb") as fh:
+                return pickle.load(fh)
+        except Exception as exc:  # truncado o de otra versión: se recalcula
+            print(f"⚠️  Estado de prefijo ilegible en {path.name} ({exc!r}); se recalcula")
+            return None
+
+    def warm(self, prefixes: list[str]) -> None:
+        """Carga (del disco) o calcula el estado de cada prefijo."""
+        for prefix in prefixes:
+            start = time.perf_counter()
+            tokens = self.llama.tokenize(prefix.encode("utf-8"), special=True)
+            path = self._path(prefix)
+            # Un solo worker calcula cada prefijo; los demás esperan y lo leen
+            with _file_lock(path) if path is not None else nullcontext():
+                state = self._read(path) if path is not None else None
+                origin = "disco"
+                if state is None:
+                    self.llama.reset()
+                    self.llama.eval(tokens)
+                    state = self.llama.save_state()
+                    origin = "calculado"
+                    if path is not None:
+                        tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+                        with tmp.open("wb") as fh:
+                            pickle.dump(state, fh, protocol=pickle.HIGHEST_PROTOCOL)
+                        os.replace(tmp, path)
+            self._states[prefix] = (tokens, state)
+            print(f"🧩  Prefijo KV de {len(tokens)} tokens ({origin}, {time.perf_counter() - start:.2f}s)")
+
+    def prepare(self, prompt: str) -> None:
+        """Deja en el contexto del modelo el estado del prefijo de ``prompt``."""
+        best = max((p for p in self._states if prompt.startswith(p)), key=len, default=None)
+        if best is None:
+            return
+        tokens, state = self._states[best]
+        self.hits += 1
+        current = self.llama._input_ids[: self.llama.n_tokens]
+        if len(current) >= len(tokens) and list(current[: len(tokens)]) == tokens:
+            return  # la petición anterior era del mismo perfil
+        self.llama.load_state(state)
+        self.loads += 1
+
+
+class PrefixCachedLlama:
+    """``llama_cpp.Llama`` que restaura el prefijo del prompt antes de generar.
+
+    Los estados de ``prefixes`` se calculan con :meth:`warm` o, si nadie lo
+    ha llamado, con la primera generación; nunca al crear el objeto.
+    """
+
+    def __init__(self, llama, cache: PrefixKVCache, prefixes: list[str] | None = None):
+        self._llama = llama
+        self._cache = cache
+        self._pending = prefixes
+        self._turn = threading.Semaphore(1)
+
+    def __getattr__(self, name):
+        return getattr(self._llama, name)
+
+    def __call__(self, prompt: str, *args, **kwargs):
+        return self.create_completion(prompt, *args, **kwargs)
+
+    def warm(self) -> None:
+        """Carga o calcula los estados de los prefijos pendientes."""
+        with self._turn:
+            self._warm()
+
+    def _warm(self) -> None:
+        if self._pending is not None:
+            prefixes, self._pending = self._pending, None
+            self._cache.warm(prefixes)
+
+    def create_completion(self, prompt: str, *args, **kwargs):
+        if not kwargs.get("stream"):
+            with self._turn:
+                self._warm()
+                self._cache.prepare(prompt)
+                return self._llama.create_completion(prompt, *args, **kwargs)
+        return self._stream(prompt, *args, **kwargs)
+
+    def _stream(self, prompt: str, *args, **kwargs):
+        # El turno dura toda la generación, no solo la llamada inicial; se
+        # libera al agotar o cerrar el generador, desde el hilo que sea
+        self._turn.acquire()
+        try:
+            self._warm()
+            self._cache.prepare(prompt)
+            yield from self._llama.create_completion(prompt, *args, **kwargs)
+        finally:
+            self._turn.release()
+
+
+def with_prefix_cache(llama):
+    """Envuelve ``llama`` con la caché de prefijos si ``LLM_PREFIX_CACHE`` está activa.
+
+    No evalúa nada: con ``API_PRELOAD`` el modelo se crea en el padre antes
+    del ``fork`` y la evaluación (hilos de ggml) tiene que hacerse en cada
+    worker. Ver :meth:`PrefixCachedLlama.warm`.
+    """
+    if not settings.LLM_PREFIX_CACHE:
+        return llama
+    cache = PrefixKVCache(llama, settings.LLM_PREFIX_CACHE_DIR)
+    return PrefixCachedLlama(llama, cache, profile_prefixes())
@@ -0,0 +1,150 @@
+# src/rag_logic/preload.py
+"""
+Precarga de modelos en el proceso padre para compartirlos entre workers.
+
+Con ``API_PRELOAD=true``, ``scripts/start_api.py`` llama a
+:func:`preload_models` antes de hacer ``fork`` de los workers de uvicorn.
+Así el tokenizer, el embedder y el LLM local se cargan una sola vez y los
+hijos comparten esas páginas de memoria mediante copy-on-write. Los pesos
+GGUF de llama.cpp se abren con ``mmap``, por lo que quedan en la caché de
+páginas del sistema y tampoco se duplican.
+
+En el padre solo se cargan modelos: no se hace inferencia (los pools de
+hilos de PyTorch/OpenMP no sobreviven a un ``fork``) ni se abre el cliente
+de Weaviate (gRPC no es seguro entre procesos); cada worker crea el suyo.
+Por el mismo motivo, con ``EMBEDDING_BACKEND=onnx`` solo se prepara la
+exportación: la sesión de ONNX Runtime arranca su pool de hilos al crearse.
+
+Con el LLM local ocurre lo mismo: el GGUF principal y el borrador de
+``LLM_DRAFT_MODEL_PATH`` solo se abren (pesos en ``mmap``, sin contexto
+evaluado), porque ggml crea sus hilos en la primera evaluación. La caché KV
+de prefijos (``prefix_cache.py``), que sí evalúa, se calcula en
+:func:`warm_up`, ya en cada worker.
+"""
+
+from __future__ import annotations
+
+import gc
+import os
+import time
+
+from src.config import settings
+
+
+def preload_models() -> None:
+    """Carga en el proceso actual todo lo que comparten los workers."""
+    start = time.perf_counter()
+    # Los tokenizers rápidos de HuggingFace no toleran un fork con hilos activos
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+    # Los módulos se importan de forma perezosa: aquí se fuerzan para que los
+    # hijos hereden también las librerías ya importadas
+    _import_query_path()
+    from src.rag_logic.tokenizer import get_tokenizer
+
+    # Tokenizer del LLM para el presupuesto de contexto
+    get_tokenizer()
+
+    loaded = ["tokenizer"]
+    if settings.EMBEDDING_BACKEND == "onnx":
+        from src.vectorstore.onnx_embeddings import export_dir_for, export_model
+
+        # Exportar aquí evita que varios workers lo hagan a la vez al arrancar
+        out_dir = export_dir_for(settings.EMBEDDING_ONNX_PATH, settings.EMBEDDING_MODEL_NAME)
+        name = "model.int8.onnx" if settings.EMBEDDING_ONNX_QUANTIZE else "model.onnx"
+        if not (out_dir / name).exists():
+            export_model(settings.EMBEDDING_MODEL_NAME, out_dir, quantize=settings.EMBEDDING_ONNX_QUANTIZE)
+    else:
+        from src.rag_logic.retriever_module import _get_embedder
+
+        _get_embedder()
+        loaded.append("embedder")
+
+    # Con LLM_SERVER_ENABLED el modelo vive en el servidor LLM, no en la API
+    if settings.USE_LOCAL_LLM and not settings.LLM_SERVER_ENABLED and not settings.USE_MOCK_MODE:
+        from src.rag_logic.llm_local import get_local_llm
+
+        get_local_llm()
+        loaded.append("LLM local (mmap)" if settings.LLM_USE_MMAP else "LLM local")
+
+    # Los objetos ya cargados pasan a la generación permanente: el recolector
+    # no los recorre en los hijos y no ensucia (copia) sus páginas
+    gc.collect()
+    gc.freeze()
+    print(f"📦  Precargado {', '.join(loaded)} en {time.perf_counter() - start:.1f}s "
+          f"({gc.get_freeze_count()} objetos congelados)")
+
+
+def warm_up() -> None:
+    """Deja listos los modelos del worker antes de que acepte peticiones.
+
+    Con la precarga solo queda inicializar lo que no sobrevive a un ``fork``
+    (pools de hilos, sesión ONNX, hilo de micro-lotes, prefijos KV del LLM
+    local); sin ella, además se cargan aquí los modelos en lugar de en la
+    primera consulta.
+    """
+    if settings.USE_MOCK_MODE:
+        return
+    start = time.perf_counter()
+    _import_query_path()
+
+    from src.rag_logic.retriever_module import _get_query_embedder
+    from src.rag_logic.tokenizer import count_tokens
+
+    count_tokens("calentamiento")
+    _get_query_embedder().embed_query("calentamiento")
+    if settings.USE_LOCAL_LLM and not settings.LLM_SERVER_ENABLED:
+        from src.rag_logic.llm_local import get_local_llm
+        from src.rag_logic.prefix_cache import PrefixCachedLlama
+
+        client = get_local_llm().client
+        if isinstance(client, PrefixCachedLlama):
+            client.warm()
+    print(f"🔥  Worker {os.getpid()} listo en {time.perf_counter() - start:.1f}s")
+
+
+def _import_query_path() -> None:
+    """Importa las librerías que usa una consulta (LangChain, Weaviate, LLM)."""
+    import langchain.chains.combine_documents.stuff  # noqa: F401
+    import langchain.chains.llm  # noqa: F401
+    import langchain_weaviate  # noqa: F401
+
+    import src.rag_logic.generator  # noqa: F401
+
+    if settings.USE_LOCAL_LLM and settings.LLM_SERVER_ENABLED:
+        import src.rag_logic.llm_remote  # noqa: F401
+    elif settings.USE_LOCAL_LLM:
+        import langchain_community.llms  # noqa: F401
+    else:
+        import langchain_openai  # noqa: F401
+
+
+def memory_report(pids: list[int]) -> str:
+    """Resumen de memoria por worker: RSS, USS (privada) y compartida.
+
+    La memoria compartida (RSS − USS) es, aproximadamente, la que cada
+    worker se ahorra respecto a cargar sus propios modelos (incluye también
+    las librerías compartidas, que se comparten en cualquier caso).
+    """
+    import psutil
+
+    lines = []
+    total_uss = total_shared = 0
+    for pid in pids:
+        try:
+            info = psutil.Process(pid).memory_full_info()
+        except psutil.Error:
+            continue
+        shared = info.rss - info.uss
+        total_uss += info.uss
+        total_shared += shared
+        lines.append(f"   worker {pid}: RSS {_mb(info.rss)}  USS {_mb(info.uss)}  compartida {_mb(shared)}")
+
+    if lines:
+        lines.append(f"   Ahorro medio por worker ≈ {_mb(total_shared / len(lines))} "
+                     f"(privada total {_mb(total_uss)})")
+    return "\n".join(lines)
+
+
+def _mb(n: float) -> str:
+    return f"{n / 2**20:,.0f} MB"
@@ -1,63 +1,40 @@
 from functools import lru_cache
-from urllib.parse import urlparse
-
-from langchain_huggingface import HuggingFaceEmbeddings          # ← nueva ruta
-from langchain_weaviate import WeaviateVectorStore
-from weaviate import connect_to_custom
 
 from src.config import settings
+from src.vectorstore.query_batcher import BatchedQueryEmbeddings
+from src.vectorstore.embedder import (  # noqa: F401
+    _create_weaviate_client,
+    build_embeddings,
+    get_weaviate_client,
+)
 
 
 # ──────────────────────────────────────────────────────────────
-# 1) Cliente Weaviate (anónimo)
+# 1) Cliente Weaviate (compartido con la indexación)
 # ──────────────────────────────────────────────────────────────
-@lru_cache(maxsize=1)
-def _create_weaviate_client():
-    """Create and connect a new Weaviate client (cached)."""
-    parsed = urlparse(settings.WEAVIATE_URL)
-    host = parsed.hostname or "localhost"
-    secure = parsed.scheme == "https"
-    http_port = parsed.port or (443 if secure else 80)
-
-    client = connect_to_custom(
-        host,
-        http_port=http_port,
-        http_secure=secure,
-        grpc_host=host,
-        grpc_port=50051,   # ajusta si tu instancia usa otro
-        grpc_secure=False,
-    )
-    client.connect()
-    return client
-
-
-def get_weaviate_client():
-    """Return a cached Weaviate client, recreating it if the connection is lost."""
-    client = _create_weaviate_client()
-    try:
-        ready = client.is_ready()
-    except Exception:
-        ready = False
-
-    if not ready:
-        try:
-            client.close()
-        except Exception:
-            pass
-        _create_weaviate_client.cache_clear()
-        client = _create_weaviate_client()
-
-    return client
+# ``get_weaviate_client`` y ``_create_weaviate_client`` viven en
+# ``src.vectorstore.embedder``; se reexportan aquí para el generador.
 
 
 # ──────────────────────────────────────────────────────────────
-# 2) Embedder HuggingFace
+# 2) Embedder (HuggingFace u ONNX Runtime)
 # ──────────────────────────────────────────────────────────────
 @lru_cache(maxsize=1)
 def _get_embedder():
-    return HuggingFaceEmbeddings(
-        model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
-        encode_kwargs={"batch_size": settings.BATCH_SIZE},
+    # Mismo backend (PyTorch u ONNX) que la indexación: ver EMBEDDING_BACKEND
+    return build_embeddings()
+
+
+@lru_cache(maxsize=1)
+def _get_query_embedder():
+    """Embedder de las consultas: agrupa en micro-lotes las preguntas concurrentes."""
+    embedder = _get_embedder()
+    if settings.QUERY_BATCH_MAX_SIZE <= 1:
+        return embedder
+    return BatchedQueryEmbeddings(
+        embedder,
+        max_batch=settings.QUERY_BATCH_MAX_SIZE,
+        wait_ms=settings.QUERY_BATCH_WAIT_MS,
     )
 
 
@@ -73,9 +50,11 @@ def ensure_collection_exists(client, collection_name: str) -> None:
 
 
 def get_retriever(k: int = settings.RETRIEVER_K, collection_name: str = "LegalDocs"):
+    from langchain_weaviate import WeaviateVectorStore
+
     client = get_weaviate_client()
     ensure_collection_exists(client, collection_name)
-    embedder = _get_embedder()
+    embedder = _get_query_embedder()
 
     vectorstore = WeaviateVectorStore(
         client=client,
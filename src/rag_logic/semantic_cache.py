@@ -0,0 +1,115 @@
+# src/rag_logic/semantic_cache.py
+"""
+Caché semántica de respuestas: reutiliza la respuesta de una pregunta
+parecida, no solo de una idéntica.
+
+La pregunta se vectoriza con el mismo embedder de las consultas (MiniLM
+multilingüe) y se compara por similitud coseno con las preguntas ya
+respondidas del mismo perfil. Si la más parecida supera
+``SEMANTIC_CACHE_THRESHOLD`` se devuelven su respuesta y sus fuentes.
+
+El índice es una matriz numpy en memoria por perfil (``gpt_id``, ``k`` y
+hash del perfil), con como mucho ``SEMANTIC_CACHE_MAX_ENTRIES`` preguntas:
+al llenarse se descarta la más antigua. Cada índice recuerda la versión del
+índice de Weaviate con la que se construyó y se vacía cuando
+``sync_and_index.py`` la incrementa.
+
+Está desactivada por defecto: hay que activarla con ``SEMANTIC_CACHE_ENABLED``
+y, además, en cada perfil que la use con ``"semantic_cache": True`` en
+``GPT_PROFILES``.
+"""
+
+from __future__ import annotations
+
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+from src.config import settings
+
+
+class _ProfileIndex:
+    __slots__ = ("version", "vectors", "values")
+
+    def __init__(self, version: int, dim: int):
+        self.version = version
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.values: list[dict] = []
+
+
+class SemanticCache:
+    """Índice vectorial en memoria ``pregunta → respuesta`` por perfil."""
+
+    def __init__(self, threshold: float, max_entries: int):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._indexes: dict[tuple, _ProfileIndex] = {}
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        return v / max(float(np.linalg.norm(v)), 1e-12)
+
+    def _index(self, namespace: tuple, version: int, dim: int) -> _ProfileIndex:
+        index = self._indexes.get(namespace)
+        if index is not None and index.version != version:
+            # Se ha reindexado la colección: las respuestas pueden estar obsoletas
+            self.invalidations += 1
+            index = None
+        if index is None:
+            index = self._indexes[namespace] = _ProfileIndex(version, dim)
+        return index
+
+    def lookup(self, namespace: tuple, vector, version: int) -> tuple[dict, float] | None:
+        """Devuelve ``(valor, similitud)`` de la pregunta más parecida, si supera el umbral."""
+        q = self._normalize(vector)
+        with self._lock:
+            index = self._index(namespace, version, q.shape[0])
+            if index.values:
+                sims = index.vectors @ q
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    self.hits += 1
+                    return index.values[best], float(sims[best])
+            self.misses += 1
+            return None
+
+    def add(self, namespace: tuple, vector, version: int, value: dict) -> None:
+        """Guarda ``value``; se descarta si el índice ya es de otra versión."""
+        q = self._normalize(vector)
+        with self._lock:
+            current = self._indexes.get(namespace)
+            if current is not None and current.version != version:
+                # Se reindexó mientras se generaba: la respuesta puede estar obsoleta
+                return
+            index = self._index(namespace, version, q.shape[0])
+            index.vectors = np.vstack([index.vectors, q[None, :]])[-self.max_entries:]
+            index.values = (index.values + [value])[-self.max_entries:]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "invalidations": self.invalidations,
+            "entries": sum(len(i.values) for i in self._indexes.values()),
+        }
+
+
+@lru_cache(maxsize=1)
+def get_semantic_cache() -> SemanticCache | None:
+    """Caché semántica del proceso (``None`` si está desactivada)."""
+    if not settings.SEMANTIC_CACHE_ENABLED:
+        return None
+    return SemanticCache(settings.SEMANTIC_CACHE_THRESHOLD, settings.SEMANTIC_CACHE_MAX_ENTRIES)
+
+
+def enabled_for(profile: dict) -> bool:
+    return profile.get("semantic_cache", False) and get_semantic_cache() is not None
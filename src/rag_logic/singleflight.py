@@ -0,0 +1,107 @@
+# src/rag_logic/singleflight.py
+"""
+Agrupación de preguntas idénticas en curso ("singleflight").
+
+Cuando una pregunta circula internamente llegan muchas copias en pocos
+segundos. La caché de respuestas no ayuda hasta que termina la primera, así
+que cada copia pagaba su búsqueda y su generación. Aquí las peticiones con la
+misma clave (``gpt_id``, pregunta normalizada, ``k``) que llegan mientras la
+primera está en curso esperan su resultado en lugar de repetir el trabajo.
+
+El cálculo compartido es una tarea aparte: si el cliente que lo inició se
+desconecta, los demás siguen esperándolo. Solo se cancela cuando ya no
+queda nadie esperando. La tarea se queda con la plaza de admisión de quien
+lo inició y la libera al terminar (o al cancelarse), no cuando se va ese
+cliente: mientras el cálculo sigue, la plaza sigue ocupada.
+
+``stats()`` informa de las peticiones agrupadas, las que esperan ahora
+mismo y los segundos de cálculo ahorrados (duración del cálculo × número de
+peticiones que se lo ahorraron).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import TYPE_CHECKING, Awaitable, Callable
+
+from src.rag_logic.answer_cache import normalize_question
+
+if TYPE_CHECKING:
+    from src.api.admission import Ticket
+
+
+def coalesce_key(gpt_id: str, question: str, k: int) -> tuple:
+    return gpt_id, normalize_question(question), k
+
+
+class _Flight:
+    __slots__ = ("task", "started", "waiters", "followers")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.started = time.monotonic()
+        self.waiters = 0
+        self.followers = 0
+
+
+class SingleFlight:
+    """Un único cálculo en curso por clave, compartido por todas sus peticiones."""
+
+    def __init__(self):
+        self.leaders = 0
+        self.coalesced = 0
+        self.saved_seconds = 0.0
+        self._flights: dict[tuple, _Flight] = {}
+
+    def in_flight(self, key: tuple) -> bool:
+        return key in self._flights
+
+    def do(self, key: tuple, func: Callable[[], Awaitable], ticket: Ticket | None = None) -> Awaitable:
+        """Devuelve el resultado de ``func()``, ejecutándolo solo si no hay ya uno en curso.
+
+        ``ticket`` (la plaza de admisión de quien llama) pasa a ser del cálculo
+        y se libera cuando este termina; si ya había uno en curso, se libera
+        al momento. La entrega ocurre al llamar, antes de esperar nada.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight(asyncio.ensure_future(func()))
+            flight.task.add_done_callback(lambda _task, f=flight: self._finished(key, f))
+            if ticket is not None:
+                flight.task.add_done_callback(lambda _task: ticket.release())
+            self.leaders += 1
+        else:
+            if ticket is not None:
+                ticket.release()  # no añade trabajo: no necesita plaza
+            flight.followers += 1
+            self.coalesced += 1
+
+        flight.waiters += 1
+        return self._wait(flight)
+
+    async def _wait(self, flight: _Flight):
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                flight.task.cancel()  # nadie espera ya el resultado
+
+    def _finished(self, key: tuple, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.task.cancelled() and flight.task.exception() is None:
+            self.saved_seconds += flight.followers * (time.monotonic() - flight.started)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "waiting": sum(f.waiters for f in self._flights.values()),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "saved_seconds": round(self.saved_seconds, 2),
+        }
+
+
+flights = SingleFlight()
@@ -0,0 +1,146 @@
+# src/rag_logic/speculative.py
+"""
+Decodificación especulativa para el LLM local (llama.cpp en CPU).
+
+Generar hasta ``MAX_COMPLETION_TOKENS`` tokens con Mistral-7B Q4 es la mayor
+parte de la latencia en modo local: cada token es una pasada completa del
+modelo. Con ``LLM_DRAFT_MODEL_PATH`` un modelo borrador pequeño (GGUF con el
+mismo vocabulario) propone ``LLM_DRAFT_LOOKAHEAD`` tokens y el modelo
+principal los verifica en una sola pasada por lotes, aceptando los que
+habría elegido él. Con ``temperature=0.0`` (todos los perfiles) la salida es
+idéntica a la de la decodificación normal; solo cambia la velocidad.
+
+``LLM_DRAFT_MODEL_PATH=prompt-lookup`` usa en su lugar la búsqueda de n-gramas
+del propio prompt de llama-cpp-python: no necesita un segundo modelo y
+acierta cuando la respuesta copia frases del contexto recuperado.
+
+El borrador se pasa a ``llama_cpp.Llama`` como ``draft_model``; cada
+instancia del modelo principal necesita el suyo (tiene su propio contexto).
+"""
+
+from __future__ import annotations
+
+import threading
+from abc import abstractmethod
+
+import numpy as np
+from llama_cpp.llama_speculative import LlamaDraftModel, LlamaPromptLookupDecoding
+
+from src.config import settings
+
+PROMPT_LOOKUP = "prompt-lookup"
+
+_drafts: list[MeteredDraft] = []
+
+
+class MeteredDraft(LlamaDraftModel):
+    """Borrador que mide cuántos de sus tokens acepta el modelo principal.
+
+    llama-cpp-python no informa de las aceptaciones, pero se deducen de la
+    llamada siguiente: la secuencia que recibe es la anterior más los tokens
+    propuestos que se aceptaron y uno más elegido por el modelo principal.
+    """
+
+    def __init__(self):
+        self.proposed = 0
+        self.accepted = 0
+        self._last: tuple[list[int], list[int]] | None = None
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def propose(self, tokens: list[int]) -> list[int]:
+        """Tokens propuestos a continuación de ``tokens``."""
+
+    def __call__(self, input_ids, /, **kwargs):
+        tokens = [int(t) for t in input_ids]
+        with self._lock:
+            if self._last is not None:
+                previous, draft = self._last
+                if tokens[: len(previous)] == previous:
+                    following = tokens[len(previous):]
+                    for proposed, actual in zip(draft, following):
+                        if proposed != actual:
+                            break
+                        self.accepted += 1
+            draft = self.propose(tokens)
+            self.proposed += len(draft)
+            self._last = (tokens, draft)
+        return np.array(draft, dtype=np.intc)
+
+    def stats(self) -> dict:
+        return {
+            "proposed": self.proposed,
+            "accepted": self.accepted,
+            "acceptance_rate": round(self.accepted / self.proposed, 3) if self.proposed else 0.0,
+        }
+
+
+class GGUFDraft(MeteredDraft):
+    """Modelo borrador GGUF que propone tokens por decodificación voraz."""
+
+    def __init__(self, model_path: str, lookahead: int, n_ctx: int = 4096):
+        super().__init__()
+        from llama_cpp import Llama
+
+        self.lookahead = lookahead
+        self.llm = Llama(
+            model_path=model_path,
+            n_ctx=n_ctx,
+            use_mmap=settings.LLM_USE_MMAP,
+            verbose=False,
+        )
+
+    def propose(self, tokens: list[int]) -> list[int]:
+        llm = self.llm
+        # Se reutiliza la caché KV del borrador para el prefijo común con la
+        # llamada anterior; se evalúa al menos un token para tener logits
+        common = llm.longest_token_prefix(llm._input_ids.tolist(), tokens)
+        llm.n_tokens = min(common, len(tokens) - 1)
+        llm.eval(tokens[llm.n_tokens:])
+
+        draft = []
+        room = llm.n_ctx() - llm.n_tokens
+        for _ in range(min(self.lookahead, room - 1)):
+            token = llm.sample(temp=0.0)  # voraz, como el modelo principal
+            if llm.token_eos() == token:
+                break
+            draft.append(token)
+            llm.eval([token])
+        return draft
+
+
+class PromptLookupDraft(MeteredDraft):
+    def __init__(self, lookahead: int):
+        super().__init__()
+        self.lookup = LlamaPromptLookupDecoding(num_pred_tokens=lookahead)
+
+    def propose(self, tokens: list[int]) -> list[int]:
+        return self.lookup(np.array(tokens, dtype=np.intc)).tolist()
+
+
+def build_draft_model(n_ctx: int = 4096) -> MeteredDraft | None:
+    """Borrador según ``LLM_DRAFT_MODEL_PATH`` (``None`` si está vacío)."""
+    path = settings.LLM_DRAFT_MODEL_PATH
+    if not path:
+        return None
+    if path == PROMPT_LOOKUP:
+        draft = PromptLookupDraft(settings.LLM_DRAFT_LOOKAHEAD)
+    else:
+        draft = GGUFDraft(path, settings.LLM_DRAFT_LOOKAHEAD, n_ctx=n_ctx)
+    _drafts.append(draft)
+    return draft
+
+
+def speculative_stats() -> dict | None:
+    """Tokens propuestos y aceptados por todos los borradores del proceso."""
+    if not _drafts:
+        return None
+    proposed = sum(d.proposed for d in _drafts)
+    accepted = sum(d.accepted for d in _drafts)
+    return {
+        "draft": settings.LLM_DRAFT_MODEL_PATH,
+        "lookahead": settings.LLM_DRAFT_LOOKAHEAD,
+        "proposed": proposed,
+        "accepted": accepted,
+        "acceptance_rate": round(accepted / proposed, 3) if proposed else 0.0,
+    }
@@ -0,0 +1,172 @@
+# src/rag_logic/tokenizer.py
+"""
+Servicio de tokenización para el presupuesto de contexto.
+
+El indexador guarda en cada chunk su número de tokens (``token_count``) y
+el identificador del tokenizer con el que se contó (``tokenizer``). Al
+montar el contexto, el generador usa ese valor si el tokenizer coincide con
+el actual y solo tokeniza para recortar el último chunk.
+
+El tokenizer se elige con ``LLM_TOKENIZER``:
+
+- ``auto`` (por defecto): el que corresponde al LLM configurado, es decir,
+  el vocabulario del GGUF con ``USE_LOCAL_LLM`` o tiktoken para
+  ``OPENAI_MODEL_NAME``.
+- ``tiktoken`` o ``tiktoken:<codificación>`` (p. ej. ``tiktoken:o200k_base``).
+- ``gguf`` o ``gguf:<ruta>``: vocabulario de un GGUF, cargado por llama.cpp
+  con ``vocab_only`` (sin los pesos).
+- ``hf:<modelo>``: tokenizer rápido de HuggingFace.
+
+Se pueden añadir otros con :func:`register_tokenizer`. Nada se carga al
+importar el módulo; el tokenizer se crea con el primer uso. Los recuentos
+de textos individuales pasan por una caché LRU de ``TOKEN_COUNT_CACHE_SIZE``
+entradas, y :func:`count_tokens_many` codifica por lotes.
+"""
+
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable
+
+from src.config import settings
+
+
+class Tokenizer(ABC):
+    """Interfaz común: ``name``, ``encode``, ``decode`` y ``encode_batch``."""
+
+    name: str
+
+    @abstractmethod
+    def encode(self, text: str) -> list[int]:
+        ...
+
+    @abstractmethod
+    def decode(self, tokens: list[int]) -> str:
+        ...
+
+    def encode_batch(self, texts: list[str]) -> list[list[int]]:
+        return [self.encode(t) for t in texts]
+
+
+class TiktokenTokenizer(Tokenizer):
+    """Codificaciones BPE de OpenAI (compatibles con gpt-4o, gpt-4, …)."""
+
+    def __init__(self, model_or_encoding: str):
+        import tiktoken
+
+        try:
+            self._enc = tiktoken.get_encoding(model_or_encoding)
+        except ValueError:
+            try:
+                self._enc = tiktoken.encoding_for_model(model_or_encoding)
+            except KeyError:
+                self._enc = tiktoken.get_encoding("o200k_base")
+        self.name = f"tiktoken:{self._enc.name}"
+
+    def encode(self, text: str) -> list[int]:
+        return self._enc.encode_ordinary(text)
+
+    def decode(self, tokens: list[int]) -> str:
+        return self._enc.decode(tokens)
+
+    def encode_batch(self, texts: list[str]) -> list[list[int]]:
+        # Codifica en paralelo en hilos nativos
+        return self._enc.encode_ordinary_batch(texts)
+
+
+class GGUFTokenizer(Tokenizer):
+    """Vocabulario del modelo GGUF que usa ``LlamaCpp``."""
+
+    def __init__(self, model_path: Path):
+        from llama_cpp import Llama
+
+        model_path = Path(model_path)
+        self._llama = Llama(model_path=str(model_path), vocab_only=True, verbose=False)
+        self.name = f"gguf:{model_path.name}"
+
+    def encode(self, text: str) -> list[int]:
+        return self._llama.tokenize(text.encode("utf-8"), add_bos=False, special=False)
+
+    def decode(self, tokens: list[int]) -> str:
+        return self._llama.detokenize(tokens).decode("utf-8", errors="ignore")
+
+
+class HFTokenizer(Tokenizer):
+    """Tokenizer rápido (Rust) de HuggingFace."""
+
+    def __init__(self, model_name: str):
+        from transformers import AutoTokenizer
+
+        self._tok = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+        self.name = f"hf:{model_name}"
+
+    def encode(self, text: str) -> list[int]:
+        return self._tok.encode(text, add_special_tokens=False, verbose=False)
+
+    def decode(self, tokens: list[int]) -> str:
+        return self._tok.decode(tokens, skip_special_tokens=True)
+
+    def encode_batch(self, texts: list[str]) -> list[list[int]]:
+        return self._tok(texts, add_special_tokens=False, verbose=False)["input_ids"]
+
+
+# ──────────────────────────────────────────────────────────────
+# Registro: prefijo de LLM_TOKENIZER → constructor(argumento)
+# ──────────────────────────────────────────────────────────────
+_FACTORIES: dict[str, Callable[[str], Tokenizer]] = {
+    "tiktoken": lambda arg: TiktokenTokenizer(arg or settings.OPENAI_MODEL_NAME),
+    "gguf": lambda arg: GGUFTokenizer(Path(arg) if arg else settings.LLM_MODEL_PATH),
+    "hf": lambda arg: HFTokenizer(arg),
+}
+
+
+def register_tokenizer(prefix: str, factory: Callable[[str], Tokenizer]) -> None:
+    """Añade un tokenizer seleccionable con ``LLM_TOKENIZER=<prefix>[:<arg>]``."""
+    _FACTORIES[prefix] = factory
+    get_tokenizer.cache_clear()
+
+
+@lru_cache(maxsize=1)
+def get_tokenizer() -> Tokenizer:
+    """Tokenizer configurado (se crea con el primer uso y se reutiliza)."""
+    spec = settings.LLM_TOKENIZER
+    if spec == "auto":
+        spec = "gguf" if settings.USE_LOCAL_LLM else "tiktoken"
+    prefix, _, arg = spec.partition(":")
+    try:
+        factory = _FACTORIES[prefix]
+    except KeyError:
+        raise ValueError(f"LLM_TOKENIZER desconocido: {settings.LLM_TOKENIZER!r}") from None
+    tokenizer = factory(arg)
+    _count_cached.cache_clear()
+    return tokenizer
+
+
+def tokenizer_id() -> str:
+    return get_tokenizer().name
+
+
+@lru_cache(maxsize=settings.TOKEN_COUNT_CACHE_SIZE)
+def _count_cached(text: str) -> int:
+    return len(get_tokenizer().encode(text))
+
+
+def count_tokens(text: str) -> int:
+    return _count_cached(text)
+
+
+def count_tokens_many(texts: list[str]) -> list[int]:
+    """Recuento por lotes (sin pasar por la caché: pensado para indexar)."""
+    if not texts:
+        return []
+    return [len(ids) for ids in get_tokenizer().encode_batch(list(texts))]
+
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    tokenizer = get_tokenizer()
+    tokens = tokenizer.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return tokenizer.decode(tokens[:max_tokens])
@@ -0,0 +1,99 @@
+# src/startup_profile.py
+"""
+Desglose del tiempo de arranque de los scripts y de la API.
+
+Los scripts aceptan ``--profile-startup``. Con ese flag se vuelve a lanzar
+el mismo comando con ``python -X importtime``, que se detiene al llegar a
+:func:`startup_done` (el punto en que el script empezaría a trabajar). El
+padre lee el informe de ``importtime`` y muestra:
+
+    - el tiempo total de importación;
+    - el tiempo propio agregado por paquete raíz (torch, transformers, …);
+    - los imports directos más lentos, con su tiempo acumulado.
+
+Uso:
+    python scripts/query_retriever.py --profile-startup
+    python scripts/start_api.py --profile-startup
+"""
+
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+FLAG = "--profile-startup"
+_ENV = "RAG_PROFILE_STARTUP"
+_TOP = 15
+
+
+def profiling() -> bool:
+    """``True`` en el proceso hijo lanzado para medir el arranque."""
+    return os.environ.get(_ENV) == "1"
+
+
+def maybe_profile_startup() -> None:
+    """Si se pasó ``--profile-startup``, mide el arranque y termina.
+
+    Hay que llamarla antes de los imports pesados del script (justo después
+    de añadir la raíz del proyecto a ``sys.path``).
+    """
+    if FLAG not in sys.argv or profiling():
+        return
+    args = [a for a in sys.argv if a != FLAG]
+    env = {**os.environ, _ENV: "1"}
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        env=env,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+    print(report(proc.stderr, wall))
+    sys.exit(proc.returncode)
+
+
+def startup_done() -> None:
+    """Marca el fin del arranque; en modo perfil termina aquí el proceso."""
+    if profiling():
+        sys.stdout.flush()
+        sys.exit(0)
+
+
+def report(importtime_log: str, wall: float) -> str:
+    """Resume la salida de ``-X importtime``."""
+    by_package: dict[str, int] = defaultdict(int)
+    direct: list[tuple[int, str]] = []
+    total = 0
+    other = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:"):
+            other.append(line)
+            continue
+        if "self [us]" in line:  # cabecera
+            continue
+        self_us, cumulative_us, raw = line[len("import time:"):].split("|", 2)
+        self_us, cumulative_us = int(self_us), int(cumulative_us)
+        module = raw.strip()
+        # Un espacio tras la barra y dos más por cada nivel de anidamiento
+        depth = (len(raw) - len(raw.lstrip()) - 1) // 2
+        total += self_us
+        by_package[module.split(".")[0]] += self_us
+        if depth == 0:
+            direct.append((cumulative_us, module))
+
+    lines = [f"⏱️  Arranque: {wall:.2f}s en total, {total / 1e6:.2f}s importando módulos", ""]
+    lines.append("Por paquete (tiempo propio):")
+    for name, us in sorted(by_package.items(), key=lambda kv: -kv[1])[:_TOP]:
+        lines.append(f"   {us / 1e6:8.3f}s  {name}")
+    lines.append("")
+    lines.append("Imports directos más lentos (acumulado):")
+    for us, name in sorted(direct, reverse=True)[:_TOP]:
+        lines.append(f"   {us / 1e6:8.3f}s  {name}")
+    # Resto de stderr del hijo (avisos, trazas de error)
+    if other:
+        lines += ["", *other]
+    return "\n".join(lines)
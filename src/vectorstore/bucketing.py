@@ -0,0 +1,110 @@
+# src/vectorstore/bucketing.py
+"""
+Vectorización masiva agrupando los chunks por longitud en tokens.
+
+Los chunks de un documento tienen longitudes muy dispares (títulos cortos
+junto a párrafos completos) y cada lote se rellena (padding) hasta su
+miembro más largo. :class:`LengthBucketedEmbeddings` ordena los textos de
+cada llamada por número de tokens, los codifica en lotes de ``batch_size``
+con longitudes parecidas y devuelve los vectores en el orden original.
+
+Con el backend de PyTorch puede repartir además los lotes entre varios
+procesos con el pool multiproceso de sentence-transformers, que se crea una
+sola vez y se reutiliza en todas las llamadas.
+"""
+
+from __future__ import annotations
+
+import atexit
+import os
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def _find_tokenizer(embedder):
+    """Tokenizer del modelo subyacente (ONNX o sentence-transformers), si lo hay."""
+    tokenizer = getattr(embedder, "tokenizer", None)
+    if tokenizer is None:
+        tokenizer = getattr(getattr(embedder, "_client", None), "tokenizer", None)
+    return tokenizer
+
+
+class LengthBucketedEmbeddings(Embeddings):
+    """Envuelve un embedder para codificar los textos ordenados por longitud."""
+
+    def __init__(self, embedder: Embeddings, batch_size: int, processes: int = 0):
+        self.embedder = embedder
+        self.batch_size = max(1, batch_size)
+        self.processes = processes
+        self._tokenizer = _find_tokenizer(embedder)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def token_lengths(self, texts: list[str]) -> list[int]:
+        """Longitud en tokens de cada texto (en caracteres si no hay tokenizer)."""
+        if self._tokenizer is None:
+            return [len(t) for t in texts]
+        encoded = self._tokenizer(texts, add_special_tokens=True, truncation=False, verbose=False)
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        order = np.argsort(self.token_lengths(texts), kind="stable")
+        ordered = [texts[i] for i in order]
+
+        pool_model = self._pool_model()
+        if pool_model is not None:
+            # Mismo preprocesado que HuggingFaceEmbeddings.embed_documents
+            vectors = pool_model.encode_multi_process(
+                [t.replace("\n", " ") for t in ordered],
+                self._get_pool(),
+                batch_size=self.batch_size,
+                chunk_size=self.batch_size,
+            )
+        else:
+            vectors = np.concatenate([
+                np.asarray(self.embedder.embed_documents(ordered[i:i + self.batch_size]), dtype=np.float32)
+                for i in range(0, len(ordered), self.batch_size)
+            ])
+
+        result = np.empty_like(vectors)
+        result[order] = vectors
+        return result.tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embedder.embed_query(text)
+
+    # ---------- pool multiproceso (solo PyTorch) --------------------------------
+    def _pool_model(self):
+        if self.processes <= 1:
+            return None
+        model = getattr(self.embedder, "_client", None)
+        return model if hasattr(model, "start_multi_process_pool") else None
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                model = self._pool_model()
+                # Cada proceso usa su parte de los núcleos en lugar de todos
+                threads = str(max(1, (os.cpu_count() or 1) // self.processes))
+                previous = os.environ.get("OMP_NUM_THREADS")
+                os.environ["OMP_NUM_THREADS"] = threads
+                try:
+                    self._pool = model.start_multi_process_pool(target_devices=["cpu"] * self.processes)
+                finally:
+                    if previous is None:
+                        os.environ.pop("OMP_NUM_THREADS", None)
+                    else:
+                        os.environ["OMP_NUM_THREADS"] = previous
+                atexit.register(self.close)
+                print(f"🧵  Pool de embeddings: {self.processes} procesos × {threads} hilos")
+            return self._pool
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool_model().stop_multi_process_pool(self._pool)
+                self._pool = None
@@ -1,30 +1,97 @@
 # ── imports ───────────────────────
+# weaviate, LangChain y los modelos se importan al usarlos por primera vez:
+# los scripts y los workers de la API arrancan sin pagar su carga.
+from __future__ import annotations
+
+import hashlib
 from pathlib import Path
 from functools import lru_cache
+from typing import TYPE_CHECKING
 from urllib.parse import urlparse
 
-from weaviate import connect_to_custom, WeaviateClient
-from weaviate.classes.config import (
-    Configure, Property, DataType
-)
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_weaviate import WeaviateVectorStore
 from src.config import settings
+from src.rag_logic.tokenizer import count_tokens_many, tokenizer_id
+from src.vectorstore.bucketing import LengthBucketedEmbeddings
+from src.vectorstore.embedding_cache import CachedEmbeddings, EmbeddingCache
+from src.vectorstore.writer import BatchWriter
+
+if TYPE_CHECKING:
+    from weaviate import WeaviateClient
 
 _GRPC_PORT = 50051
+# Weaviate no devuelve más allá de QUERY_MAXIMUM_RESULTS (10 000 por defecto)
+# objetos de una búsqueda filtrada, ni siquiera paginando con offset
+_FETCH_PAGE = 1000
+_QUERY_MAXIMUM_RESULTS = 10_000
 
 # ── embeddings ────────────────────
-def get_local_embedder():
+def build_embeddings():
+    """Modelo de embeddings según ``EMBEDDING_BACKEND`` ("torch" u "onnx").
+
+    Lo usan tanto la indexación como el retriever, de modo que documentos y
+    consultas se vectorizan siempre con el mismo backend.
+    """
+    if settings.EMBEDDING_BACKEND == "onnx":
+        from src.vectorstore.onnx_embeddings import OnnxEmbeddings
+
+        return OnnxEmbeddings(
+            settings.EMBEDDING_MODEL_NAME,
+            settings.EMBEDDING_ONNX_PATH,
+            quantize=settings.EMBEDDING_ONNX_QUANTIZE,
+            batch_size=settings.BATCH_SIZE,
+            threads=settings.EMBEDDING_ONNX_THREADS,
+        )
+    if settings.EMBEDDING_BACKEND != "torch":
+        raise ValueError(f"EMBEDDING_BACKEND desconocido: {settings.EMBEDDING_BACKEND!r}")
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
     return HuggingFaceEmbeddings(
-        model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+        model_name=settings.EMBEDDING_MODEL_NAME,
         model_kwargs={"device": settings.EMBEDDING_DEVICE},
         encode_kwargs={"batch_size": settings.BATCH_SIZE},
     )
 
+def embedding_model_id() -> str:
+    """Identifica modelo y backend (los vectores int8 difieren ligeramente).
+
+    ``.v2``: desde que el backend ONNX sustituye los saltos de línea como
+    HuggingFaceEmbeddings; los vectores ONNX cacheados antes no coinciden.
+    """
+    if settings.EMBEDDING_BACKEND == "onnx":
+        suffix = "onnx-int8" if settings.EMBEDDING_ONNX_QUANTIZE else "onnx"
+        return f"{settings.EMBEDDING_MODEL_NAME}@{suffix}.v2"
+    return settings.EMBEDDING_MODEL_NAME
+
+@lru_cache(maxsize=1)
+def get_local_embedder():
+    """Embedder para indexar; consulta la caché en disco si está activada.
+
+    Los textos que no están en caché se vectorizan ordenados por longitud
+    (y, con ``EMBEDDING_PROCESSES`` > 1, repartidos entre varios procesos).
+    """
+    embedder = build_embeddings()
+    if settings.EMBEDDING_LENGTH_BUCKETING or settings.EMBEDDING_PROCESSES > 1:
+        embedder = LengthBucketedEmbeddings(
+            embedder,
+            batch_size=settings.BATCH_SIZE,
+            processes=settings.EMBEDDING_PROCESSES,
+        )
+    if not settings.USE_EMBEDDING_CACHE:
+        return embedder
+
+    cache = EmbeddingCache(
+        settings.EMBEDDING_CACHE_PATH,
+        embedding_model_id(),
+        settings.EMBEDDING_CACHE_MAX_ENTRIES,
+    )
+    return CachedEmbeddings(embedder, cache)
+
 # ── Weaviate client ───────────────
 @lru_cache(maxsize=1)
-def get_weaviate_client() -> WeaviateClient:
+def _create_weaviate_client() -> WeaviateClient:
+    from weaviate import connect_to_custom
+
     parsed = urlparse(settings.WEAVIATE_URL)
     host, secure = parsed.hostname or "localhost", parsed.scheme == "https"
     http_port = parsed.port or (443 if secure else 80)
@@ -36,6 +103,24 @@ def get_weaviate_client() -> WeaviateClient:
     client.connect()
     return client
 
+def get_weaviate_client() -> WeaviateClient:
+    """Cliente compartido por indexación y consultas; se recrea si se ha cerrado
+    o ha perdido la conexión, así que nunca hay que cerrarlo entre operaciones."""
+    client = _create_weaviate_client()
+    try:
+        ready = client.is_ready()
+    except Exception:
+        ready = False
+
+    if not ready:
+        try:
+            client.close()
+        except Exception:
+            pass
+        _create_weaviate_client.cache_clear()
+        client = _create_weaviate_client()
+    return client
+
 # ── utils ─────────────────────────
 def load_documents_from_folder(folder: Path):
     return [
@@ -45,16 +130,91 @@ def load_documents_from_folder(folder: Path):
     ]
 
 def chunk_documents(docs, size=500, overlap=100):
+    return list(iter_chunks(docs, size=size, overlap=overlap))
+
+def iter_chunks(docs, size=500, overlap=100):
+    """Versión perezosa de ``chunk_documents`` (acepta cualquier iterable).
+
+    Cada chunk lleva un ``uuid`` determinista (ver ``chunk_uuid``) para que
+    reindexar un documento sobrescriba sus objetos en lugar de duplicarlos.
+    """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
     splitter = RecursiveCharacterTextSplitter(chunk_size=size, chunk_overlap=overlap)
+    for doc in docs:
+        key = doc["metadata"].get("source") or doc["metadata"].get("doc_id")
+        for ordinal, chunk in enumerate(splitter.split_text(doc["text"])):
+            yield {
+                "text": chunk,
+                "metadata": doc["metadata"],
+                "uuid": chunk_uuid(key, ordinal, chunk),
+            }
+
+_token_count_failed = False
+
+def add_token_counts(chunks) -> None:
+    """Guarda en cada chunk sus tokens según el tokenizer del LLM configurado.
+
+    Se escriben en Weaviate (``token_count`` y ``tokenizer``) para que el
+    generador no tenga que volver a tokenizar el contexto en cada consulta.
+    Es opcional: si el tokenizer no se puede cargar (p. ej. un indexador sin
+    el GGUF del LLM), los chunks se indexan sin recuento y el generador los
+    tokeniza al consultar.
+    """
+    global _token_count_failed
+    if _token_count_failed:
+        return
+    try:
+        name = tokenizer_id()
+        counts = count_tokens_many([c["text"] for c in chunks])
+    except Exception as exc:
+        _token_count_failed = True
+        print(f"⚠️  No se pudo cargar el tokenizer ({exc}); se indexa sin token_count")
+        return
+    for c, n in zip(chunks, counts):
+        c["token_count"] = n
+        c["tokenizer"] = name
+
+def chunk_uuid(doc_key: str, ordinal: int, text: str) -> str:
+    """UUID v5 estable a partir del documento, la posición y el hash del chunk.
+
+    El documento se identifica por su ``source`` y no por el hash del texto
+    para que dos copias idénticas en rutas distintas no compartan UUID y los
+    chunks iniciales que no cambian conserven el suyo al editar el fichero.
+    """
+    chunk_hash = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    from weaviate.util import generate_uuid5
+
+    return generate_uuid5(f"{doc_key}|{ordinal}|{chunk_hash}")
+
+# ── indexing ──────────────────────
+def collection_name_for(gpt_id: str = "default") -> str:
+    return "LegalDocs" if gpt_id == "default" else f"LegalDocs_{gpt_id}"
+
+def _token_properties():
+    from weaviate.classes.config import DataType, Property
+
     return [
-        {"text": chunk, "metadata": doc["metadata"]}
-        for doc in docs for chunk in splitter.split_text(doc["text"])
+        Property(name="token_count", data_type=DataType.INT),
+        Property(name="tokenizer",   data_type=DataType.TEXT),
     ]
 
-# ── indexing ──────────────────────
-def index_chunks(chunks, gpt_id="default"):
-    index_name = "LegalDocs" if gpt_id == "default" else f"LegalDocs_{gpt_id}"
-    client = get_weaviate_client()
+def _key_properties():
+    """``source`` y ``doc_id`` se filtran por igualdad: sin tokenizar.
+
+    Con la tokenización por defecto (``word``) Weaviate parte también el
+    valor del filtro, y ``/data/docs/a.pdf`` coincidiría con cualquier
+    ``source`` que contenga ``data``, ``docs`` o ``pdf``.
+    """
+    from weaviate.classes.config import DataType, Property, Tokenization
+
+    return [
+        Property(name="source", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
+        Property(name="doc_id", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
+    ]
+
+def ensure_collection(client: WeaviateClient, index_name: str) -> None:
+    from weaviate.classes.config import Configure, DataType, Property
 
     if not client.collections.exists(index_name):
         client.collections.create(
@@ -63,17 +223,142 @@ def index_chunks(chunks, gpt_id="default"):
                 Property(name="text",     data_type=DataType.TEXT),
                 Property(name="filename", data_type=DataType.TEXT),
                 Property(name="path",     data_type=DataType.TEXT),
+                *_key_properties(),
+                *_token_properties(),
             ],
             vectorizer_config=Configure.Vectorizer.none(),  #  ✅ cambio clave
         )
+        return
 
-    store = WeaviateVectorStore(
-        client=client,
-        index_name=index_name,
-        embedding=get_local_embedder(),
-        text_key="text",
-    )
-    store.add_texts(texts=[c["text"] for c in chunks],
-                    metadatas=[c["metadata"] for c in chunks])
+    # Colecciones creadas antes de guardar el recuento de tokens (o sin
+    # ningún objeto con source todavía)
+    collection = client.collections.get(index_name)
+    existing = {p.name for p in collection.config.get().properties}
+    for prop in _key_properties() + _token_properties():
+        if prop.name not in existing:
+            collection.config.add_property(prop)
+
+def _exact_source_filter(collection) -> bool | None:
+    """``True`` si ``source`` admite filtros exactos (tokenización ``field``).
+
+    Las colecciones creadas antes de declarar ``source`` la tienen con
+    tokenización ``word`` (autoesquema), que no se puede cambiar sin
+    recrearlas: en ellas se comprueba el valor exacto objeto a objeto.
+    ``None`` si la colección aún no tiene la propiedad.
+    """
+    from weaviate.classes.config import Tokenization
+
+    for prop in collection.config.get().properties:
+        if prop.name == "source":
+            return prop.tokenization == Tokenization.FIELD
+    return None
+
+def _scan_source_uuids(collection, sources) -> list[str]:
+    """UUID de los objetos cuyo ``source`` es exactamente uno de ``sources``."""
+    wanted = set(sources)
+    return [
+        str(obj.uuid)
+        for obj in collection.iterator(return_properties=["source"])
+        if obj.properties.get("source") in wanted
+    ]
+
+def index_chunks(chunks, gpt_id="default") -> dict[int, str]:
+    """Vectoriza ``chunks`` y los escribe con el batch nativo de Weaviate.
+
+    Devuelve ``{índice: error}`` con los chunks que no se pudieron escribir.
+    La conexión se reutiliza: no se cierra al terminar.
+    """
+    index_name = collection_name_for(gpt_id)
+    client = get_weaviate_client()
+    ensure_collection(client, index_name)
+
+    writer = BatchWriter(client.collections.get(index_name))
+    add_token_counts(chunks)
+    vectors = get_local_embedder().embed_documents([c["text"] for c in chunks])
+    return writer.write(chunks, vectors)
+
+def delete_documents(sources, gpt_id="default") -> int:
+    """Elimina de Weaviate todos los chunks cuyos ``source`` estén en ``sources``."""
+    from weaviate.classes.query import Filter
+
+    index_name = collection_name_for(gpt_id)
+    client = get_weaviate_client()
+    if not sources or not client.collections.exists(index_name):
+        return 0
+
+    collection = client.collections.get(index_name)
+    exact = _exact_source_filter(collection)
+    if exact is None:
+        return 0
+    if not exact:
+        return delete_chunks(_scan_source_uuids(collection, sources), gpt_id)
+
+    sources = list(sources)
+    deleted = 0
+    for i in range(0, len(sources), 100):
+        result = collection.data.delete_many(
+            where=Filter.by_property("source").contains_any(sources[i:i + 100])
+        )
+        deleted += result.successful
+    return deleted
+
+def delete_chunks(uuids, gpt_id="default") -> int:
+    """Elimina de Weaviate exactamente los objetos con los UUID indicados."""
+    from weaviate.classes.query import Filter
+
+    index_name = collection_name_for(gpt_id)
+    client = get_weaviate_client()
+    if not uuids or not client.collections.exists(index_name):
+        return 0
+
+    collection = client.collections.get(index_name)
+    uuids = list(uuids)
+    deleted = 0
+    for i in range(0, len(uuids), 500):
+        result = collection.data.delete_many(
+            where=Filter.by_id().contains_any(uuids[i:i + 500])
+        )
+        deleted += result.successful
+    return deleted
+
+def find_chunk_uuids(source: str, gpt_id="default") -> list[str]:
+    """UUID de todos los objetos de ``source`` presentes en la colección."""
+    from weaviate.classes.query import Filter
+
+    index_name = collection_name_for(gpt_id)
+    client = get_weaviate_client()
+    if not client.collections.exists(index_name):
+        return []
+
+    collection = client.collections.get(index_name)
+    exact = _exact_source_filter(collection)
+    if exact is None:
+        return []
+    if not exact:
+        return _scan_source_uuids(collection, [source])
+
+    # Páginas con offset hasta una incompleta; un documento que llegue al
+    # máximo de Weaviate se busca recorriendo toda la colección
+    uuids = []
+    for offset in range(0, _QUERY_MAXIMUM_RESULTS, _FETCH_PAGE):
+        result = collection.query.fetch_objects(
+            filters=Filter.by_property("source").equal(source),
+            return_properties=["source"],
+            limit=_FETCH_PAGE,
+            offset=offset,
+        )
+        uuids += [str(obj.uuid) for obj in result.objects if obj.properties.get("source") == source]
+        if len(result.objects) < _FETCH_PAGE:
+            return uuids
+    return _scan_source_uuids(collection, [source])
+
+def iter_chunk_refs(gpt_id="default"):
+    """Recorre la colección devolviendo ``(uuid, source, doc_id)`` de cada objeto."""
+    index_name = collection_name_for(gpt_id)
+    client = get_weaviate_client()
+    if not client.collections.exists(index_name):
+        return
 
-    client.close()
+    collection = client.collections.get(index_name)
+    for obj in collection.iterator(return_properties=["source", "doc_id"]):
+        yield str(obj.uuid), obj.properties.get("source"), obj.properties.get("doc_id")
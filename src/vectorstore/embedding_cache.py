@@ -0,0 +1,259 @@
+# src/vectorstore/embedding_cache.py
+"""
+Caché persistente de embeddings direccionada por contenido.
+
+Guarda ``(modelo, hash del texto) → vector float32`` en disco para que un
+reindexado completo (tras ``delete_class.py``, al cambiar el tamaño de los
+chunks o al indexar el mismo documento en varias colecciones) solo calcule
+los embeddings de los textos realmente nuevos.
+
+Formato en disco (una carpeta por modelo dentro de ``EMBEDDING_CACHE_PATH``):
+    - ``vectors.f32``: matriz ``(capacidad, dim)`` float32 abierta con
+      ``numpy.memmap``; crece por duplicación hasta ``max_entries`` filas.
+    - ``index.sqlite3``: índice ``clave → fila`` con la fecha del último uso,
+      que se usa para desalojar las entradas menos usadas (LRU) al llenarse.
+
+Una fila de ``vectors.f32`` solo se escribe si ninguna clave confirmada la
+referencia: filas nuevas (a partir de ``next_slot``, leído en la propia
+transacción) o filas liberadas por un desalojo ya confirmado
+(``free_slots``). El desalojo borra la clave y libera su fila en la misma
+transacción, pero esa fila no se reutiliza hasta la siguiente. Así, tras un
+ROLLBACK o una caída, ninguna clave apunta al vector de otro texto, y varios
+indexadores pueden compartir la caché (``BEGIN IMMEDIATE`` serializa las
+asignaciones).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key        TEXT PRIMARY KEY,
+    slot       INTEGER NOT NULL UNIQUE,
+    last_used  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS free_slots (
+    slot  INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_INITIAL_CAPACITY = 1024
+
+
+def _text_key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Almacén ``hash del texto → vector`` para un modelo concreto."""
+
+    def __init__(self, path: Path, model_name: str, max_entries: int):
+        self.dir = Path(path) / re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(self.dir / "index.sqlite3", isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+        self.dim: int | None = None
+        self._vectors: np.memmap | None = None
+        self._capacity = 0
+        self._load()
+
+    # ---------- almacenamiento ------------------------------------------------
+    def _get_meta(self, key: str) -> str | None:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value) -> None:
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _load(self) -> None:
+        """Abre ``vectors.f32`` si otro proceso (o una ejecución anterior) ya fijó ``dim``."""
+        dim = self._get_meta("dim")
+        if dim and self._vectors is None:
+            self.dim = int(dim)
+            self._open(max(self._file_rows(), _INITIAL_CAPACITY))
+
+    def _file_rows(self) -> int:
+        file = self.dir / "vectors.f32"
+        return file.stat().st_size // (self.dim * 4) if file.exists() else 0
+
+    def _open(self, capacity: int) -> None:
+        """(Re)abre ``vectors.f32`` con ``capacity`` filas, ampliándolo si hace falta."""
+        file = self.dir / "vectors.f32"
+        needed = capacity * self.dim * 4
+        if not file.exists() or file.stat().st_size < needed:
+            with open(file, "ab") as f:
+                f.truncate(needed)
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._vectors = np.memmap(file, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self._capacity = capacity
+
+    def _reach(self, slot: int) -> None:
+        """Amplía la matriz abierta hasta incluir ``slot`` (otro proceso puede haberla hecho crecer)."""
+        if slot >= self._capacity:
+            capacity = max(self._capacity * 2, _INITIAL_CAPACITY, self._file_rows(), slot + 1)
+            self._open(min(capacity, max(self.max_entries, slot + 1)))
+
+    def _allocate(self, next_slot: int) -> tuple[int | None, int]:
+        """Fila sin referencias para un vector nuevo y el ``next_slot`` actualizado.
+
+        Debe llamarse dentro de la transacción de escritura. Devuelve ``None``
+        si la caché está llena y no quedan filas liberadas por desalojos
+        anteriores.
+        """
+        row = self._db.execute("SELECT slot FROM free_slots LIMIT 1").fetchone()
+        if row:
+            self._db.execute("DELETE FROM free_slots WHERE slot = ?", (row[0],))
+            return row[0], next_slot
+        if next_slot < self.max_entries:
+            return next_slot, next_slot + 1
+        return None, next_slot
+
+    def _evict(self, n: int, before: float) -> None:
+        """Desaloja las ``n`` entradas menos usadas; sus filas quedan libres
+        para la próxima transacción."""
+        rows = self._db.execute(
+            "SELECT key, slot FROM entries WHERE last_used < ? ORDER BY last_used LIMIT ?",
+            (before, n),
+        ).fetchall()
+        self._db.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k, _ in rows])
+        self._db.executemany("INSERT OR IGNORE INTO free_slots (slot) VALUES (?)", [(s,) for _, s in rows])
+
+    # ---------- API pública -----------------------------------------------------
+    def get_many(self, texts: list[str]) -> list[np.ndarray | None]:
+        """Busca los vectores de ``texts``; ``None`` para los que no están."""
+        keys = [_text_key(t) for t in texts]
+        with self._lock:
+            self._load()
+            if self._vectors is None:
+                self.misses += len(texts)
+                return [None] * len(texts)
+
+            slots: dict[str, int] = {}
+            unique = list(set(keys))
+            for i in range(0, len(unique), 500):
+                part = unique[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT key, slot FROM entries WHERE key IN ({','.join('?' * len(part))})",
+                    part,
+                ).fetchall()
+                slots.update(rows)
+
+            if slots:
+                now = time.time()
+                self._db.executemany(
+                    "UPDATE entries SET last_used = ? WHERE key = ?",
+                    [(now, k) for k in slots],
+                )
+                self._reach(max(slots.values()))
+            result = [np.array(self._vectors[slots[k]]) if k in slots else None for k in keys]
+
+        hits = sum(v is not None for v in result)
+        self.hits += hits
+        self.misses += len(result) - hits
+        return result
+
+    def put_many(self, texts: list[str], vectors) -> None:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(texts):
+            return
+        with self._lock:
+            now = time.time()
+            # Bloqueo de escritura desde el principio: otro indexador no puede
+            # asignar las mismas filas mientras tanto
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if self.dim is None:
+                    self._load()
+                if self.dim is None:
+                    self.dim = int(vectors.shape[1])
+                    self._set_meta("dim", self.dim)
+                    self._open(min(_INITIAL_CAPACITY, self.max_entries))
+
+                next_slot = int(self._get_meta("next_slot") or 0)
+                deferred = 0
+                for text, vec in zip(texts, vectors):
+                    key = _text_key(text)
+                    if self._db.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone():
+                        continue
+                    slot, next_slot = self._allocate(next_slot)
+                    if slot is None:
+                        deferred += 1  # llena: se guardará cuando vuelva a aparecer
+                        continue
+                    self._reach(slot)
+                    self._vectors[slot] = vec
+                    self._db.execute(
+                        "INSERT INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+                        (key, slot, now),
+                    )
+                if deferred:
+                    self._evict(deferred, now)
+                self._set_meta("next_slot", next_slot)
+                # Los vectores llegan al disco antes de que sus claves sean visibles
+                self._vectors.flush()
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+            self._db.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """Envuelve un modelo de embeddings consultando antes la caché en disco."""
+
+    def __init__(self, embedder: Embeddings, cache: EmbeddingCache):
+        self.embedder = embedder
+        self.cache = cache
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors = self.cache.get_many(texts)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            # Los textos repetidos dentro del lote se calculan una sola vez
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            computed = self.embedder.embed_documents(unique)
+            self.cache.put_many(unique, computed)
+            by_text = dict(zip(unique, computed))
+            for i in missing:
+                vectors[i] = by_text[texts[i]]
+        return [np.asarray(v, dtype=np.float32).tolist() for v in vectors]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embedder.embed_query(text)
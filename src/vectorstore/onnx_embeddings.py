@@ -0,0 +1,181 @@
+# src/vectorstore/onnx_embeddings.py
+"""
+Backend de embeddings sobre ONNX Runtime para servidores solo CPU.
+
+La primera vez se exporta el transformer del modelo de sentence-transformers
+a ONNX (``model.onnx``) y, opcionalmente, se cuantiza a int8 de forma
+dinámica (``model.int8.onnx``). Las exportaciones se guardan en
+``EMBEDDING_ONNX_PATH`` junto con el tokenizer y la configuración de pooling,
+de modo que las siguientes cargas no necesitan PyTorch.
+
+El pooling (media de los tokens ponderada por la máscara de atención) y la
+normalización se replican en numpy tal como los aplica sentence-transformers,
+y los textos se preprocesan igual que en ``HuggingFaceEmbeddings`` (saltos de
+línea sustituidos por espacios), para obtener los mismos vectores que el
+backend de PyTorch dentro de la tolerancia que comprueba
+``scripts/benchmark_embeddings.py``.
+
+La exportación se hace bajo un bloqueo de fichero y cada artefacto se
+escribe en un temporal que se renombra al terminar: varios workers que
+arrancan a la vez (sin precarga) no pisan ni leen a medias el mismo modelo.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import re
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_CONFIG_FILE = "pooling.json"
+
+
+def export_dir_for(root: Path, model_name: str) -> Path:
+    return Path(root) / re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name)
+
+
+@contextmanager
+def _export_lock(out_dir: Path):
+    """Bloqueo exclusivo entre procesos sobre la carpeta de exportación."""
+    with open(out_dir / ".export.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _tmp_path(path: Path) -> Path:
+    return path.with_name(f".{path.name}.{os.getpid()}.tmp")
+
+
+def export_model(model_name: str, out_dir: Path, quantize: bool = True) -> Path:
+    """Exporta ``model_name`` a ONNX en ``out_dir`` y devuelve el modelo a usar.
+
+    Requiere PyTorch y sentence-transformers solo durante la exportación.
+    Si otro proceso ya la hizo (o la está haciendo), espera y reutiliza la suya.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    onnx_path = out_dir / "model.onnx"
+    config_path = out_dir / _CONFIG_FILE
+
+    with _export_lock(out_dir):
+        # pooling.json se escribe el último: su presencia indica una exportación completa
+        if not (onnx_path.exists() and config_path.exists()):
+            import torch
+            from sentence_transformers import SentenceTransformer
+
+            print(f"📦  Exportando {model_name} a ONNX en {out_dir} …")
+            st = SentenceTransformer(model_name, device="cpu")
+            transformer = st[0]
+            pooling = next((m for m in st if type(m).__name__ == "Pooling"), None)
+            if pooling is not None and not pooling.pooling_mode_mean_tokens:
+                raise ValueError(f"{model_name}: solo se admite pooling por media en el backend ONNX")
+
+            transformer.tokenizer.save_pretrained(out_dir)
+
+            model = transformer.auto_model.eval()
+            dummy = transformer.tokenizer(["texto de ejemplo"], return_tensors="pt")
+            input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in dummy]
+            dynamic = {n: {0: "batch", 1: "seq"} for n in input_names}
+            dynamic["last_hidden_state"] = {0: "batch", 1: "seq"}
+            tmp = _tmp_path(onnx_path)
+            with torch.no_grad():
+                torch.onnx.export(
+                    model,
+                    tuple(dummy[n] for n in input_names),
+                    str(tmp),
+                    input_names=input_names,
+                    output_names=["last_hidden_state"],
+                    dynamic_axes=dynamic,
+                    opset_version=17,
+                )
+            os.replace(tmp, onnx_path)
+
+            tmp = _tmp_path(config_path)
+            tmp.write_text(json.dumps({
+                "max_seq_length": st.max_seq_length,
+                "normalize": any(type(m).__name__ == "Normalize" for m in st),
+            }))
+            os.replace(tmp, config_path)
+
+        if not quantize:
+            return onnx_path
+
+        int8_path = out_dir / "model.int8.onnx"
+        if not int8_path.exists():
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            print("📦  Cuantizando el modelo ONNX a int8 …")
+            tmp = _tmp_path(int8_path)
+            quantize_dynamic(str(onnx_path), str(tmp), weight_type=QuantType.QInt8)
+            os.replace(tmp, int8_path)
+        return int8_path
+
+
+class OnnxEmbeddings(Embeddings):
+    """Embeddings con ONNX Runtime compatibles con ``HuggingFaceEmbeddings``."""
+
+    def __init__(
+        self,
+        model_name: str,
+        export_root: Path,
+        quantize: bool = True,
+        batch_size: int = 64,
+        threads: int = 0,
+    ):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        out_dir = export_dir_for(export_root, model_name)
+        model_path = out_dir / ("model.int8.onnx" if quantize else "model.onnx")
+        if not model_path.exists() or not (out_dir / _CONFIG_FILE).exists():
+            model_path = export_model(model_name, out_dir, quantize=quantize)
+
+        config = json.loads((out_dir / _CONFIG_FILE).read_text())
+        self.max_length = config["max_seq_length"]
+        self.normalize = config["normalize"]
+        self.batch_size = batch_size
+        self.tokenizer = AutoTokenizer.from_pretrained(out_dir)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            str(model_path), options, providers=["CPUExecutionProvider"]
+        )
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
+        # Mismo preprocesado que HuggingFaceEmbeddings.embed_documents
+        encoded = self.tokenizer(
+            [t.replace("\n", " ") for t in texts],
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np",
+        )
+        feeds = {k: v.astype(np.int64) for k, v in encoded.items() if k in self._inputs}
+        hidden = self.session.run(["last_hidden_state"], feeds)[0]
+
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        vectors = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        parts = [self._encode(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)]
+        return np.concatenate(parts).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._encode([text])[0].tolist()
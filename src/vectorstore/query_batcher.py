@@ -0,0 +1,137 @@
+# src/vectorstore/query_batcher.py
+"""
+Micro-lotes para los embeddings de las consultas concurrentes.
+
+Cada petición a ``/query`` vectoriza su pregunta por separado. Con decenas
+de peticiones simultáneas el modelo ejecuta muchas pasadas de tamaño 1 que
+compiten por los mismos hilos de CPU. :class:`BatchedQueryEmbeddings` envuelve
+el embedder y encola las preguntas: un hilo despachador espera como mucho
+``QUERY_BATCH_WAIT_MS`` milisegundos (o hasta reunir ``QUERY_BATCH_MAX_SIZE``
+preguntas), hace una sola pasada por lotes y entrega a cada petición su vector.
+``aembed_query`` encola igual, pero espera el resultado desde el event loop.
+
+El hilo se arranca con la primera consulta, no al construir el objeto, para
+que el embedder pueda precargarse antes del ``fork`` de los workers.
+
+Una petición puede cancelar su ``Future`` mientras espera en la cola (plazo
+agotado, cliente desconectado): el despachador la descarta sin vectorizarla y
+ninguna entrega fallida detiene el hilo. Si aun así muriera, la siguiente
+consulta arranca otro.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from langchain_core.embeddings import Embeddings
+
+
+class BatchedQueryEmbeddings(Embeddings):
+    """Agrupa las llamadas concurrentes a ``embed_query`` en lotes."""
+
+    def __init__(self, base: Embeddings, max_batch: int, wait_ms: float):
+        self.base = base
+        self.max_batch = max(1, max_batch)
+        self.wait = max(0.0, wait_ms) / 1000
+        self._queue: queue.SimpleQueue[tuple[str, Future]] = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+
+        self.batches = 0
+        self.queries = 0
+        self.max_seen = 0
+        self.seconds = 0.0
+
+    # ---------- interfaz Embeddings -------------------------------------------
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        self._ensure_thread()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    async def aembed_query(self, text: str) -> list[float]:
+        # Sin ocupar un hilo por petición: se espera el Future del lote
+        self._ensure_thread()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return await asyncio.wrap_future(future)
+
+    # ---------- despachador ---------------------------------------------------
+    def _alive(self) -> bool:
+        # Tras un fork el hilo del padre no existe en el hijo
+        return self._thread is not None and self._pid == os.getpid() and self._thread.is_alive()
+
+    def _ensure_thread(self) -> None:
+        if self._alive():
+            return
+        with self._lock:
+            if not self._alive():
+                if self._pid != os.getpid():
+                    self._queue = queue.SimpleQueue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="query-embedder", daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> list[tuple[str, Future]]:
+        """Bloquea hasta la primera pregunta y añade las que lleguen en la ventana."""
+        items = [self._queue.get()]
+        deadline = time.monotonic() + self.wait
+        while len(items) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                items.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    @staticmethod
+    def _deliver(future: Future, vector=None, exc: BaseException | None = None) -> None:
+        try:
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(list(vector))
+        except Exception as err:  # p. ej. cancelado mientras se vectorizaba
+            print(f"⚠️  No se pudo entregar un embedding de consulta: {err!r}")
+
+    def _run(self) -> None:
+        while True:
+            # Las peticiones que ya no esperan (Future cancelado) se descartan
+            items = [(t, f) for t, f in self._collect() if f.set_running_or_notify_cancel()]
+            if not items:
+                continue
+            start = time.perf_counter()
+            try:
+                vectors = self.base.embed_documents([text for text, _ in items])
+            except Exception as exc:  # el error se entrega a cada petición
+                for _, future in items:
+                    self._deliver(future, exc=exc)
+                continue
+            for (_, future), vector in zip(items, vectors):
+                self._deliver(future, vector)
+
+            self.seconds += time.perf_counter() - start
+            self.batches += 1
+            self.queries += len(items)
+            self.max_seen = max(self.max_seen, len(items))
+
+    def stats(self) -> dict:
+        """Métricas de los lotes: tamaño medio y máximo, tiempo medio por lote."""
+        return {
+            "wait_ms": self.wait * 1000,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "queries": self.queries,
+            "mean_batch_size": round(self.queries / self.batches, 2) if self.batches else 0.0,
+            "max_batch_seen": self.max_seen,
+            "mean_batch_ms": round(self.seconds * 1000 / self.batches, 2) if self.batches else 0.0,
+        }
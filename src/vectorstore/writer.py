@@ -0,0 +1,87 @@
+# src/vectorstore/writer.py
+"""
+Escritura masiva en Weaviate con la API de batch (gRPC) del cliente v4.
+
+Sustituye a ``WeaviateVectorStore.add_texts`` en la indexación: permite
+fijar el tamaño de lote y las peticiones concurrentes, informa de los
+objetos que fallan en cada lote y mide el rendimiento en objetos/segundo.
+"""
+
+from __future__ import annotations
+
+import time
+
+from src.config import settings
+
+
+class BatchWriter:
+    """Escribe chunks ya vectorizados en una colección de Weaviate."""
+
+    def __init__(self, collection, batch_size: int | None = None, concurrency: int | None = None):
+        self.collection = collection
+        self.batch_size = batch_size or settings.WEAVIATE_BATCH_SIZE
+        self.concurrency = concurrency or settings.WEAVIATE_BATCH_CONCURRENCY
+        self.written = 0
+        self.failed = 0
+        self.seconds = 0.0
+
+    @property
+    def group_size(self) -> int:
+        """Objetos que conviene acumular por escritura para aprovechar la concurrencia."""
+        return self.batch_size * self.concurrency
+
+    def write(self, chunks: list[dict], vectors) -> dict[int, str]:
+        """Escribe ``chunks`` con sus ``vectors`` y devuelve ``{índice: error}``.
+
+        Cada chunk debe llevar ``text``, ``metadata`` y ``uuid``; al usar
+        UUID deterministas, un objeto existente se sobrescribe. Si lleva
+        ``token_count`` y ``tokenizer`` se guardan también como propiedades.
+        """
+        if not chunks:
+            return {}
+
+        start = time.perf_counter()
+        index_by_uuid = {}
+        with self.collection.batch.fixed_size(
+            batch_size=self.batch_size,
+            concurrent_requests=self.concurrency,
+        ) as batch:
+            for i, (chunk, vector) in enumerate(zip(chunks, vectors)):
+                index_by_uuid[str(chunk["uuid"])] = i
+                properties = {"text": chunk["text"], **chunk["metadata"]}
+                if "token_count" in chunk:
+                    properties["token_count"] = chunk["token_count"]
+                    properties["tokenizer"] = chunk["tokenizer"]
+                batch.add_object(
+                    properties=properties,
+                    vector=vector,
+                    uuid=chunk["uuid"],
+                )
+        elapsed = time.perf_counter() - start
+
+        errors = {}
+        for err in self.collection.batch.failed_objects:
+            idx = index_by_uuid.get(str(err.object_.uuid))
+            if idx is not None:
+                errors[idx] = err.message
+
+        ok = len(chunks) - len(errors)
+        self.written += ok
+        self.failed += len(errors)
+        self.seconds += elapsed
+        print(f"   ↳ Weaviate: {ok} objetos en {elapsed:.2f}s "
+              f"({ok / max(elapsed, 1e-9):.0f} obj/s)"
+              + (f", {len(errors)} fallidos" if errors else ""))
+        # Un mensaje por documento afectado (con el primer error encontrado)
+        by_file: dict[str, tuple[int, str]] = {}
+        for idx, message in errors.items():
+            name = chunks[idx]["metadata"].get("filename")
+            count, first = by_file.get(name, (0, message))
+            by_file[name] = (count + 1, first)
+        for name, (count, message) in by_file.items():
+            print(f"   ❌  {name}: {count} chunks fallidos ({message})")
+        return errors
+
+    def summary(self) -> str:
+        rate = self.written / max(self.seconds, 1e-9)
+        return f"{self.written} objetos escritos, {self.failed} fallidos ({rate:.0f} obj/s)"
@@ -0,0 +1,123 @@
+# tests/fake_graph.py
+"""
+Servidor Microsoft Graph falso para probar la sincronización delta en local.
+
+Solo implementa ``GET /drives/{drive}/root/delta``:
+
+- sin ``token``: enumeración completa de los elementos actuales, paginada
+  con ``@odata.nextLink`` (``page_size`` elementos por página);
+- con ``token``: el estado actual de los elementos que cambiaron desde ese
+  token, con la faceta ``deleted`` en los borrados (sin ruta, como Graph);
+- la última página lleva ``@odata.deltaLink`` con el token nuevo;
+- los tokens de ``expired`` responden ``410 Gone``.
+
+Se apunta el cliente a él con ``ONEDRIVE_GRAPH_URL``::
+
+    with FakeGraph() as graph:
+        graph.put("1", "ley.pdf", "/Docs")
+        settings.ONEDRIVE_GRAPH_URL = graph.url
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeGraph:
+    def __init__(self, drive_id: str = "drive", page_size: int = 2):
+        self.drive_id = drive_id
+        self.page_size = page_size
+        self.expired: set[str] = set()
+        self.requests: list[str] = []
+        self._items: dict[str, dict] = {}
+        self._changes: list[str] = []  # id cambiado en cada secuencia
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+
+    # ---------- Cambios en el drive ----------
+    def put(self, item_id: str, name: str, parent: str, ctag: str = "c1") -> None:
+        """Crea o modifica un fichero en ``parent`` (p. ej. ``/Docs``)."""
+        with self._lock:
+            self._items[item_id] = {
+                "id": item_id,
+                "name": name,
+                "cTag": ctag,
+                "file": {},
+                "parentReference": {"path": f"/drives/{self.drive_id}/root:{parent}"},
+            }
+            self._changes.append(item_id)
+
+    def move(self, item_id: str, parent: str) -> None:
+        item = self._items[item_id]
+        self.put(item_id, item["name"], parent, item["cTag"])
+
+    def delete(self, item_id: str) -> None:
+        with self._lock:
+            self._items[item_id] = {"id": item_id, "deleted": {"state": "deleted"}}
+            self._changes.append(item_id)
+
+    @property
+    def token(self) -> str:
+        return str(len(self._changes))
+
+    # ---------- Servidor ----------
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1.0"
+
+    def __enter__(self) -> "FakeGraph":
+        graph = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                graph.requests.append(self.path)
+                status, body = graph._handle(self.path)
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handle(self, path: str) -> tuple[int, dict]:
+        parsed = urlparse(path)
+        if parsed.path != f"/v1.0/drives/{self.drive_id}/root/delta":
+            return 404, {"error": {"code": "itemNotFound"}}
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        token = query.get("token")
+        if token in self.expired:
+            return 410, {"error": {"code": "resyncRequired"}}
+
+        with self._lock:
+            if token is None:
+                ids = [i for i, item in self._items.items() if "deleted" not in item]
+            else:
+                ids = list(dict.fromkeys(self._changes[int(token):]))
+            values = [dict(self._items[i]) for i in ids]
+            current = self.token
+
+        page = int(query.get("page", 0))
+        start = page * self.page_size
+        body = {"value": values[start:start + self.page_size]}
+        base = f"{self.url}/drives/{self.drive_id}/root/delta"
+        if start + self.page_size < len(values):
+            since = f"&token={token}" if token is not None else ""
+            body["@odata.nextLink"] = f"{base}?page={page + 1}{since}"
+        else:
+            body["@odata.deltaLink"] = f"{base}?token={current}"
+        return 200, body
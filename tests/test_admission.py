@@ -0,0 +1,46 @@
+# tests/test_admission.py
+"""Cuotas por cliente del control de admisión."""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("langchain_core")
+
+from src.api import admission as admission_module   # noqa: E402
+from src.config import settings                     # noqa: E402
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    monkeypatch.setattr(settings, "API_CLIENT_MAX_CONCURRENT", 1)
+    monkeypatch.setattr(settings, "API_CLIENT_MAX_QUEUED", 0)
+    return admission_module.AdmissionController()
+
+
+def test_clients_have_separate_quotas(controller):
+    async def scenario():
+        first = await controller.admit("default", "10.0.0.1")
+        with pytest.raises(admission_module.Rejected) as rejected:
+            await controller.admit("default", "10.0.0.1")
+        assert rejected.value.status == 429
+        other = await controller.admit("default", "10.0.0.2")
+        first.release()
+        other.release()
+        (await controller.admit("default", "10.0.0.1")).release()
+
+    asyncio.run(scenario())
+
+
+def test_idle_clients_are_forgotten(controller, monkeypatch):
+    monkeypatch.setattr(admission_module, "_MAX_CLIENTS", 2)
+
+    async def scenario():
+        busy = await controller.admit("default", "10.0.0.1")
+        (await controller.admit("default", "10.0.0.2")).release()
+        (await controller.admit("default", "10.0.0.3")).release()
+        assert set(controller._clients) == {"10.0.0.1", "10.0.0.3"}
+        busy.release()
+
+    asyncio.run(scenario())
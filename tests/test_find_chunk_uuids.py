@@ -0,0 +1,61 @@
+# tests/test_find_chunk_uuids.py
+"""Búsqueda de todos los chunks de un documento en Weaviate."""
+
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("weaviate")
+pytest.importorskip("langchain_core")
+
+from src.vectorstore import embedder   # noqa: E402
+
+
+class _FakeCollection:
+    """Colección con búsqueda filtrada limitada como Weaviate."""
+
+    def __init__(self, objects, maximum):
+        self.objects = objects
+        self.maximum = maximum
+        self.scanned = False
+        self.query = SimpleNamespace(fetch_objects=self._fetch)
+
+    def _fetch(self, filters, return_properties, limit, offset=0):
+        matches = [o for o in self.objects if o.properties["source"] == "a.pdf"]
+        end = min(offset + limit, self.maximum)
+        return SimpleNamespace(objects=matches[offset:end])
+
+    def iterator(self, return_properties):
+        self.scanned = True
+        return iter(self.objects)
+
+
+def _objects(n, source):
+    return [SimpleNamespace(uuid=f"{source}-{i}", properties={"source": source}) for i in range(n)]
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    def make(n, maximum=10_000):
+        coll = _FakeCollection(_objects(n, "a.pdf") + _objects(3, "b.pdf"), maximum)
+        client = SimpleNamespace(collections=SimpleNamespace(exists=lambda name: True, get=lambda name: coll))
+        monkeypatch.setattr(embedder, "get_weaviate_client", lambda: client)
+        monkeypatch.setattr(embedder, "_exact_source_filter", lambda c: True)
+        monkeypatch.setattr(embedder, "_FETCH_PAGE", 4)
+        monkeypatch.setattr(embedder, "_QUERY_MAXIMUM_RESULTS", maximum)
+        return coll
+    return make
+
+
+@pytest.mark.parametrize("n", [0, 3, 4, 9])
+def test_all_pages_are_read(collection, n):
+    coll = collection(n)
+    assert embedder.find_chunk_uuids("a.pdf") == [f"a.pdf-{i}" for i in range(n)]
+    assert not coll.scanned
+
+
+def test_documents_beyond_the_query_maximum_are_scanned(collection):
+    coll = collection(13, maximum=8)
+    assert embedder.find_chunk_uuids("a.pdf") == [f"a.pdf-{i}" for i in range(13)]
+    assert coll.scanned
@@ -0,0 +1,44 @@
+# tests/test_onedrive_backoff.py
+"""Esperas entre reintentos de ``OneDriveClient``."""
+
+import email.utils
+import time
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("requests")
+pytest.importorskip("msal")
+
+from src.config import settings                      # noqa: E402
+from src.ingestion import onedrive_client            # noqa: E402
+
+
+class _Response:
+    def __init__(self, retry_after):
+        self.headers = {"Retry-After": retry_after} if retry_after is not None else {}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(onedrive_client, "ConfidentialClientApplication", lambda **kwargs: None)
+    return onedrive_client.OneDriveClient("id", "secret", "tenant", retry_delay=2)
+
+
+def test_retry_after_seconds(client):
+    assert client._backoff(1, _Response("7")) == 7.0
+
+
+def test_retry_after_http_date(client):
+    when = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 <= client._backoff(1, _Response(when)) <= 30
+
+
+@pytest.mark.parametrize("value", ["mañana", "Mon, 99 Foo 2024", "1,5"])
+def test_malformed_retry_after_falls_back_to_exponential(client, value):
+    delay = client._backoff(3, _Response(value))
+    assert 4.0 <= delay <= min(8.0, settings.ONEDRIVE_MAX_BACKOFF)
+
+
+def test_no_retry_after(client):
+    assert 1.0 <= client._backoff(1, _Response(None)) <= 2.0
@@ -0,0 +1,107 @@
+# tests/test_onedrive_delta.py
+"""Sincronización delta de OneDrive contra el servidor Graph falso."""
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("requests")
+pytest.importorskip("msal")
+
+from src.config import settings                      # noqa: E402
+from src.ingestion import onedrive_client            # noqa: E402
+from tests.fake_graph import FakeGraph               # noqa: E402
+
+
+class _FakeMsal:
+    def __init__(self, **kwargs):
+        pass
+
+    def acquire_token_for_client(self, scopes):
+        return {"access_token": "token", "expires_in": 3600}
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    with FakeGraph() as graph:
+        monkeypatch.setattr(settings, "ONEDRIVE_GRAPH_URL", graph.url)
+        monkeypatch.setattr(onedrive_client, "ConfidentialClientApplication", _FakeMsal)
+        yield graph
+
+
+@pytest.fixture
+def client(graph):
+    return onedrive_client.OneDriveClient("id", "secret", "tenant", max_retries=1, retry_delay=0)
+
+
+def _ids(items, deleted):
+    return sorted(i["id"] for i in items if ("deleted" in i) == deleted)
+
+
+def test_first_sync_lists_folder_files_across_pages(graph, client):
+    graph.put("1", "a.pdf", "/Docs")
+    graph.put("2", "b.pdf", "/Docs/Sub")
+    graph.put("3", "c.pdf", "/Otros")
+    graph.put("4", "d.pdf", "/Docs")
+
+    items, link = client.get_delta(graph.drive_id, "Docs")
+
+    assert _ids(items, deleted=False) == ["1", "2", "4"]
+    assert _ids(items, deleted=True) == ["3"]  # fuera de la carpeta: sin efecto al indexar
+    assert link.endswith(f"token={graph.token}")
+    assert sum("page=" in r for r in graph.requests) == 1  # siguió @odata.nextLink
+
+
+def test_incremental_sync_reports_deleted_and_moved_out_items(graph, client):
+    graph.put("1", "a.pdf", "/Docs")
+    graph.put("2", "b.pdf", "/Docs")
+    graph.put("3", "c.pdf", "/Docs")
+    _, link = client.get_delta(graph.drive_id, "Docs")
+
+    graph.delete("1")
+    graph.move("2", "/Archivo")
+    graph.put("3", "c.pdf", "/Docs", ctag="c2")
+    items, _ = client.get_delta(graph.drive_id, "Docs", link)
+
+    assert _ids(items, deleted=True) == ["1", "2"]
+    assert _ids(items, deleted=False) == ["3"]
+
+
+def test_nothing_changed_returns_no_items(graph, client):
+    graph.put("1", "a.pdf", "/Docs")
+    _, link = client.get_delta(graph.drive_id, "Docs")
+
+    items, new_link = client.get_delta(graph.drive_id, "Docs", link)
+
+    assert items == []
+    assert new_link == link
+
+
+def test_expired_link_falls_back_to_full_enumeration(graph, client):
+    graph.put("1", "a.pdf", "/Docs")
+    _, link = client.get_delta(graph.drive_id, "Docs")
+    graph.expired.add(graph.token)
+
+    items, _ = client.get_delta(graph.drive_id, "Docs", link)
+
+    assert _ids(items, deleted=False) == ["1"]
+
+
+def test_delta_items_pass_deletions_to_indexer(graph, client, monkeypatch):
+    pytest.importorskip("fitz")
+    pytest.importorskip("docx")
+    from src.ingestion import ingestor
+
+    monkeypatch.setattr(settings, "ONEDRIVE_DRIVE_ID", graph.drive_id)
+    monkeypatch.setattr(settings, "ONEDRIVE_FOLDER", "Docs")
+    graph.put("1", "a.pdf", "/Docs")
+    graph.put("2", "b.pdf", "/Docs")
+    delta_state = {}
+    _, key, link = ingestor._onedrive_delta_items(client, delta_state, [])
+    delta_state[key] = link
+
+    graph.move("1", "/Archivo")
+    deleted = []
+    files, _, _ = ingestor._onedrive_delta_items(client, delta_state, deleted)
+
+    assert files == []
+    assert deleted == [{"onedrive_id": "1", "name": "a.pdf"}]
@@ -0,0 +1,133 @@
+# tests/test_prefix_cache.py
+"""Turnos de ``PrefixCachedLlama`` y estados en disco de ``PrefixKVCache``."""
+
+import threading
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("langchain_core")
+
+from src.rag_logic.prefix_cache import PrefixCachedLlama, PrefixKVCache   # noqa: E402
+
+
+class _FakeLlama:
+    def __init__(self):
+        self.warmed = 0
+
+    def create_completion(self, prompt, *args, stream=False, **kwargs):
+        if not stream:
+            return {"choices": [{"text": "ok"}]}
+        return ({"choices": [{"text": t}]} for t in ("a", "b", "c"))
+
+
+class _FakeCache:
+    def __init__(self, llama):
+        self.llama = llama
+
+    def warm(self, prefixes):
+        self.llama.warmed += 1
+
+    def prepare(self, prompt):
+        pass
+
+
+@pytest.fixture
+def llm():
+    llama = _FakeLlama()
+    return PrefixCachedLlama(llama, _FakeCache(llama), ["prefijo"])
+
+
+def _in_new_thread(func, *args):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(func(*args)))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def test_stream_consumed_and_closed_from_other_threads(llm):
+    stream = llm.create_completion("p", stream=True)
+    # Como iterate_in_threadpool: cada token puede pedirse desde otro hilo
+    assert _in_new_thread(next, stream)["choices"][0]["text"] == "a"
+    assert _in_new_thread(next, stream)["choices"][0]["text"] == "b"
+    _in_new_thread(stream.close)
+
+    # El turno se ha liberado: la siguiente generación no se bloquea
+    done = threading.Event()
+    threading.Thread(target=lambda: (llm.create_completion("p"), done.set()), daemon=True).start()
+    assert done.wait(2)
+
+
+def test_generations_wait_for_open_stream(llm):
+    stream = llm.create_completion("p", stream=True)
+    next(stream)
+    done = threading.Event()
+    threading.Thread(target=lambda: (llm.create_completion("p"), done.set()), daemon=True).start()
+    assert not done.wait(0.2)
+    assert [c["choices"][0]["text"] for c in stream] == ["b", "c"]
+    assert done.wait(2)
+
+
+def test_prefixes_warmed_once_on_first_use(llm):
+    assert llm._llama.warmed == 0
+    llm.create_completion("p")
+    list(llm.create_completion("p", stream=True))
+    llm.warm()
+    assert llm._llama.warmed == 1
+
+
+class _EvalLlama:
+    """Lo justo de ``llama_cpp.Llama`` para calcular y guardar estados."""
+
+    def __init__(self, model_path):
+        self.model_path = str(model_path)
+        self.evals = 0
+
+    def n_ctx(self):
+        return 4096
+
+    def tokenize(self, data, special=False):
+        return list(data)
+
+    def reset(self):
+        pass
+
+    def eval(self, tokens):
+        self.evals += 1
+
+    def save_state(self):
+        return {"estado": self.evals}
+
+
+@pytest.fixture
+def model(tmp_path):
+    path = tmp_path / "modelo.gguf"
+    path.write_bytes(b"gguf")
+    return path
+
+
+def test_state_is_saved_and_reused(tmp_path, model):
+    PrefixKVCache(_EvalLlama(model), tmp_path / "kv").warm(["prefijo"])
+    llama = _EvalLlama(model)
+    PrefixKVCache(llama, tmp_path / "kv").warm(["prefijo"])
+    assert llama.evals == 0
+    assert not list((tmp_path / "kv").glob("*.tmp"))
+
+
+def test_corrupt_state_is_recomputed_and_overwritten(tmp_path, model):
+    cache = PrefixKVCache(_EvalLlama(model), tmp_path / "kv")
+    path = cache._path("prefijo")
+    path.parent.mkdir()
+    path.write_bytes(b"\x80\x05trunc")
+
+    llama = _EvalLlama(model)
+    cache = PrefixKVCache(llama, tmp_path / "kv")
+    cache.warm(["prefijo"])
+    assert llama.evals == 1
+    assert cache._states["prefijo"][1] == {"estado": 1}
+
+    # El fichero se ha rehecho: el siguiente arranque ya lo lee
+    again = _EvalLlama(model)
+    PrefixKVCache(again, tmp_path / "kv").warm(["prefijo"])
+    assert again.evals == 0
@@ -0,0 +1,53 @@
+# tests/test_query_batcher.py
+"""Despachador de micro-lotes de ``BatchedQueryEmbeddings``."""
+
+import asyncio
+import os
+import threading
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from src.vectorstore.query_batcher import BatchedQueryEmbeddings   # noqa: E402
+
+
+class _SlowEmbeddings:
+    """Embedder que no termina el primer lote hasta que se le deja."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls: list[list[str]] = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        self.release.wait(5)
+        return [[float(len(t))] for t in texts]
+
+
+def test_cancelled_query_does_not_stop_the_dispatcher():
+    base = _SlowEmbeddings()
+    embedder = BatchedQueryEmbeddings(base, max_batch=8, wait_ms=0)
+
+    async def scenario():
+        # La primera ocupa el despachador; la segunda queda en cola y se cancela
+        busy = asyncio.ensure_future(embedder.aembed_query("a"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(embedder.aembed_query("cancelada"), 0.05)
+        base.release.set()
+        assert await busy == [1.0]
+        return await asyncio.wait_for(embedder.aembed_query("tres"), 2)
+
+    assert asyncio.run(scenario()) == [4.0]
+    assert ["cancelada"] not in base.calls
+
+
+def test_dead_dispatcher_is_restarted():
+    embedder = BatchedQueryEmbeddings(_SlowEmbeddings(), max_batch=8, wait_ms=0)
+    embedder._thread = threading.Thread(target=lambda: None)
+    embedder._thread.start()
+    embedder._thread.join()
+    embedder._pid = os.getpid()
+    embedder.base.release.set()
+    assert asyncio.run(asyncio.wait_for(embedder.aembed_query("dos"), 2)) == [3.0]
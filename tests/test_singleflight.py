@@ -0,0 +1,79 @@
+# tests/test_singleflight.py
+"""Plaza de admisión del cálculo compartido de ``SingleFlight``."""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+from src.rag_logic.singleflight import SingleFlight   # noqa: E402
+
+
+class _Ticket:
+    def __init__(self):
+        self.released = 0
+
+    def release(self):
+        self.released += 1
+
+
+def test_ticket_held_until_shared_task_finishes():
+    async def scenario():
+        flights = SingleFlight()
+        gate = asyncio.Event()
+
+        async def compute():
+            await gate.wait()
+            return "respuesta"
+
+        ticket = _Ticket()
+        leader = asyncio.ensure_future(flights.do("k", compute, ticket))
+        follower = asyncio.ensure_future(flights.do("k", compute))
+        await asyncio.sleep(0)
+
+        # Quien lo inició se va: el cálculo y su plaza siguen
+        leader.cancel()
+        await asyncio.sleep(0)
+        assert ticket.released == 0
+
+        gate.set()
+        assert await follower == "respuesta"
+        assert ticket.released == 1
+
+    asyncio.run(scenario())
+
+
+def test_ticket_released_when_nobody_waits():
+    async def scenario():
+        flights = SingleFlight()
+        ticket = _Ticket()
+        leader = asyncio.ensure_future(flights.do("k", asyncio.Event().wait, ticket))
+        await asyncio.sleep(0)
+        leader.cancel()
+        for _ in range(5):  # cancelación de la tarea y sus callbacks
+            await asyncio.sleep(0)
+        assert ticket.released == 1
+        assert not flights.in_flight("k")
+
+    asyncio.run(scenario())
+
+
+def test_joining_releases_the_extra_ticket():
+    async def scenario():
+        flights = SingleFlight()
+        gate = asyncio.Event()
+
+        async def compute():
+            await gate.wait()
+            return 1
+
+        first, second = _Ticket(), _Ticket()
+        a = flights.do("k", compute, first)
+        b = flights.do("k", compute, second)
+        assert second.released == 1 and first.released == 0
+        gate.set()
+        assert await asyncio.gather(a, b) == [1, 1]
+        assert first.released == 1
+
+    asyncio.run(scenario())